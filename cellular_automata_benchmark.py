@@ -0,0 +1,539 @@
+import argparse
+import json
+import os
+import platform
+import time
+from collections import namedtuple
+import numpy as np
+import cellular_automata
+import cellular_automata_bitpacked
+import cellular_automata_hashlife
+import cellular_automata_history
+import cellular_automata_out_of_core
+import cellular_automata_tiled
+
+# Grid shapes (height, width) of the size ladder of the suite, from 10**2 to 10**8 cells
+SIZE_LADDER = ((10, 10), (25, 40), (100, 100), (250, 400), (1000, 1000), (2500, 4000), (10000, 10000))
+DENSITIES = (0.1, 0.3, 0.5)
+# Largest grid measured by default; the full ladder takes long and needs several GB of memory
+DEFAULT_MAX_CELLS = 10**6
+# Relative drop of the median cells per second reported as a regression
+DEFAULT_THRESHOLD = 0.1
+# Speed-up of the bit-packed engine over the plain NumPy (np.roll) step aimed at by cellular_automata_bitpacked
+BITPACKED_TARGET = 10
+
+SuiteEntry = namedtuple('SuiteEntry', ['make', 'max_cells', 'border_types', 'uses_density'])
+SuiteEntry.__doc__ = """
+An entry of the benchmark suite: make(grid, border_type) returns (step, close), where step() processes every cell
+of the grid once (one generation) and close is None or a function releasing resources. The entry is measured up
+to max_cells cells, for the given border types (None when it has no border), at every density if uses_density.
+"""
+
+
+def time_generations(step, generations, repeats=3):
+    """
+    Time a stepping function and return the best time per generation.
+
+    Parameters:
+        step (callable): Function advancing the grid by one generation, called with no arguments.
+        generations (int): Number of generations per measurement.
+        repeats (int): Number of measurements; the fastest one is kept.
+
+    Returns:
+        float: Seconds per generation.
+    """
+    step()  # warm up the caches and the thread pools
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(generations):
+            step()
+        best = min(best, (time.perf_counter() - start) / generations)
+    return best
+
+
+def benchmark_threads(width, height, max_threads, border_type='toroidal', generations=10, seed_value=1):
+    """
+    Measure how the threaded vectorized and bit-packed updates scale from 1 to max_threads threads.
+
+    Parameters:
+        width (int): The width of the grid.
+        height (int): The height of the grid.
+        max_threads (int): The largest number of threads to measure.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        generations (int): Number of generations per measurement.
+        seed_value (int): Seed of the random initial grid.
+
+    Returns:
+        list of dict: One entry per engine and thread count with the keys 'engine', 'threads',
+        'seconds' (per generation), 'cells_per_second' and 'speedup' (relative to 1 thread).
+    """
+    grid = cellular_automata.initial_state_grid(width, height, seed_value)
+    padded = cellular_automata.pad_grid(grid, border_type)
+    out = np.empty((height, width), dtype=np.uint8)
+    packed = cellular_automata_bitpacked.pad_packed(cellular_automata_bitpacked.pack_grid(grid), width, border_type)
+    packed_out = np.empty((height, packed.shape[1]), dtype=np.uint64)
+    engines = {
+        'vectorized': lambda threads: cellular_automata.step_padded(padded, out, threads),
+        'bitpacked': lambda threads: cellular_automata_bitpacked.step_packed(packed, width, border_type, packed_out,
+                                                                             threads=threads),
+    }
+    results = []
+    for name, step in engines.items():
+        single = None
+        for threads in range(1, max_threads + 1):
+            seconds = time_generations(lambda: step(threads), generations)
+            single = single or seconds
+            results.append({'engine': name, 'threads': threads, 'seconds': seconds,
+                            'cells_per_second': width * height / seconds, 'speedup': single / seconds})
+    return results
+
+
+def numpy_roll_step(grid):
+    """
+    Compute the next generation of a toroidal grid the plain NumPy way, the baseline of the bit-packed engine.
+
+    The eight neighbor grids are built with np.roll (each a new array) and summed, then the rule is applied
+    with comparisons: no padding, no preallocated buffers, one byte per cell.
+
+    Parameters:
+        grid (numpy.ndarray): The binary uint8 grid.
+
+    Returns:
+        numpy.ndarray: The next generation, equal to update_grid(grid, 'toroidal').
+    """
+    counts = sum(np.roll(np.roll(grid, rows, axis=0), columns, axis=1)
+                 for rows in (-1, 0, 1) for columns in (-1, 0, 1) if rows or columns)
+    return ((counts == 3) | ((grid == 1) & (counts == 2))).astype(np.uint8)
+
+
+def benchmark_bitpacked(width, height, border_type='toroidal', generations=3, seed_value=1):
+    """
+    Measure the bit-packed engine against the plain NumPy step and the vectorized uint8 engine.
+
+    Parameters:
+        width (int): The width of the grid.
+        height (int): The height of the grid.
+        border_type (str): The border type of the engines; the plain NumPy step is always toroidal.
+        generations (int): Number of generations per measurement.
+        seed_value (int): Seed of the random initial grid (random_state_grid, density 0.5).
+
+    Returns:
+        dict: 'cells_per_second' and 'bytes_per_cell' of 'numpy-roll', 'vectorized' and 'bitpacked', and the
+        speed-ups of the bit-packed engine 'speedup_numpy_roll' and 'speedup_vectorized'.
+
+    Note:
+        On a 10000x10000 soup (one CPU, 3 generations) the bit-packed engine measured 3.1e9 cells/s, 32x the
+        plain NumPy step (BITPACKED_TARGET is 10x) and 4.7x the vectorized engine, at 1/8 byte per cell.
+    """
+    grid = cellular_automata.random_state_grid(width, height, seed_value)
+    simulation = cellular_automata.Simulation(grid, border_type)
+    packed = cellular_automata_bitpacked.PackedSimulation(grid, border_type)
+    rolled = [grid]
+
+    def roll():
+        rolled[0] = numpy_roll_step(rolled[0])
+
+    cells = width * height
+    result = {'cells_per_second': {}, 'bytes_per_cell': {
+        'numpy-roll': 1.0, 'vectorized': simulation.padded.nbytes / cells,
+        'bitpacked': packed._buffers[0].nbytes / cells}}
+    for name, step in (('numpy-roll', roll), ('vectorized', simulation.step), ('bitpacked', packed.step)):
+        result['cells_per_second'][name] = cells / time_generations(step, generations)
+    rates = result['cells_per_second']
+    result['speedup_numpy_roll'] = rates['bitpacked'] / rates['numpy-roll']
+    result['speedup_vectorized'] = rates['bitpacked'] / rates['vectorized']
+    return result
+
+
+def benchmark_out_of_core(width, height, directory, band_rows=(256, 1024, 4096), border_type='toroidal',
+                          packed=True, generations=3, seed_value=1):
+    """
+    Measure the sustained throughput of the out-of-core engine for several band sizes.
+
+    Parameters:
+        width (int): The width of the grid.
+        height (int): The height of the grid.
+        directory (str): Directory where the two grid files are written; they are removed afterwards.
+        band_rows (tuple of int): The band sizes to measure.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        packed (bool): Store the grid bit-packed instead of one byte per cell.
+        generations (int): Number of generations per band size.
+        seed_value (int): Seed of the random initial grid.
+
+    Returns:
+        list of dict: One entry per band size with the keys 'band_rows', 'seconds' (per generation),
+        'read_seconds', 'compute_seconds', 'write_seconds' and 'megabytes_per_second', averaged over the generations.
+    """
+    filename = os.path.join(directory, 'out_of_core_grid.bin')
+    results = []
+    for rows in band_rows:
+        cellular_automata.random_state_grid(width, height, seed_value, packed=packed, filename=filename)
+        engine = cellular_automata_out_of_core.OutOfCoreEngine(filename, (height, width), border_type, packed=packed,
+                                                               band_rows=rows)
+        stats = engine.advance(generations)
+        engine.remove_work_file()
+        os.remove(engine.filename)
+        result = {'band_rows': rows}
+        for field in ('seconds', 'read_seconds', 'compute_seconds', 'write_seconds', 'megabytes_per_second'):
+            result[field] = sum(getattr(generation, field) for generation in stats) / generations
+        results.append(result)
+    return results
+
+
+def benchmark_history(directory, width=512, height=512, generations=1000, border_type='toroidal',
+                      keyframe_interval=cellular_automata_history.DEFAULT_KEYFRAME_INTERVAL, seed_value=1):
+    """
+    Measure the size and the decoding speed of the history of a standard soup (random_state_grid, density 0.5).
+
+    Parameters:
+        directory (str): Directory where the history file is written; it is removed afterwards.
+        width (int): The width of the grid.
+        height (int): The height of the grid.
+        generations (int): Number of generations recorded after generation 0.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        keyframe_interval (int): Generations between two keyframes.
+        seed_value (int): Seed of the random initial grid.
+
+    Returns:
+        dict: 'file_bytes', the compression ratios 'ratio_uint8' and 'ratio_packed' against storing every
+        generation with one byte or one bit per cell, 'record_seconds', the sequential decoding speed
+        'decode_generations_per_second', and 'random_access_seconds', the mean time to decode a random generation.
+    """
+    filename = os.path.join(directory, 'history_benchmark.hist')
+    grid = cellular_automata.random_state_grid(width, height, seed_value)
+    start = time.perf_counter()
+    cellular_automata_history.record(grid, generations, border_type, filename, keyframe_interval)
+    record_seconds = time.perf_counter() - start
+    file_bytes = os.path.getsize(filename)
+    frames = generations + 1
+    packed_bytes = height * cellular_automata_bitpacked.words_per_row(width) * 8
+    with cellular_automata_history.HistoryReader(filename) as history:
+        start = time.perf_counter()
+        for _ in history.iter_range():
+            pass
+        decode_seconds = time.perf_counter() - start
+        samples = np.random.default_rng(seed_value).integers(0, frames, 50)
+        start = time.perf_counter()
+        for generation in samples:
+            history.grid(int(generation))
+        random_access_seconds = (time.perf_counter() - start) / len(samples)
+    os.remove(filename)
+    return {'file_bytes': file_bytes, 'ratio_uint8': width * height * frames / file_bytes,
+            'ratio_packed': packed_bytes * frames / file_bytes, 'record_seconds': record_seconds,
+            'decode_generations_per_second': frames / decode_seconds, 'random_access_seconds': random_access_seconds}
+
+
+def _count_neighbors(grid, border_type):
+    cells = grid.tolist()
+    rows, columns = grid.shape
+
+    def step():
+        for x in range(rows):
+            for y in range(columns):
+                cellular_automata.count_neighbors(cells, x, y, border_type)
+    return step, None
+
+
+def _registered(name):
+    """
+    Return the make function of the suite entry of a registered engine.
+    """
+    def make(grid, border_type):
+        engine = cellular_automata.get_engine(grid.shape, border_type, name=name)(grid, border_type)
+        return engine.step, getattr(engine, 'close', None)
+    return make
+
+
+def _automatic(grid, border_type):
+    engine = cellular_automata.get_engine(grid.shape, border_type)(grid, border_type)
+    return engine.step, getattr(engine, 'close', None)
+
+
+def _hashlife(grid, border_type):
+    universe = cellular_automata_hashlife.HashLife(grid, border_type)
+    return (lambda: universe.advance(1)), None
+
+
+def _numpy_roll(grid, border_type):
+    current = [grid]
+
+    def step():
+        current[0] = numpy_roll_step(current[0])
+    return step, None
+
+
+def suite_entries():
+    """
+    Return the entries of the benchmark suite: the grid initialisers, count_neighbors, the plain NumPy step
+    (numpy_roll_step, the baseline of the engines), every engine registered in cellular_automata (including the
+    multiprocess engine), 'auto' (the engine chosen by get_engine) and HashLife.
+
+    Returns:
+        dict: SuiteEntry by name.
+    """
+    entries = {
+        'initial_state_grid': SuiteEntry(
+            lambda grid, border_type: (lambda: cellular_automata.initial_state_grid(grid.shape[1], grid.shape[0], 1),
+                                       None), None, (None,), False),
+        'random_state_grid': SuiteEntry(
+            lambda grid, border_type: (lambda: cellular_automata.random_state_grid(grid.shape[1], grid.shape[0], 1),
+                                       None), None, (None,), False),
+        'count_neighbors': SuiteEntry(_count_neighbors, 10**4, cellular_automata.BORDER_TYPES, True),
+        'numpy-roll': SuiteEntry(_numpy_roll, None, ('toroidal',), True),
+    }
+    for name in cellular_automata.engine_names():
+        info = cellular_automata.get_engine_info(name)
+        entries[name] = SuiteEntry(_registered(name), info.max_cells, info.border_types, True)
+    entries['auto'] = SuiteEntry(_automatic, None, cellular_automata.BORDER_TYPES, True)
+    entries['hashlife'] = SuiteEntry(_hashlife, 10**6, ('death',), True)
+    return entries
+
+
+def measure(step, cells, repeats=5, min_seconds=0.02):
+    """
+    Measure the cells processed per second by a stepping function.
+
+    The number of calls per sample is doubled until a sample lasts at least `min_seconds`, so that short
+    steps are not dominated by the timer.
+
+    Parameters:
+        step (callable): Function processing `cells` cells, called with no arguments.
+        cells (int): The number of cells processed by each call.
+        repeats (int): The number of samples.
+        min_seconds (float): The shortest duration of a sample.
+
+    Returns:
+        list of float: The cells per second of every sample.
+    """
+    step()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            step()
+        if time.perf_counter() - start >= min_seconds or calls >= 2**16:
+            break
+        calls *= 2
+    rates = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            step()
+        rates.append(cells * calls / (time.perf_counter() - start))
+    return rates
+
+
+def summarize(rates):
+    """
+    Summarize samples of cells per second.
+
+    Parameters:
+        rates (list of float): The samples.
+
+    Returns:
+        dict: 'median', 'p25', 'p75', 'min' and 'max' of the samples, and 'spread', the interquartile range
+        relative to the median.
+    """
+    p25, median, p75 = np.percentile(rates, [25, 50, 75])
+    return {'median': float(median), 'p25': float(p25), 'p75': float(p75), 'min': float(min(rates)),
+            'max': float(max(rates)), 'spread': float((p75 - p25) / median)}
+
+
+def result_key(result):
+    """
+    Return the key identifying a suite result in comparisons: 'name|border_type|density|heightxwidth'.
+    """
+    return '{name}|{border_type}|{density}|{height}x{width}'.format(**result)
+
+
+def run_suite(names=None, max_cells=DEFAULT_MAX_CELLS, border_types=cellular_automata.BORDER_TYPES,
+              densities=DENSITIES, repeats=5, seed_value=1, report=None):
+    """
+    Run the benchmark suite over the size ladder, border types, densities and engines.
+
+    Parameters:
+        names (list of str, optional): The suite_entries to measure, all of them by default.
+        max_cells (int, optional): The largest grid of the ladder measured.
+        border_types (tuple of str, optional): The border types measured.
+        densities (tuple of float, optional): The fractions of alive cells of the random grids.
+        repeats (int, optional): The number of samples per measurement.
+        seed_value (int, optional): Seed of the random grids.
+        report (callable, optional): Called with every result as soon as it is measured.
+
+    Returns:
+        dict: {'machine': {...}, 'results': [...]}, ready to be saved as JSON. Every result has the keys
+        'name', 'border_type', 'density', 'height', 'width', 'cells', 'samples' and those of summarize, in cells
+        per second.
+    """
+    entries = suite_entries()
+    names = list(entries) if names is None else names
+    results = []
+    for height, width in SIZE_LADDER:
+        cells = height * width
+        if cells > max_cells:
+            break
+        for name in names:
+            entry = entries[name]
+            if entry.max_cells is not None and cells > entry.max_cells:
+                continue
+            for border_type in entry.border_types:
+                if border_type is not None and border_type not in border_types:
+                    continue
+                for density in densities if entry.uses_density else (None,):
+                    grid = cellular_automata.random_state_grid(width, height, seed_value,
+                                                               0.5 if density is None else density)
+                    step, close = entry.make(grid, border_type)
+                    try:
+                        rates = measure(step, cells, repeats)
+                    finally:
+                        if close is not None:
+                            close()
+                    result = {'name': name, 'border_type': border_type, 'density': density, 'height': height,
+                              'width': width, 'cells': cells, 'samples': rates}
+                    result.update(summarize(rates))
+                    results.append(result)
+                    if report is not None:
+                        report(result)
+    machine = {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+               'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'machine': machine, 'results': results}
+
+
+def compare_results(suite, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare suite results with a baseline.
+
+    Parameters:
+        suite (dict): The results of run_suite.
+        baseline (dict): Earlier results of run_suite, for example loaded from a JSON file.
+        threshold (float): The relative drop of the median cells per second counted as a regression.
+
+    Returns:
+        list of dict: One entry per result measured in both, with the keys 'key', 'baseline' and 'current'
+        (median cells per second), 'change' (relative) and 'regression' (bool).
+    """
+    before = {result_key(result): result['median'] for result in baseline['results']}
+    comparisons = []
+    for result in suite['results']:
+        key = result_key(result)
+        if key in before:
+            change = result['median'] / before[key] - 1
+            comparisons.append({'key': key, 'baseline': before[key], 'current': result['median'], 'change': change,
+                                'regression': change < -threshold})
+    return comparisons
+
+
+def _suite_main(args):
+    """
+    Run the suite for the command line, print and save the results, and return the exit status.
+    """
+    print('{:<20}{:<12}{:>8}{:>12}{:>16}{:>9}'.format('name', 'border', 'density', 'cells', 'cells/s', 'spread'))
+
+    def report(result):
+        print('{name:<20}{:<12}{:>8}{cells:>12}{median:>16.3e}{:>8.1f}%'.format(
+            str(result['border_type'] or '-'), '-' if result['density'] is None else result['density'],
+            result['spread'] * 100, **result), flush=True)
+
+    suite = run_suite(args.engines, args.max_cells, tuple(args.border_types), tuple(args.densities), args.repeats,
+                      report=report)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(suite, file, indent=1)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        comparisons = compare_results(suite, json.load(file), args.threshold)
+    regressions = [comparison for comparison in comparisons if comparison['regression']]
+    print('{} results compared with {}, {} regressions over {:.0f}%'.format(
+        len(comparisons), args.baseline, len(regressions), args.threshold * 100))
+    for comparison in regressions:
+        print('  {key}: {baseline:.3e} -> {current:.3e} cells/s ({:+.1f}%)'.format(
+            comparison['change'] * 100, **comparison))
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    """
+    Command line entry point: print the thread scaling of the threaded updates, or the throughput of the
+    out-of-core engine with --out-of-core, or the history file with --history, or the bit-packed engine against
+    the plain NumPy step with --bitpacked, or run the suite with --suite, or measure the engine crossovers of
+    this machine for get_engine with --autotune.
+
+    Returns:
+        int: The exit status, 1 if --baseline found regressions.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of Conway's game of life engines.")
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--height', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='largest number of threads')
+    parser.add_argument('--border-type', default='toroidal', choices=cellular_automata.BORDER_TYPES)
+    parser.add_argument('--generations', type=int, default=10)
+    parser.add_argument('--out-of-core', metavar='DIRECTORY',
+                        help='measure the out-of-core engine with grid files in this directory instead')
+    parser.add_argument('--history', metavar='DIRECTORY',
+                        help='measure the history file of a 512x512 soup over 1000 generations instead')
+    parser.add_argument('--bitpacked', action='store_true',
+                        help='compare the bit-packed engine with the plain NumPy step and the vectorized engine '
+                             'instead (use --width 10000 --height 10000 for 10^8 cells)')
+    suite = parser.add_argument_group('suite', 'cells per second over sizes, border types, densities and engines')
+    suite.add_argument('--suite', action='store_true', help='run the benchmark suite instead')
+    suite.add_argument('--max-cells', type=float, default=DEFAULT_MAX_CELLS,
+                       help='largest grid of the size ladder (up to 1e8)')
+    suite.add_argument('--engines', nargs='+', choices=list(suite_entries()), help='entries of the suite to run')
+    suite.add_argument('--border-types', nargs='+', default=list(cellular_automata.BORDER_TYPES),
+                       choices=cellular_automata.BORDER_TYPES)
+    suite.add_argument('--densities', nargs='+', type=float, default=list(DENSITIES))
+    suite.add_argument('--repeats', type=int, default=5, help='samples per measurement')
+    suite.add_argument('--json', metavar='PATH', help='save the results as JSON')
+    suite.add_argument('--baseline', metavar='PATH', help='compare with the JSON results of an earlier run')
+    suite.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                       help='relative slowdown reported as a regression (exit status 1)')
+    parser.add_argument('--autotune', action='store_true',
+                        help='measure the fastest engine per grid size and save it for cellular_automata.get_engine')
+    args = parser.parse_args(argv)
+
+    if args.autotune:
+        crossovers = cellular_automata.autotune()
+        print('Saved in {}'.format(cellular_automata.ENGINE_TUNING_FILE))
+        for border_type, pairs in crossovers.items():
+            print('{:<12}'.format(border_type) + ', '.join('{} from {} cells'.format(name, cells)
+                                                          for cells, name in pairs))
+        return 0
+    if args.suite:
+        return _suite_main(args)
+
+    if args.history:
+        result = benchmark_history(args.history)
+        print('history: {file_bytes} bytes, ratio {ratio_uint8:.1f}x (uint8) {ratio_packed:.1f}x (bit-packed), '
+              '{decode_generations_per_second:.0f} generations/s decoded, '
+              '{:.2f} ms per random generation'.format(result['random_access_seconds'] * 1000, **result))
+        return 0
+
+    if args.bitpacked:
+        result = benchmark_bitpacked(args.width, args.height, args.border_type, args.generations)
+        for name, rate in result['cells_per_second'].items():
+            print('{:<12}{:>14.3e} cells/s{:>8.3f} bytes/cell'.format(name, rate, result['bytes_per_cell'][name]))
+        print('bit-packed speed-up: {:.1f}x over numpy-roll (target {}x), {:.1f}x over vectorized'.format(
+            result['speedup_numpy_roll'], BITPACKED_TARGET, result['speedup_vectorized']))
+        return 0
+
+    if args.out_of_core:
+        print('{:>10}{:>12}{:>12}{:>12}{:>12}{:>10}'.format('band_rows', 'ms/gen', 'read ms', 'compute ms',
+                                                             'write ms', 'MB/s'))
+        for result in benchmark_out_of_core(args.width, args.height, args.out_of_core,
+                                            border_type=args.border_type, generations=args.generations):
+            print('{band_rows:>10}{:>12.1f}{:>12.1f}{:>12.1f}{:>12.1f}{megabytes_per_second:>10.0f}'.format(
+                result['seconds'] * 1000, result['read_seconds'] * 1000, result['compute_seconds'] * 1000,
+                result['write_seconds'] * 1000, **result))
+        return 0
+    print('{:<12}{:>8}{:>14}{:>18}{:>10}'.format('engine', 'threads', 'ms/gen', 'cells/s', 'speedup'))
+    for result in benchmark_threads(args.width, args.height, args.threads, args.border_type, args.generations):
+        print('{engine:<12}{threads:>8}{ms:>14.3f}{cells_per_second:>18.3e}{speedup:>10.2f}'.format(
+            ms=result['seconds'] * 1000, **result))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
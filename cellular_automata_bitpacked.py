@@ -0,0 +1,335 @@
+import numpy as np
+import cellular_automata
+
+# Each row of the grid is stored as ceil(width / 64) uint64 words, column c being bit c % 64 of word c // 64.
+WORD_BITS = 64
+_ONE = np.uint64(1)
+_LAST_BIT = np.uint64(WORD_BITS - 1)
+_ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+# Words updated per block in step_packed: 9 planes of 16384 words stay within a typical L2 cache.
+BLOCK_WORDS = 16384
+
+
+def words_per_row(width):
+    """
+    Return the number of uint64 words needed to store a row of the given width.
+
+    Parameters:
+        width (int): The width of the grid.
+
+    Returns:
+        int: ceil(width / 64).
+    """
+    return -(-width // WORD_BITS)
+
+
+def last_word_mask(width):
+    """
+    Return the mask of the bits of the last word of a row that belong to the grid.
+
+    Parameters:
+        width (int): The width of the grid.
+
+    Returns:
+        numpy.uint64: A word with the low (width % 64) bits set, or all bits set if width is a multiple of 64.
+    """
+    used = width % WORD_BITS
+    return _ALL_ONES if used == 0 else np.uint64((1 << used) - 1)
+
+
+def pack_grid(grid):
+    """
+    Pack a binary grid into 64 cells per uint64 word.
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The binary grid, as returned by initial_state_grid or update_grid.
+
+    Returns:
+        numpy.ndarray: A uint64 array of shape (height, ceil(width / 64)). The unused bits of the last
+        word of every row are 0.
+    """
+    grid = np.asarray(grid, dtype=np.uint8)
+    height, width = grid.shape
+    packed_bytes = np.zeros((height, words_per_row(width) * 8), dtype=np.uint8)
+    packed_bytes[:, :-(-width // 8)] = np.packbits(grid, axis=1, bitorder='little')
+    return packed_bytes.view('<u8').astype(np.uint64, copy=False)
+
+
+def unpack_grid(packed, width):
+    """
+    Unpack a bit-packed grid into a uint8 array with one cell per byte.
+
+    Parameters:
+        packed (numpy.ndarray): A uint64 array of shape (height, ceil(width / 64)), as returned by pack_grid.
+        width (int): The width of the grid.
+
+    Returns:
+        numpy.ndarray: A uint8 array of shape (height, width) with values 0 and 1.
+    """
+    packed_bytes = np.ascontiguousarray(packed, dtype='<u8').view(np.uint8)
+    return np.unpackbits(packed_bytes, axis=1, count=width, bitorder='little')
+
+
+def pad_packed(packed, width, border_type):
+    """
+    Copy a bit-packed grid into an array with one ghost row above and below, filled according to the border type.
+
+    Parameters:
+        packed (numpy.ndarray): A uint64 array of shape (height, words), as returned by pack_grid.
+        width (int): The width of the grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+
+    Returns:
+        numpy.ndarray: A uint64 array of shape (height + 2, words).
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options.
+    """
+    cellular_automata.check_border_type(border_type)
+    padded = np.empty((packed.shape[0] + 2, packed.shape[1]), dtype=np.uint64)
+    padded[1:-1] = packed
+    return fill_border_rows(padded, width, border_type)
+
+
+def fill_border_rows(padded, width, border_type):
+    """
+    Fill, in place, the ghost rows of a padded bit-packed grid according to the border type.
+
+    The ghost columns are not stored: step_packed derives them from each row while shifting.
+
+    Parameters:
+        padded (numpy.ndarray): A uint64 array of shape (height + 2, words).
+        width (int): The width of the grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+
+    Returns:
+        numpy.ndarray: The same `padded` array.
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options.
+    """
+    cellular_automata.check_border_type(border_type)
+    if border_type in ('death', 'alive'):
+        value = _ALL_ONES if border_type == 'alive' else np.uint64(0)
+        for row in (0, -1):
+            padded[row] = value
+            padded[row, -1] &= last_word_mask(width)
+    elif border_type == 'reflective':
+        padded[0] = padded[1]
+        padded[-1] = padded[-2]
+    else:
+        padded[0] = padded[-2]
+        padded[-1] = padded[1]
+    return padded
+
+
+def _edge_bits(rows, width, border_type):
+    """
+    Return, for every row, the value of the ghost cell west of column 0 and east of column width - 1.
+    """
+    first = rows[:, 0] & _ONE
+    last = (rows[:, -1] >> np.uint64((width - 1) % WORD_BITS)) & _ONE
+    if border_type == 'death':
+        return np.uint64(0), np.uint64(0)
+    if border_type == 'alive':
+        return _ONE, _ONE
+    if border_type == 'reflective':
+        return first, last
+    return last, first
+
+
+def step_packed(padded, width, border_type, out=None, block_words=BLOCK_WORDS, threads=1):
+    """
+    Apply the B3/S23 rule to a padded bit-packed grid with bitwise full-adder logic.
+
+    Parameters:
+        padded (numpy.ndarray): A uint64 array of shape (rows + 2, words) whose first and last rows are the
+            neighbors of the rows to update (ghost rows at the grid edges, see fill_border_rows).
+        width (int): The width of the grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        out (numpy.ndarray, optional): A uint64 array of shape (rows, words) receiving the result.
+        block_words (int, optional): Approximate number of words processed at once. The rows are updated in
+            blocks of this size so that the intermediate bit planes stay in the CPU cache.
+        threads (int, optional): Number of threads updating horizontal bands of rows in parallel.
+
+    Returns:
+        numpy.ndarray: The next generation of the rows, bit-packed.
+
+    Note:
+        The neighbor count of 64 cells is computed at once as three bit planes (count mod 8): the eight
+        neighbors are added as the three-cell sums of the rows above and below plus the west and east
+        cells of the row itself. A count of 8 wraps to 0, which is dead either way.
+    """
+    rows, words = padded.shape[0] - 2, padded.shape[1]
+    if out is None:
+        out = np.empty((rows, words), dtype=np.uint64)
+    if threads > 1:
+        cellular_automata.run_in_bands(
+            lambda start, stop: step_packed(padded[start:stop + 2], width, border_type, out[start:stop], block_words),
+            rows, threads)
+        return out
+    block_rows = max(1, min(rows, block_words // words))
+    scratch = np.empty((9, block_rows + 2, words), dtype=np.uint64)
+    for start in range(0, rows, block_rows):
+        stop = min(start + block_rows, rows)
+        _step_block(padded[start:stop + 2], width, border_type, out[start:stop], scratch)
+    return out
+
+
+def _step_block(padded, width, border_type, out, scratch):
+    """
+    Update the rows of a small padded block into `out`, using only the preallocated `scratch` planes.
+    """
+    size = padded.shape[0]
+    west, east, plane_a, plane_b, plane_c = (buffer[:size] for buffer in scratch[:5])
+    plane_t, plane_u, plane_v, plane_x = (buffer[:size - 2] for buffer in scratch[5:])
+    west_in, east_in = _edge_bits(padded, width, border_type)
+
+    # west[c] = cell c - 1 and east[c] = cell c + 1, carrying bits across word boundaries
+    np.left_shift(padded, _ONE, out=west)
+    np.right_shift(padded[:, :-1], _LAST_BIT, out=plane_a[:, 1:])
+    west[:, 1:] |= plane_a[:, 1:]
+    west[:, 0] |= west_in
+    np.right_shift(padded, _ONE, out=east)
+    np.left_shift(padded[:, 1:], _LAST_BIT, out=plane_a[:, :-1])
+    east[:, :-1] |= plane_a[:, :-1]
+    east[:, -1] |= east_in << np.uint64((width - 1) % WORD_BITS)
+
+    # two-bit sums of the three cells of every row (a + 2b), and of the west and east cells only (c + 2west)
+    np.bitwise_xor(west, padded, out=plane_a)
+    np.bitwise_and(west, padded, out=plane_b)
+    np.bitwise_and(east, plane_a, out=plane_c)
+    plane_b |= plane_c
+    plane_a ^= east
+    np.bitwise_xor(west, east, out=plane_c)
+    west &= east
+
+    # bit 0 of the count (t) and its carry (u), from the rows above, below and the sides
+    row_above, row_below, sides = plane_a[:-2], plane_a[2:], plane_c[1:-1]
+    carry = east[:-2]
+    np.bitwise_xor(row_above, row_below, out=plane_t)
+    np.bitwise_and(row_above, row_below, out=plane_u)
+    np.bitwise_and(sides, plane_t, out=carry)
+    plane_u |= carry
+    plane_t ^= sides
+
+    # bits 1 (v) and 2 (x) of the count
+    row_above, row_below, sides = plane_b[:-2], plane_b[2:], west[1:-1]
+    np.bitwise_xor(row_above, row_below, out=plane_v)
+    np.bitwise_and(row_above, row_below, out=plane_x)
+    np.bitwise_and(sides, plane_v, out=carry)
+    plane_x |= carry
+    plane_v ^= sides
+    np.bitwise_and(plane_v, plane_u, out=carry)
+    plane_x ^= carry
+    plane_v ^= plane_u
+
+    # alive next when the count is 3, or 2 for a cell that is alive now
+    plane_t |= padded[1:-1]
+    plane_v &= plane_t
+    np.invert(plane_x, out=plane_x)
+    np.bitwise_and(plane_v, plane_x, out=out)
+    out[:, -1] &= last_word_mask(width)
+
+
+def update_packed(packed, width, border_type, threads=1):
+    """
+    Compute the next generation of a bit-packed grid.
+
+    Parameters:
+        packed (numpy.ndarray): A uint64 array of shape (height, words), as returned by pack_grid.
+        width (int): The width of the grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        threads (int, optional): Number of threads updating horizontal bands of rows in parallel.
+
+    Returns:
+        numpy.ndarray: The next generation, bit-packed.
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options.
+    """
+    return step_packed(pad_packed(packed, width, border_type), width, border_type, threads=threads)
+
+
+def update_grid_packed(grid, border_type, threads=1):
+    """
+    Compute the next generation of a grid with the bit-packed engine.
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The binary grid, as used by update_grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        threads (int, optional): Number of threads updating horizontal bands of rows in parallel.
+
+    Returns:
+        numpy.ndarray: The next generation as a uint8 array, equal to update_grid(grid, border_type).
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options.
+    """
+    width = np.shape(grid)[1]
+    return unpack_grid(update_packed(pack_grid(grid), width, border_type, threads), width)
+
+
+class PackedSimulation:
+    """
+    A bit-packed grid evolving in place: two preallocated padded uint64 buffers are swapped at every generation.
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The initial binary grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        threads (int, optional): Number of threads updating horizontal bands of rows in parallel.
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options.
+
+    Examples:
+        simulation = PackedSimulation(cellular_automata.initial_state_grid(1000, 1000, 1), 'toroidal')
+        simulation.step(10)
+        current_grid = simulation.to_grid()
+    """
+
+    def __init__(self, grid, border_type, threads=1):
+        grid = np.asarray(grid, dtype=np.uint8)
+        self.width = grid.shape[1]
+        self.border_type = border_type
+        self.threads = threads
+        self.generation = 0
+        current = pad_packed(pack_grid(grid), self.width, border_type)
+        self._buffers = [current, current.copy()]
+
+    @property
+    def packed(self):
+        """
+        numpy.ndarray: The current generation, bit-packed, valid until the next step.
+        """
+        return self._buffers[0][1:-1]
+
+    @property
+    def grid(self):
+        """
+        numpy.ndarray: The current generation unpacked to a uint8 array.
+        """
+        return unpack_grid(self.packed, self.width)
+
+    def step(self, generations=1):
+        """
+        Advance the grid by the given number of generations.
+
+        Parameters:
+            generations (int, optional): The number of generations.
+        """
+        for _ in range(generations):
+            target = self._buffers[1]
+            step_packed(self._buffers[0], self.width, self.border_type, out=target[1:-1], threads=self.threads)
+            fill_border_rows(target, self.width, self.border_type)
+            self._buffers.reverse()
+            self.generation += 1
+
+    def to_grid(self):
+        """
+        Return a copy of the current generation.
+
+        Returns:
+            numpy.ndarray: A uint8 array of shape (height, width).
+        """
+        return self.grid
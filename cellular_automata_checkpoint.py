@@ -0,0 +1,379 @@
+import bisect
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+import numpy as np
+import cellular_automata
+import cellular_automata_bitpacked
+
+# A checkpoint file is MAGIC, the length of the header as a little-endian uint32, the JSON header and the body.
+MAGIC = b'GOLCKPT1'
+RULE = cellular_automata.RULE
+COMPRESSIONS = ('zlib', 'rle', 'none')
+_LENGTH = struct.Struct('<I')
+# Compressed bytes read at once by load_checkpoint.
+READ_BYTES = 1 << 22
+# Snapshots kept on disk by CheckpointScheduler.
+DEFAULT_KEEP = 3
+
+Checkpoint = namedtuple('Checkpoint', ['grid', 'header'])
+Checkpoint.__doc__ = """
+A grid loaded by load_checkpoint, with the header of the file (see read_checkpoint_header).
+"""
+
+
+def _rle_encode(data):
+    """
+    Run-length encode a byte array as the number of runs (uint64), the run values and the run lengths (uint32).
+    """
+    if data.size == 0:
+        return np.uint64(0).tobytes()
+    starts = np.flatnonzero(np.diff(data)) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.append(starts, data.size))
+    # runs longer than a uint32 are split, so that the lengths always fit
+    limit = 2**32 - 1
+    if lengths.max() > limit:
+        pieces = -(-lengths // limit)
+        values = np.repeat(data[starts], pieces)
+        split = np.full(pieces.sum(), limit, dtype=np.int64)
+        ends = np.cumsum(pieces) - 1
+        split[ends] = lengths - (pieces - 1) * limit
+        lengths = split
+    else:
+        values = data[starts]
+    return (np.uint64(values.size).tobytes() + values.astype(np.uint8).tobytes()
+            + lengths.astype('<u4').tobytes())
+
+
+def _rle_decode(body):
+    """
+    Decode the bytes written by _rle_encode.
+    """
+    runs = int(np.frombuffer(body, dtype='<u8', count=1)[0])
+    values = np.frombuffer(body, dtype=np.uint8, count=runs, offset=8)
+    lengths = np.frombuffer(body, dtype='<u4', count=runs, offset=8 + runs)
+    return np.repeat(values, lengths)
+
+
+def save_checkpoint(filename, grid, border_type, generation=0, seed_value=None, compression='zlib', width=None,
+                    level=1, sync=False):
+    """
+    Save a grid and the state of the simulation to a checkpoint file.
+
+    The grid is stored bit-packed, row by row as by cellular_automata_bitpacked.pack_grid, and then compressed.
+
+    Parameters:
+        filename (str): The checkpoint file to write.
+        grid (numpy.ndarray): The binary grid, or a bit-packed grid (uint64 words) if `width` is given.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        generation (int, optional): The generation number of the grid.
+        seed_value (int, optional): The seed of the initial grid.
+        compression (str, optional): 'zlib', 'rle' (run lengths of the packed bytes, best for sparse
+            grids) or 'none'.
+        width (int, optional): The width of the grid, when `grid` is bit-packed.
+        level (int, optional): The zlib compression level.
+        sync (bool, optional): fsync the file before returning.
+
+    Returns:
+        dict: The header written to the file.
+
+    Raises:
+        ValueError: If the `border_type` or the `compression` is not one of the valid options.
+    """
+    cellular_automata.check_border_type(border_type)
+    if compression not in COMPRESSIONS:
+        raise ValueError('Invalid compression {!r}: expected one of {}'.format(compression, COMPRESSIONS))
+    if width is None:
+        grid = np.asarray(grid)
+        width = grid.shape[1]
+        grid = cellular_automata_bitpacked.pack_grid(grid)
+    packed = np.ascontiguousarray(grid, dtype='<u8').view(np.uint8).reshape(-1)
+    if compression == 'zlib':
+        body = zlib.compress(packed, level)
+    elif compression == 'rle':
+        body = _rle_encode(packed)
+    else:
+        body = packed
+    header = {'shape': [grid.shape[0], width], 'border_type': border_type, 'rule': RULE,
+              'generation': generation, 'seed_value': seed_value, 'compression': compression,
+              'body_bytes': len(body), 'packed_bytes': packed.size}
+    encoded = json.dumps(header).encode('utf-8')
+    with open(filename, 'wb') as file:
+        file.write(MAGIC)
+        file.write(_LENGTH.pack(len(encoded)))
+        file.write(encoded)
+        file.write(body)
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+    return header
+
+
+def _read_header(file):
+    """
+    Read the header of an open checkpoint file, leaving the file at the start of the body.
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError('{} is not a checkpoint file'.format(getattr(file, 'name', file)))
+    length, = _LENGTH.unpack(file.read(_LENGTH.size))
+    return json.loads(file.read(length).decode('utf-8'))
+
+
+def read_checkpoint_header(filename):
+    """
+    Read the header of a checkpoint file without reading the grid.
+
+    Parameters:
+        filename (str): The checkpoint file.
+
+    Returns:
+        dict: The header, with the keys 'shape' ([height, width]), 'border_type', 'rule', 'generation',
+        'seed_value', 'compression', 'body_bytes' and 'packed_bytes'.
+
+    Raises:
+        ValueError: If the file is not a checkpoint file.
+    """
+    with open(filename, 'rb') as file:
+        return _read_header(file)
+
+
+def _inflate_into(file, length, out):
+    """
+    Decompress `length` zlib bytes read from `file` into the uint8 array `out`, returning the bytes written
+    or -1 if the stream is incomplete.
+    """
+    decompressor = zlib.decompressobj()
+    filled = 0
+    while length > 0:
+        chunk = file.read(min(READ_BYTES, length))
+        if not chunk:
+            break
+        length -= len(chunk)
+        # max_length keeps a corrupted body from writing past the end of out
+        piece = decompressor.decompress(chunk, out.size - filled + 1)
+        if filled + len(piece) > out.size:
+            break
+        out[filled:filled + len(piece)] = np.frombuffer(piece, dtype=np.uint8)
+        filled += len(piece)
+    # a truncated stream can stop exactly at the end of the grid, but not at the end of the zlib stream
+    return filled if decompressor.eof else -1
+
+
+def load_checkpoint(filename, packed=False):
+    """
+    Load a grid saved by save_checkpoint.
+
+    Parameters:
+        filename (str): The checkpoint file.
+        packed (bool, optional): Return the grid bit-packed, as used by cellular_automata_bitpacked,
+            instead of one uint8 per cell.
+
+    Returns:
+        Checkpoint: The grid and the header of the file.
+
+    Raises:
+        ValueError: If the file is not a checkpoint file, or it is truncated.
+
+    Note:
+        A zlib body is read and decompressed in chunks of READ_BYTES straight into the grid, so loading
+        needs no memory beyond the grid and is bound by the disk and zlib rather than by Python.
+    """
+    with open(filename, 'rb') as file:
+        header = _read_header(file)
+        if header['compression'] == 'rle':
+            body = file.read(header['body_bytes'])
+            data = _rle_decode(body) if len(body) == header['body_bytes'] else np.empty(0, dtype=np.uint8)
+        else:
+            data = np.empty(header['packed_bytes'], dtype=np.uint8)
+            if header['compression'] == 'none':
+                filled = file.readinto(data)
+            else:
+                filled = _inflate_into(file, header['body_bytes'], data)
+            if filled != data.size:
+                data = data[:0]
+    if data.size != header['packed_bytes']:
+        raise ValueError('{} is truncated or corrupted'.format(filename))
+    height, width = header['shape']
+    grid = data.view('<u8').reshape(height, -1)
+    if not packed:
+        grid = cellular_automata_bitpacked.unpack_grid(grid, width)
+    return Checkpoint(grid, header)
+
+
+class CheckpointScheduler:
+    """
+    Save a checkpoint every few generations from a background thread, without stalling the stepping loop.
+
+    submit() is called with the grid after every generation; on the scheduled generations it packs the
+    grid into a frozen bit-packed copy (an eighth of the uint8 grid) and queues it. A writer thread
+    compresses it (zlib releases the GIL), writes it to a temporary file, fsyncs it and renames it over
+    the final name, so a checkpoint on disk is always complete. Only the `keep` checkpoints of highest
+    generation are kept, including ones left in the directory by an earlier run. When `max_pending`
+    snapshots are already waiting, submit() blocks until the writer catches up (back-pressure), and the
+    time spent waiting is added to `blocked_seconds`.
+
+    Parameters:
+        directory (str): The directory of the checkpoints, created if needed.
+        every (int): Save the generations that are multiples of `every`.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        seed_value (int, optional): The seed stored in the checkpoints.
+        keep (int, optional): The number of checkpoints kept on disk, older ones are removed.
+        compression (str, optional): 'zlib', 'rle' or 'none', as in save_checkpoint.
+        max_pending (int, optional): The number of snapshots that may wait for the writer.
+        prefix (str, optional): The checkpoints are named prefix-<generation>.ckpt.
+
+    Raises:
+        ValueError: If `every` or `keep` is less than 1, or the `border_type` or `compression` is not valid.
+
+    Note:
+        The stepping thread only pays for pack_grid, about 0.6 ms for 2000x2000 cells (3% of the 10 generations
+        between two checkpoints every 10 generations). The compression runs on another core when one is
+        free; on a single CPU it takes its time from the stepping instead, so the target of a step time within
+        a few percent of the one without checkpoints is not met there (+29% with zlib in that case, about +10%
+        with compression='none').
+
+    Examples:
+        with CheckpointScheduler('checkpoints', 1000, 'toroidal') as scheduler:
+            for generation in range(1, 10**6):
+                grid = cellular_automata.update_grid(grid, 'toroidal')
+                scheduler.submit(grid, generation)
+    """
+
+    def __init__(self, directory, every, border_type, seed_value=None, keep=DEFAULT_KEEP, compression='zlib',
+                 max_pending=1, prefix='checkpoint'):
+        cellular_automata.check_border_type(border_type)
+        if compression not in COMPRESSIONS:
+            raise ValueError('Invalid compression {!r}: expected one of {}'.format(compression, COMPRESSIONS))
+        if every < 1 or keep < 1:
+            raise ValueError('every and keep must be >= 1, but are {} and {}'.format(every, keep))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every = every
+        self.border_type = border_type
+        self.seed_value = seed_value
+        self.keep = keep
+        self.compression = compression
+        self.prefix = prefix
+        self.blocked_seconds = 0.0
+        # checkpoints left by an earlier run count towards `keep`; the zero-padded names sort by generation
+        self.saved = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                            if name.startswith(prefix + '-') and name.endswith('.ckpt'))
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._write_loop, name='life-checkpoint', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def latest(self):
+        """
+        str: The complete checkpoint of highest generation, or None.
+        """
+        return self.saved[-1] if self.saved else None
+
+    def filename(self, generation):
+        """
+        Return the name of the checkpoint of a generation.
+
+        Parameters:
+            generation (int): The generation number.
+
+        Returns:
+            str: The path directory/prefix-<generation>.ckpt, zero-padded so that the names sort by generation.
+        """
+        return os.path.join(self.directory, '{}-{:012d}.ckpt'.format(self.prefix, generation))
+
+    def submit(self, grid, generation):
+        """
+        Queue a snapshot of the grid if the generation is scheduled.
+
+        Parameters:
+            grid (numpy.ndarray): The binary grid of this generation; it is not kept after the call.
+            generation (int): The generation number of the grid.
+
+        Returns:
+            bool: True if a snapshot was queued.
+
+        Raises:
+            Exception: The error of a failed earlier write, if any.
+        """
+        self._raise_error()
+        if generation % self.every:
+            return False
+        grid = np.asarray(grid)
+        snapshot = (cellular_automata_bitpacked.pack_grid(grid), grid.shape[1], generation)
+        start = time.perf_counter()
+        self._queue.put(snapshot)
+        self.blocked_seconds += time.perf_counter() - start
+        return True
+
+    def _write_loop(self):
+        """
+        Writer thread: save the queued snapshots until close() queues None.
+        """
+        while True:
+            snapshot = self._queue.get()
+            if snapshot is None:
+                break
+            if self._error is not None:
+                continue
+            packed, width, generation = snapshot
+            filename = self.filename(generation)
+            try:
+                save_checkpoint(filename + '.tmp', packed, self.border_type, generation, self.seed_value,
+                                self.compression, width=width, sync=True)
+                os.replace(filename + '.tmp', filename)
+                _sync_directory(self.directory)
+                if filename not in self.saved:
+                    bisect.insort(self.saved, filename)
+                while len(self.saved) > self.keep:
+                    os.remove(self.saved.pop(0))
+            except Exception as error:
+                self._error = error
+
+    def _raise_error(self):
+        """
+        Raise, once, the error of a failed write.
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self):
+        """
+        Wait until the queued snapshots are written and stop the writer thread.
+
+        Raises:
+            Exception: The error of a failed write, if any.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+def _sync_directory(directory):
+    """
+    fsync a directory so that a rename inside it is durable, where the platform allows it.
+    """
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
@@ -0,0 +1,434 @@
+import numpy as np
+
+# Border types handled by HashLife: the 'death' borders of cellular_automata and an unbounded plane
+HASHLIFE_BORDER_TYPES = ('death', 'unbounded')
+
+# Default limit on the number of canonical nodes kept before a garbage collection
+DEFAULT_MAX_NODES = 1000000
+
+_NEIGHBOR_OFFSETS = [
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1),           (0, 1),
+    (1, -1), (1, 0), (1, 1)
+]
+
+
+class Node:
+    """
+    A square quadtree node of side 2**level.
+
+    Nodes of level 0 are single cells; the others are made of four children of level - 1. Nodes are
+    hash-consed by HashLife, so two equal regions are always the same Node object.
+    """
+    __slots__ = ('nw', 'ne', 'sw', 'se', 'level', 'population')
+
+    def __init__(self, nw, ne, sw, se, level, population):
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.level = level
+        self.population = population
+
+
+class HashLife:
+    """
+    Conway's game of life on a hash-consed quadtree with memoized results (HashLife).
+
+    The universe is a root node covering the square of side 2**root.level whose top-left corner is
+    (origin_row, origin_col) in grid coordinates; the grid given to the constructor starts at (0, 0).
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The initial binary grid.
+        border_type (str): 'death' to keep every cell outside the grid dead, as update_grid does, or
+            'unbounded' to let the pattern evolve on the infinite plane.
+        max_nodes (int): Number of canonical nodes above which the node table is garbage collected, between
+            two jumps; the jumps are kept small enough to stay under it.
+
+    Raises:
+        ValueError: If the `border_type` is not 'death' or 'unbounded'.
+
+    Note:
+        On the unbounded plane advance(n) is split into jumps of 2**j generations, as large as the node
+        table allows: the largest jump doubles after a jump leaving the table under half of max_nodes, and
+        halves after one leaving it above. The table is only collected between jumps, so the nodes stay
+        hash-consed during a jump. With 'death' borders the cells that leave the grid must be removed after
+        every generation, so the universe is advanced one generation at a time; still lifes and oscillators
+        remain cheap because the result of each generation is memoized. When the live nodes alone exceed
+        max_nodes, the table is collected again only once it has doubled.
+    """
+
+    def __init__(self, grid, border_type='death', max_nodes=DEFAULT_MAX_NODES):
+        if border_type not in HASHLIFE_BORDER_TYPES:
+            raise ValueError("border_type must to be set as: death or unbounded")
+        self.border_type = border_type
+        self.max_nodes = max_nodes
+        self._collected = 0
+        # exponent of the largest jump of the unbounded universe, adapted to max_nodes by advance()
+        self._jump = 0
+        self._nodes = {}
+        self._results = {}
+        self._rasters = {}
+        self._leaves = (Node(None, None, None, None, 0, 0), Node(None, None, None, None, 0, 1))
+        self._empty = [self._leaves[0]]
+        self._level1 = [self._join(*(self._leaves[(code >> bit) & 1] for bit in range(4))) for code in range(16)]
+
+        cells = np.asarray(grid, dtype=np.uint8)
+        self.height, self.width = cells.shape
+        self.generation = 0
+        self.origin_row = 0
+        self.origin_col = 0
+        self.root = self._from_array(cells)
+
+    @property
+    def population(self):
+        """
+        int: The number of alive cells in the universe.
+        """
+        return self.root.population
+
+    def _join(self, nw, ne, sw, se):
+        """
+        Return the canonical node made of the four given children.
+        """
+        key = (id(nw), id(ne), id(sw), id(se))
+        node = self._nodes.get(key)
+        if node is None:
+            population = nw.population + ne.population + sw.population + se.population
+            node = Node(nw, ne, sw, se, nw.level + 1, population)
+            self._nodes[key] = node
+        return node
+
+    def _empty_node(self, level):
+        """
+        Return the canonical empty node of the given level.
+        """
+        while len(self._empty) <= level:
+            empty = self._empty[-1]
+            self._empty.append(self._join(empty, empty, empty, empty))
+        return self._empty[level]
+
+    def _from_array(self, cells):
+        """
+        Build the quadtree of a grid, placed at the top-left corner of the smallest fitting square.
+
+        The nodes are built one level at a time: the children of all the nodes of a level are grouped with
+        numpy and each distinct group of four children is joined only once.
+        """
+        side = 4
+        while side < max(cells.shape):
+            side *= 2
+        square = np.zeros((side, side), dtype=np.uint8)
+        square[:cells.shape[0], :cells.shape[1]] = cells != 0
+
+        ids = square[0::2, 0::2] | square[0::2, 1::2] << 1 | square[1::2, 0::2] << 2 | square[1::2, 1::2] << 3
+        nodes = self._level1
+        while ids.shape[0] > 1:
+            groups = np.stack([ids[0::2, 0::2], ids[0::2, 1::2], ids[1::2, 0::2], ids[1::2, 1::2]], axis=-1)
+            unique, inverse = np.unique(groups.reshape(-1, 4), axis=0, return_inverse=True)
+            nodes = [self._join(nodes[nw], nodes[ne], nodes[sw], nodes[se]) for nw, ne, sw, se in unique.tolist()]
+            ids = inverse.reshape(groups.shape[:2])
+        return nodes[ids[0, 0]]
+
+    def _centre(self, node):
+        """
+        Return the node of level - 1 at the centre of `node`.
+        """
+        return self._join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def _expand(self):
+        """
+        Place the root at the centre of an empty node twice as large.
+        """
+        root = self.root
+        empty = self._empty_node(root.level - 1)
+        self.root = self._join(self._join(empty, empty, empty, root.nw),
+                               self._join(empty, empty, root.ne, empty),
+                               self._join(empty, root.sw, empty, empty),
+                               self._join(root.se, empty, empty, empty))
+        self.origin_row -= 1 << (root.level - 1)
+        self.origin_col -= 1 << (root.level - 1)
+
+    def _trim(self):
+        """
+        Replace the root by its centre while the cells outside the centre are all dead.
+        """
+        while self.root.level > 2 and self._centre(self.root).population == self.root.population:
+            self.origin_row += 1 << (self.root.level - 2)
+            self.origin_col += 1 << (self.root.level - 2)
+            self.root = self._centre(self.root)
+
+    def _life_4x4(self, node):
+        """
+        Return the 2x2 centre of a 4x4 node advanced by one generation.
+        """
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        cells = [
+            [nw.nw.population, nw.ne.population, ne.nw.population, ne.ne.population],
+            [nw.sw.population, nw.se.population, ne.sw.population, ne.se.population],
+            [sw.nw.population, sw.ne.population, se.nw.population, se.ne.population],
+            [sw.sw.population, sw.se.population, se.sw.population, se.se.population]
+        ]
+        centre = []
+        for x, y in ((1, 1), (1, 2), (2, 1), (2, 2)):
+            count = sum(cells[x + dx][y + dy] for dx, dy in _NEIGHBOR_OFFSETS)
+            centre.append(self._leaves[1 if count == 3 or (cells[x][y] == 1 and count == 2) else 0])
+        return self._join(*centre)
+
+    def _successor(self, node, j):
+        """
+        Return the centre of `node` (level - 1) advanced by 2**j generations, with 0 <= j <= level - 2.
+        """
+        if node.population == 0:
+            return self._empty_node(node.level - 1)
+        key = (node, j)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+
+        if node.level == 2:
+            result = self._life_4x4(node)
+        else:
+            join = self._join
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            # the nine overlapping nodes of level - 1 covering `node`
+            parts = [nw, join(nw.ne, ne.nw, nw.se, ne.sw), ne,
+                     join(nw.sw, nw.se, sw.nw, sw.ne), join(nw.se, ne.sw, sw.ne, se.nw), join(ne.sw, ne.se, se.nw, se.ne),
+                     sw, join(sw.ne, se.nw, sw.se, se.sw), se]
+            if j == node.level - 2:
+                # full speed: two half steps, first on the nine parts then on four overlapping centres
+                c = [self._successor(part, j - 1) for part in parts]
+                result = join(self._successor(join(c[0], c[1], c[3], c[4]), j - 1),
+                              self._successor(join(c[1], c[2], c[4], c[5]), j - 1),
+                              self._successor(join(c[3], c[4], c[6], c[7]), j - 1),
+                              self._successor(join(c[4], c[5], c[7], c[8]), j - 1))
+            else:
+                # smaller step: advance the nine parts and keep the cells of the centre
+                c = [self._successor(part, j) for part in parts]
+                result = join(join(c[0].se, c[1].sw, c[3].ne, c[4].nw),
+                              join(c[1].se, c[2].sw, c[4].ne, c[5].nw),
+                              join(c[3].se, c[4].sw, c[6].ne, c[7].nw),
+                              join(c[4].se, c[5].sw, c[7].ne, c[8].nw))
+        self._results[key] = result
+        return result
+
+    def _clip(self, node, row, col):
+        """
+        Return `node`, whose top-left cell is at (row, col), with every cell outside the grid set dead.
+        """
+        size = 1 << node.level
+        if node.population == 0 or (row >= 0 and col >= 0 and row + size <= self.height and col + size <= self.width):
+            return node
+        if row >= self.height or col >= self.width or row + size <= 0 or col + size <= 0:
+            return self._empty_node(node.level)
+        half = size >> 1
+        return self._join(self._clip(node.nw, row, col), self._clip(node.ne, row, col + half),
+                          self._clip(node.sw, row + half, col), self._clip(node.se, row + half, col + half))
+
+    def _step_pow2(self, j):
+        """
+        Advance the unbounded universe by 2**j generations.
+        """
+        # the pattern must stay inside the centre returned by _successor, which cells reach at light speed
+        while self.root.level < j + 1:
+            self._expand()
+        self._expand()
+        self._expand()
+        level = self.root.level
+        self.root = self._successor(self.root, j)
+        self.origin_row += 1 << (level - 2)
+        self.origin_col += 1 << (level - 2)
+        self._trim()
+
+    def _step_death(self):
+        """
+        Advance the universe with death borders by one generation.
+        """
+        # after one expansion the grid square is exactly the centre returned by _successor
+        self._expand()
+        level = self.root.level
+        self.root = self._successor(self.root, 0)
+        self.origin_row += 1 << (level - 2)
+        self.origin_col += 1 << (level - 2)
+        self.root = self._clip(self.root, self.origin_row, self.origin_col)
+
+    def advance(self, generations):
+        """
+        Advance the universe by the given number of generations.
+
+        Parameters:
+            generations (int): The number of generations, >= 0.
+
+        Raises:
+            ValueError: If `generations` is negative.
+        """
+        if generations < 0:
+            raise ValueError('generations must be >= 0, but is {}'.format(generations))
+        if self.border_type == 'death':
+            for _ in range(generations):
+                self._step_death()
+                self._check_memory()
+        else:
+            remaining = generations
+            while remaining:
+                j = min(remaining.bit_length() - 1, self._jump)
+                self._step_pow2(j)
+                remaining -= 1 << j
+                # the table only grows during a jump, so its size now is the peak of the jump
+                if len(self._nodes) > self.max_nodes:
+                    self._jump = max(0, j - 1)
+                elif j == self._jump and 2 * len(self._nodes) <= self.max_nodes:
+                    self._jump += 1
+                self._check_memory()
+        self.generation += generations
+
+    def _check_memory(self):
+        """
+        Garbage collect the node table when it holds more than max_nodes nodes, and twice as many as were
+        left by the previous collection.
+        """
+        if len(self._nodes) > max(self.max_nodes, 2 * self._collected):
+            self.collect()
+
+    def collect(self):
+        """
+        Drop every node not reachable from the root, together with all the memoized results.
+        """
+        self._results.clear()
+        self._rasters.clear()
+        old_nodes, self._nodes = self._nodes, {}
+        stack = [self.root] + self._empty + self._level1
+        while stack:
+            node = stack.pop()
+            if node.level == 0:
+                continue
+            key = (id(node.nw), id(node.ne), id(node.sw), id(node.se))
+            if key not in self._nodes:
+                self._nodes[key] = node
+                stack.extend((node.nw, node.ne, node.sw, node.se))
+        del old_nodes
+        self._collected = len(self._nodes)
+
+    def node_count(self):
+        """
+        Return the number of canonical nodes currently stored.
+
+        Returns:
+            int: The size of the node table.
+        """
+        return len(self._nodes)
+
+    def bounding_box(self):
+        """
+        Return the smallest rectangle containing every alive cell.
+
+        Returns:
+            tuple: (top, left, bottom, right) in grid coordinates, bottom and right excluded, or None if
+            there are no alive cells.
+        """
+        if self.root.population == 0:
+            return None
+        top = self._edge(self.root, ('nw', 'ne'), ('sw', 'se'), self.origin_row, 'row', min)
+        bottom = self._edge(self.root, ('sw', 'se'), ('nw', 'ne'), self.origin_row, 'row', max)
+        left = self._edge(self.root, ('nw', 'sw'), ('ne', 'se'), self.origin_col, 'col', min)
+        right = self._edge(self.root, ('ne', 'se'), ('nw', 'sw'), self.origin_col, 'col', max)
+        return top, left, bottom + 1, right + 1
+
+    def _edge(self, node, near, far, start, axis, pick):
+        """
+        Return the first (pick=min) or last (pick=max) row or column holding an alive cell.
+        """
+        if node.level == 0:
+            return start
+        half = 1 << (node.level - 1)
+        offsets = {'nw': (0, 0), 'ne': (0, half), 'sw': (half, 0), 'se': (half, half)}
+        index = 0 if axis == 'row' else 1
+        found = [self._edge(getattr(node, name), near, far, start + offsets[name][index], axis, pick)
+                 for name in near if getattr(node, name).population]
+        if not found:
+            found = [self._edge(getattr(node, name), near, far, start + offsets[name][index], axis, pick)
+                     for name in far if getattr(node, name).population]
+        return pick(found)
+
+    def to_grid(self, top=0, left=0, height=None, width=None):
+        """
+        Export a window of the universe as a dense grid.
+
+        Parameters:
+            top (int): First row of the window, in grid coordinates.
+            left (int): First column of the window, in grid coordinates.
+            height (int, optional): Height of the window, by default the height of the initial grid.
+            width (int, optional): Width of the window, by default the width of the initial grid.
+
+        Returns:
+            numpy.ndarray: A uint8 array of shape (height, width).
+        """
+        height = self.height if height is None else height
+        width = self.width if width is None else width
+        out = np.zeros((height, width), dtype=np.uint8)
+        self._paint(self.root, self.origin_row - top, self.origin_col - left, out)
+        return out
+
+    def _paint(self, node, row, col, out):
+        """
+        Write the alive cells of `node`, whose top-left cell is at (row, col) of `out`, into `out`.
+        """
+        size = 1 << node.level
+        if node.population == 0 or row >= out.shape[0] or col >= out.shape[1] or row + size <= 0 or col + size <= 0:
+            return
+        if node.level == 0:
+            out[row, col] = 1
+        elif node.level <= 3 and row >= 0 and col >= 0 and row + size <= out.shape[0] and col + size <= out.shape[1]:
+            out[row:row + size, col:col + size] = self._raster(node)
+        else:
+            half = size >> 1
+            self._paint(node.nw, row, col, out)
+            self._paint(node.ne, row, col + half, out)
+            self._paint(node.sw, row + half, col, out)
+            self._paint(node.se, row + half, col + half, out)
+
+    def _raster(self, node):
+        """
+        Return the cells of a small node as a dense array, memoized.
+        """
+        raster = self._rasters.get(node)
+        if raster is None:
+            size = 1 << node.level
+            raster = np.zeros((size, size), dtype=np.uint8)
+            self._paint_children(node, raster)
+            self._rasters[node] = raster
+        return raster
+
+    def _paint_children(self, node, raster):
+        """
+        Fill the raster of a node of level 1 to 3 from its children.
+        """
+        if node.level == 1:
+            raster[:] = [[node.nw.population, node.ne.population], [node.sw.population, node.se.population]]
+            return
+        half = raster.shape[0] >> 1
+        raster[:half, :half] = self._raster(node.nw)
+        raster[:half, half:] = self._raster(node.ne)
+        raster[half:, :half] = self._raster(node.sw)
+        raster[half:, half:] = self._raster(node.se)
+
+
+def advance(grid, generations, border_type='death', max_nodes=DEFAULT_MAX_NODES):
+    """
+    Advance a grid by many generations at once with HashLife.
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The binary grid.
+        generations (int): The number of generations.
+        border_type (str): 'death' (same result as calling update_grid `generations` times) or 'unbounded'.
+        max_nodes (int): Number of canonical nodes above which the node table is garbage collected.
+
+    Returns:
+        numpy.ndarray: The same window of the plane as `grid` after `generations` generations, as uint8.
+
+    Raises:
+        ValueError: If the `border_type` is not 'death' or 'unbounded', or `generations` is negative.
+    """
+    universe = HashLife(grid, border_type, max_nodes)
+    universe.advance(generations)
+    return universe.to_grid()
@@ -0,0 +1,141 @@
+import time
+
+# Start of the module, for the start-up time reported at the end of a run where the launch time is unknown
+_LOADED = time.perf_counter()
+
+import argparse
+import os
+import numpy as np
+import cellular_automata
+
+
+def _launched_ago():
+    """
+    Return the seconds elapsed since the interpreter was launched, including its own start-up and the imports.
+
+    Returns:
+        float: The age of the process, read from /proc (Linux) with the resolution of a clock tick, or None
+        where it is not available.
+    """
+    try:
+        with open('/proc/self/stat') as stat:
+            # the fields after the command name (which may contain spaces) start at the last ')'; starttime is 22nd
+            start_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, AttributeError, ValueError, IndexError):
+        return None
+
+
+def write_stats(filename, series):
+    """
+    Write the statistics of a run to a file.
+
+    Parameters:
+        filename (str): A .npy file receiving the structured array of StatsSeries.to_array, or any other file
+            receiving it as comma separated values with a header line.
+        series (cellular_automata.StatsSeries): The statistics.
+    """
+    array = series.to_array()
+    if filename.endswith('.npy'):
+        np.save(filename, array)
+    else:
+        np.savetxt(filename, np.column_stack([array[name] for name in array.dtype.names]), fmt='%d', delimiter=',',
+                   header=','.join(array.dtype.names), comments='')
+
+
+def main(argv=None):
+    """
+    Command line entry point running the game of life without a window (pygame is never imported).
+
+    The run reads the [settings] section of the same configuration file as the visualization, steps the grid
+    for the requested number of generations with any registered engine, and writes the statistics, the final
+    grid and periodic snapshots as checkpoints.
+
+    Usage:
+        python cellular_automata_headless.py configuration.txt --generations 1000 --stats stats.csv --snapshot final.ckpt
+
+    Parameters:
+        argv (list of str, optional): The command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(description="Run Conway's game of life without a window.")
+    parser.add_argument('config_file', nargs='?', default='configuration.txt')
+    parser.add_argument('--generations', type=int,
+                        help='number of generations to run, by default the generations setting')
+    parser.add_argument('--engine', help='registered engine, by default the engine setting or get_engine')
+    parser.add_argument('--threads', type=int, help='threads of the engine, by default the threads setting')
+    parser.add_argument('--resume', metavar='PATH', help='start from a checkpoint instead of the configuration')
+    parser.add_argument('--stats', metavar='PATH',
+                        help='write the population, births, deaths and bounding box of every generation '
+                             '(.npy, otherwise CSV)')
+    parser.add_argument('--snapshot', metavar='PATH', help='save the last generation as a checkpoint')
+    parser.add_argument('--snapshot-every', type=int, metavar='N',
+                        help='also save a checkpoint every N generations, from a background thread')
+    parser.add_argument('--snapshot-dir', default='checkpoints', help='directory of the periodic checkpoints')
+    parser.add_argument('--keep', type=int, help='number of periodic checkpoints kept on disk (default 3)')
+    parser.add_argument('--report-every', type=int, metavar='N', help='print the population every N generations')
+    args = parser.parse_args(argv)
+
+    settings = cellular_automata.read_settings(args.config_file)
+    for key in ('engine', 'threads', 'generations'):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    if settings['generations'] is None:
+        parser.error('the number of generations is neither in the configuration file nor given by --generations')
+    seed_value = settings['seed_value']
+    generation = 0
+
+    if args.resume or args.snapshot or args.snapshot_every:
+        import cellular_automata_checkpoint
+    if args.resume:
+        grid, header = cellular_automata_checkpoint.load_checkpoint(args.resume)
+        settings['border_type'], generation = header['border_type'], header['generation']
+        if header['seed_value'] is not None:
+            seed_value = header['seed_value']
+    else:
+        grid = cellular_automata.settings_grid(settings)
+
+    factory = cellular_automata.get_engine(grid.shape, settings['border_type'], name=settings['engine'])
+    engine = factory(grid, settings['border_type'], settings['threads'], stats=args.stats is not None,
+                     generation=generation)
+    scheduler = None
+    if args.snapshot_every:
+        scheduler = cellular_automata_checkpoint.CheckpointScheduler(
+            args.snapshot_dir, args.snapshot_every, settings['border_type'], seed_value,
+            args.keep or cellular_automata_checkpoint.DEFAULT_KEEP)
+    launched = _launched_ago()
+    startup = time.perf_counter() - _LOADED if launched is None else launched
+
+    start = time.perf_counter()
+    try:
+        for _ in range(settings['generations']):
+            engine.step()
+            if scheduler is not None and engine.generation % args.snapshot_every == 0:
+                scheduler.submit(engine.to_grid(), engine.generation)
+            if args.report_every and engine.generation % args.report_every == 0:
+                print('generation {}: population {}'.format(
+                    engine.generation, cellular_automata.grid_stats(engine.grid).population), flush=True)
+    finally:
+        if scheduler is not None:
+            scheduler.close()
+    seconds = time.perf_counter() - start
+
+    if args.stats:
+        write_stats(args.stats, engine.stats)
+    if args.snapshot:
+        cellular_automata_checkpoint.save_checkpoint(args.snapshot, engine.to_grid(), settings['border_type'],
+                                                     engine.generation, seed_value)
+    cells = grid.shape[0] * grid.shape[1] * settings['generations']
+    name = next(name for name in cellular_automata.engine_names()
+                if cellular_automata.get_engine_info(name).factory is factory)
+    print('{} generations of a {}x{} {} grid with the {} engine in {:.3f} s ({:.3e} cells/s), started in {:.0f} ms{}'
+          .format(settings['generations'], grid.shape[0], grid.shape[1], settings['border_type'], name, seconds,
+                  cells / seconds if seconds else float('inf'), startup * 1000,
+                  ' after import' if launched is None else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,297 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+import cellular_automata
+import cellular_automata_bitpacked
+
+# A history file is MAGIC, the length of the JSON header as a little-endian uint32, the JSON header, and then
+# records: a RECORD header (kind, generation, body length) followed by the body.
+MAGIC = b'GOLHIST1'
+RECORD = struct.Struct('<BQI')
+KEYFRAME, DELTA = 0, 1
+# Generations between two keyframes: a random access decodes at most this many deltas.
+DEFAULT_KEYFRAME_INTERVAL = 64
+_LENGTH = struct.Struct('<I')
+
+
+def _encode_delta(previous, current, level):
+    """
+    Encode the words that differ between two packed generations: their count, the gaps between their
+    indices and their XOR, compressed with zlib.
+    """
+    changed = np.bitwise_xor(previous, current).reshape(-1)
+    indices = np.flatnonzero(changed)
+    gaps = np.diff(indices, prepend=0).astype('<u4')
+    return zlib.compress(np.uint64(indices.size).tobytes() + gaps.tobytes() + changed[indices].astype('<u8').tobytes(),
+                         level)
+
+
+def _apply_delta(packed, body):
+    """
+    Apply, in place, a delta written by _encode_delta to a packed generation.
+    """
+    data = zlib.decompress(body)
+    count = int(np.frombuffer(data, dtype='<u8', count=1)[0])
+    indices = np.cumsum(np.frombuffer(data, dtype='<u4', count=count, offset=8), dtype=np.int64)
+    words = packed.reshape(-1)
+    words[indices] ^= np.frombuffer(data, dtype='<u8', count=count, offset=8 + 4 * count)
+
+
+class HistoryWriter:
+    """
+    Record every generation of a run in a single append-only file.
+
+    Every `keyframe_interval` generations the whole grid is stored, bit-packed and compressed with zlib;
+    the generations in between are stored as the words that changed since the previous generation (the
+    XOR of the packed grids, which is sparse once the soup settles). Records are only ever appended, so
+    a file cut short by a crash keeps all its complete records.
+
+    Parameters:
+        filename (str): The history file.
+        shape (tuple): The (height, width) of the grids.
+        border_type (str): The border type, stored in the header.
+        keyframe_interval (int, optional): Generations between two keyframes.
+        level (int, optional): The zlib compression level.
+        append (bool, optional): Append to an existing file with the same shape instead of overwriting it;
+            the first generation appended is stored as a keyframe.
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options, `keyframe_interval` is less
+        than 1, or the file to append to has another shape.
+
+    Examples:
+        with HistoryWriter('run.hist', grid.shape, 'toroidal') as history:
+            for generation in range(1000):
+                history.append(grid)
+                grid = cellular_automata.update_grid(grid, 'toroidal')
+    """
+
+    def __init__(self, filename, shape, border_type, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, level=1,
+                 append=False):
+        cellular_automata.check_border_type(border_type)
+        if keyframe_interval < 1:
+            raise ValueError('keyframe_interval must be >= 1, but is {}'.format(keyframe_interval))
+        self.shape = tuple(shape)
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.generation = 0
+        if append and os.path.exists(filename):
+            with HistoryReader(filename) as reader:
+                pass
+            if reader.shape != self.shape:
+                raise ValueError('{} holds grids of shape {}, not {}'.format(filename, reader.shape, self.shape))
+            if len(reader):
+                self.generation = reader.generations[-1] + 1
+            self._file = open(filename, 'r+b')
+            self._file.seek(reader.end)
+            self._file.truncate()
+        else:
+            header = json.dumps({'shape': list(self.shape), 'border_type': border_type,
+                                 'rule': cellular_automata.RULE,
+                                 'keyframe_interval': keyframe_interval}).encode('utf-8')
+            self._file = open(filename, 'wb')
+            self._file.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        self._previous = None
+        self._since_keyframe = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, grid, generation=None):
+        """
+        Append a generation to the file.
+
+        Parameters:
+            grid (numpy.ndarray): The binary grid.
+            generation (int, optional): Its generation number, by default the one after the last appended.
+
+        Returns:
+            int: The number of bytes written.
+
+        Raises:
+            ValueError: If the grid has another shape.
+        """
+        grid = np.asarray(grid)
+        if grid.shape != self.shape:
+            raise ValueError('The grid must have shape {}, but has {}'.format(self.shape, grid.shape))
+        if generation is None:
+            generation = self.generation
+        packed = cellular_automata_bitpacked.pack_grid(grid)
+        if self._previous is None or self._since_keyframe >= self.keyframe_interval:
+            kind, body = KEYFRAME, zlib.compress(packed.astype('<u8', copy=False), self.level)
+            self._since_keyframe = 0
+        else:
+            kind, body = DELTA, _encode_delta(self._previous, packed, self.level)
+        self._file.write(RECORD.pack(kind, generation, len(body)))
+        self._file.write(body)
+        self._previous = packed
+        self._since_keyframe += 1
+        self.generation = generation + 1
+        return RECORD.size + len(body)
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self._file.close()
+
+
+class HistoryReader:
+    """
+    Random and sequential access to the generations of a history file written by HistoryWriter.
+
+    Opening the file reads only the record headers, skipping the bodies, to build an index of the
+    generations. A generation is decoded from the nearest keyframe before it by applying the deltas
+    in between; the last decoded generation is cached, so reading forward costs one delta per generation.
+
+    Parameters:
+        filename (str): The history file.
+
+    Raises:
+        ValueError: If the file is not a history file.
+
+    Examples:
+        history = HistoryReader('run.hist')
+        grid = history.grid(500)
+        for generation, grid in history.iter_range(100, 200):
+            ...
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError('{} is not a history file'.format(filename))
+        length, = _LENGTH.unpack(self._file.read(_LENGTH.size))
+        self.header = json.loads(self._file.read(length).decode('utf-8'))
+        self.shape = tuple(self.header['shape'])
+        self.border_type = self.header['border_type']
+
+        size = os.fstat(self._file.fileno()).st_size
+        position = self._file.tell()
+        kinds, generations, offsets, lengths = [], [], [], []
+        while position + RECORD.size <= size:
+            kind, generation, body_length = RECORD.unpack(self._file.read(RECORD.size))
+            if position + RECORD.size + body_length > size:
+                break  # an incomplete last record, cut short while it was appended
+            kinds.append(kind)
+            generations.append(generation)
+            offsets.append(position + RECORD.size)
+            lengths.append(body_length)
+            position += RECORD.size + body_length
+            self._file.seek(position)
+        # end of the last complete record, where HistoryWriter appends
+        self.end = position
+        self.generations = generations
+        self._kinds = np.array(kinds, dtype=np.uint8)
+        self._offsets = offsets
+        self._lengths = lengths
+        self._records = {generation: record for record, generation in enumerate(generations)}
+        self._keyframes = np.flatnonzero(self._kinds == KEYFRAME)
+        self._cached_record = None
+        self._cached = None
+
+    def __len__(self):
+        return len(self.generations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _body(self, record):
+        """
+        Read the body of a record.
+        """
+        self._file.seek(self._offsets[record])
+        return self._file.read(self._lengths[record])
+
+    def _decode(self, record):
+        """
+        Return the packed grid of a record, continuing from the cached record when it is on the way.
+        """
+        keyframe = self._keyframes[np.searchsorted(self._keyframes, record, side='right') - 1]
+        if self._cached_record is not None and keyframe <= self._cached_record <= record:
+            start, packed = self._cached_record + 1, self._cached
+        else:
+            words = cellular_automata_bitpacked.words_per_row(self.shape[1])
+            packed = np.frombuffer(zlib.decompress(self._body(keyframe)), dtype='<u8')
+            packed = packed.astype(np.uint64).reshape(self.shape[0], words)
+            start = keyframe + 1
+        for delta in range(start, record + 1):
+            _apply_delta(packed, self._body(delta))
+        self._cached_record, self._cached = record, packed
+        return packed
+
+    def grid(self, generation, packed=False):
+        """
+        Decode one generation.
+
+        Parameters:
+            generation (int): The generation number.
+            packed (bool, optional): Return the grid bit-packed instead of one uint8 per cell.
+
+        Returns:
+            numpy.ndarray: The grid of that generation.
+
+        Raises:
+            KeyError: If the generation is not in the file.
+        """
+        grid = self._decode(self._records[generation])
+        if packed:
+            return grid.copy()
+        return cellular_automata_bitpacked.unpack_grid(grid, self.shape[1])
+
+    def iter_range(self, start=None, stop=None, packed=False):
+        """
+        Decode the recorded generations from `start` to `stop` (excluded) lazily, in order.
+
+        Parameters:
+            start (int, optional): The first generation, by default the first recorded one.
+            stop (int, optional): The generation to stop at, by default after the last recorded one.
+            packed (bool, optional): Yield the grids bit-packed instead of one uint8 per cell.
+
+        Yields:
+            tuple: (generation, grid) for every recorded generation in the range.
+        """
+        for record, generation in enumerate(self.generations):
+            if (start is None or generation >= start) and (stop is None or generation < stop):
+                grid = self._decode(record)
+                yield generation, grid.copy() if packed else cellular_automata_bitpacked.unpack_grid(grid, self.shape[1])
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self._file.close()
+
+
+def record(grid, generations, border_type, filename, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, threads=1):
+    """
+    Run the game of life and record every generation, from 0 to `generations`, in a history file.
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The initial binary grid.
+        generations (int): The number of generations to run.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        filename (str): The history file to write.
+        keyframe_interval (int, optional): Generations between two keyframes.
+        threads (int, optional): Number of threads updating horizontal bands of rows in parallel.
+
+    Returns:
+        numpy.ndarray: The last generation.
+    """
+    simulation = cellular_automata.Simulation(grid, border_type, threads)
+    with HistoryWriter(filename, simulation.grid.shape, border_type, keyframe_interval) as history:
+        history.append(simulation.grid)
+        for _ in range(generations):
+            simulation.step()
+            history.append(simulation.grid)
+    return simulation.to_grid()
@@ -0,0 +1,244 @@
+import mmap
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import cellular_automata
+import cellular_automata_bitpacked
+
+# Rows of the grid updated per band; a band of the 200k-wide grid is then about 200 MB.
+DEFAULT_BAND_ROWS = 1024
+# Bytes written to the target file between two flushes of its dirty pages.
+DEFAULT_FLUSH_BYTES = 256 * 1024 * 1024
+
+StreamStats = namedtuple('StreamStats', ['seconds', 'read_seconds', 'compute_seconds', 'write_seconds',
+                                         'bytes_read', 'bytes_written', 'megabytes_per_second'])
+StreamStats.__doc__ = """
+Timings of one generation streamed by OutOfCoreEngine.step.
+
+read_seconds and write_seconds are the time spent copying the bands from and to the memory-mapped files
+(page faults and flushes included), compute_seconds the time spent applying the rule. When the sum of the
+first two is larger than compute_seconds the run is I/O-bound. megabytes_per_second is
+(bytes_read + bytes_written) / seconds.
+"""
+
+
+def _open(filename, mode, shape, dtype):
+    """
+    Open a grid file as a memmap, advising the kernel that it is read sequentially.
+    """
+    grid = np.memmap(filename, dtype=dtype, mode=mode, shape=shape)
+    mapping = getattr(grid, '_mmap', None)
+    if mapping is not None and hasattr(mapping, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    return grid
+
+
+class OutOfCoreEngine:
+    """
+    Conway's game of life on a grid stored in files, for grids that do not fit in memory.
+
+    The current and the next generation are two np.memmap files used alternately. A generation is
+    computed band by band: only the padded band of rows being updated (with the last row of the band
+    above and the first row of the band below) is held in memory, and the two rows shared by
+    consecutive bands are carried over instead of being read twice. The results are the same as
+    update_grid for every border type.
+
+    Parameters:
+        filename (str): A file holding generation 0, raw uint8 cells of shape (height, width), or
+            uint64 words of shape (height, ceil(width / 64)) if `packed` is True (see
+            random_state_grid(..., filename=...)). It is overwritten by later generations.
+        shape (tuple): The (height, width) of the grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        packed (bool, optional): The files hold bit-packed rows, updated with the bit-packed engine.
+        band_rows (int, optional): Number of rows updated per band.
+        flush_bytes (int, optional): Bytes written between two flushes of the target file; smaller values
+            bound the dirty pages kept by the kernel, larger ones let it batch the writes.
+        work_filename (str, optional): The second file, created with the size of the first one.
+            Defaults to `filename` + '.next'.
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options, or `band_rows` is less than 1.
+
+    Examples:
+        cellular_automata.random_state_grid(200000, 200000, 1, packed=True, filename='grid.bin')
+        engine = OutOfCoreEngine('grid.bin', (200000, 200000), 'toroidal', packed=True)
+        stats = engine.step()
+    """
+
+    def __init__(self, filename, shape, border_type, packed=False, band_rows=DEFAULT_BAND_ROWS,
+                 flush_bytes=DEFAULT_FLUSH_BYTES, work_filename=None):
+        cellular_automata.check_border_type(border_type)
+        if band_rows < 1:
+            raise ValueError('band_rows must be >= 1, but is {}'.format(band_rows))
+        self.height, self.width = shape
+        self.border_type = border_type
+        self.packed = packed
+        self.band_rows = min(band_rows, self.height)
+        self.flush_bytes = flush_bytes
+        self.generation = 0
+        if packed:
+            dtype, file_shape = np.uint64, (self.height, cellular_automata_bitpacked.words_per_row(self.width))
+        else:
+            dtype, file_shape = np.uint8, (self.height, self.width)
+        work_filename = work_filename or filename + '.next'
+        self.filenames = [filename, work_filename]
+        self._files = [_open(filename, 'r+', file_shape, dtype), _open(work_filename, 'w+', file_shape, dtype)]
+
+        # the band keeps one ghost row above and below; uint8 bands also keep the ghost columns
+        columns = file_shape[1] if packed else self.width + 2
+        self._band = np.zeros((self.band_rows + 2, columns), dtype=dtype)
+        self._out = np.empty((self.band_rows, file_shape[1]), dtype=dtype)
+        self._scratch = None if packed else cellular_automata.allocate_scratch((self.band_rows, self.width))
+
+    @property
+    def filename(self):
+        """
+        str: The file holding the current generation.
+        """
+        return self.filenames[self.generation % 2]
+
+    @property
+    def grid(self):
+        """
+        numpy.memmap: The file of the current generation, as stored (uint8 cells or bit-packed words).
+        """
+        return self._files[self.generation % 2]
+
+    def to_grid(self):
+        """
+        Read the current generation into memory.
+
+        Returns:
+            numpy.ndarray: A uint8 array of shape (height, width).
+        """
+        if self.packed:
+            return cellular_automata_bitpacked.unpack_grid(self.grid, self.width)
+        return np.array(self.grid)
+
+    def _cells(self, rows):
+        """
+        Return the part of band rows that holds grid cells (all of it for packed rows).
+        """
+        return rows if self.packed else rows[..., 1:-1]
+
+    def _ghost_row(self, row, source, index):
+        """
+        Fill `row` with the out-of-grid row -1 or height, according to the border type.
+        """
+        cells = self._cells(row)
+        if self.border_type in ('death', 'alive'):
+            cells[:] = 0
+            if self.border_type == 'alive':
+                if self.packed:
+                    cells[:] = cellular_automata_bitpacked._ALL_ONES
+                    cells[-1] &= cellular_automata_bitpacked.last_word_mask(self.width)
+                else:
+                    cells[:] = 1
+        elif self.border_type == 'reflective':
+            cells[:] = source[0 if index < 0 else -1]
+        else:
+            cells[:] = source[index % self.height]
+
+    def _fill_columns(self, band):
+        """
+        Fill the ghost columns of a uint8 band according to the border type.
+        """
+        if self.border_type in ('death', 'alive'):
+            band[:, 0] = band[:, -1] = 1 if self.border_type == 'alive' else 0
+        elif self.border_type == 'reflective':
+            band[:, 0] = band[:, 1]
+            band[:, -1] = band[:, -2]
+        else:
+            band[:, 0] = band[:, -2]
+            band[:, -1] = band[:, 1]
+
+    def step(self):
+        """
+        Advance the grid by one generation, streaming it from the current file to the other one.
+
+        Returns:
+            StreamStats: The time spent reading, computing and writing, and the sustained throughput.
+        """
+        source, target = self._files[self.generation % 2], self._files[1 - self.generation % 2]
+        band = self._band
+        read_seconds = compute_seconds = write_seconds = 0.0
+        unflushed = 0
+        start = time.perf_counter()
+        rows = 0
+        for r0 in range(0, self.height, self.band_rows):
+            r1 = min(r0 + self.band_rows, self.height)
+            clock = time.perf_counter()
+            # band row i holds grid row r0 - 1 + i; the first two rows come from the previous band
+            if r0 == 0:
+                self._ghost_row(band[0], source, -1)
+                first = 1
+            else:
+                band[:2] = band[rows:rows + 2]
+                first = 2
+            rows = r1 - r0
+            stop = min(r1 + 1, self.height)
+            self._cells(band[first:first + stop - (r0 - 1 + first)])[:] = source[r0 - 1 + first:stop]
+            if r1 == self.height:
+                self._ghost_row(band[rows + 1], source, self.height)
+            if not self.packed:
+                self._fill_columns(band[:rows + 2])
+            now = time.perf_counter()
+            read_seconds += now - clock
+            clock = now
+
+            out = self._out[:rows]
+            if self.packed:
+                cellular_automata_bitpacked.step_packed(band[:rows + 2], self.width, self.border_type, out)
+            else:
+                row_sums, counts = self._scratch
+                cellular_automata.step_padded(band[:rows + 2], out, scratch=(row_sums[:rows + 2], counts[:rows]))
+            now = time.perf_counter()
+            compute_seconds += now - clock
+            clock = now
+
+            target[r0:r1] = out
+            unflushed += out.nbytes
+            if unflushed >= self.flush_bytes:
+                target.flush()
+                unflushed = 0
+            write_seconds += time.perf_counter() - clock
+        clock = time.perf_counter()
+        target.flush()
+        write_seconds += time.perf_counter() - clock
+
+        seconds = time.perf_counter() - start
+        self.generation += 1
+        moved = 2 * source.nbytes
+        return StreamStats(seconds, read_seconds, compute_seconds, write_seconds, source.nbytes, target.nbytes,
+                           moved / seconds / 1e6)
+
+    def advance(self, generations):
+        """
+        Advance the grid by the given number of generations.
+
+        Parameters:
+            generations (int): The number of generations.
+
+        Returns:
+            list of StreamStats: The timings of each generation.
+        """
+        return [self.step() for _ in range(generations)]
+
+    def close(self):
+        """
+        Flush and release the memory-mapped files. The current generation stays in `filename`.
+        """
+        for grid in self._files:
+            grid.flush()
+        self._files = []
+
+    def remove_work_file(self):
+        """
+        Close the engine and delete the file that does not hold the current generation.
+        """
+        current = self.filename
+        self.close()
+        for filename in self.filenames:
+            if filename != current:
+                os.remove(filename)
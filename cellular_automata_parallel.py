@@ -0,0 +1,267 @@
+import os
+import threading
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import cellular_automata
+
+# Seconds between two checks that the workers are alive while the engine waits for a step to finish
+POLL_INTERVAL = 0.1
+
+
+def _split(length, parts):
+    """
+    Return the parts + 1 boundaries splitting range(length) into `parts` nearly equal pieces.
+    """
+    return [length * part // parts for part in range(parts + 1)]
+
+
+def _attach(names, shape):
+    """
+    Attach to the two shared padded buffers and return the shared memory blocks and their array views.
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    return blocks, [np.ndarray(shape, dtype=np.uint8, buffer=block.buf) for block in blocks]
+
+
+def _worker(names, shape, border_type, block, leader, command, current, start, done, sync):
+    """
+    Worker process: update one block of the grid for every generation requested by the engine.
+
+    The neighbouring cells of the block are read in place from the shared source buffer, so no grid is
+    ever pickled. After every generation the workers wait on `sync`; the leader then rewrites the border
+    frame of the new buffer (reflective and toroidal borders) and the workers wait once more. The end of
+    the requested generations is signalled by releasing the `done` semaphore.
+    """
+    blocks, buffers = _attach(names, shape)
+    r0, r1, c0, c1 = block
+    scratch = cellular_automata.allocate_scratch((r1 - r0, c1 - c0))
+    refill_border = border_type in ('reflective', 'toroidal')
+    try:
+        while True:
+            start.wait()
+            generations = command.value
+            if generations < 0:
+                break
+            parity = current.value
+            for _ in range(generations):
+                source, target = buffers[parity], buffers[1 - parity]
+                cellular_automata.step_padded(source[r0:r1 + 2, c0:c1 + 2], target[r0 + 1:r1 + 1, c0 + 1:c1 + 1],
+                                              scratch=scratch)
+                sync.wait()
+                if refill_border:
+                    if leader:
+                        cellular_automata.fill_border(target, border_type)
+                    sync.wait()
+                parity = 1 - parity
+            done.release()
+    except threading.BrokenBarrierError:
+        pass
+    finally:
+        del buffers
+        for shared in blocks:
+            shared.close()
+
+
+def _shutdown(processes, blocks):
+    """
+    Terminate the workers still running and unlink the shared memory blocks: the finalizer of a ParallelEngine.
+    """
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+    for block in blocks:
+        block.unlink()
+        try:
+            block.close()
+        except BufferError:
+            # at interpreter exit the engine may still hold views of the block; it is unmapped with the process
+            pass
+
+
+class ParallelEngine:
+    """
+    Conway's game of life split over a pool of worker processes sharing the grid in shared memory.
+
+    The grid is kept padded in two multiprocessing.shared_memory buffers used alternately as source and
+    target. Every worker owns a block of rows (or a 2D tile) and updates it in place; the workers stay
+    alive between calls, so the start-up cost is paid once. The results are the same as update_grid.
+    If a worker dies, the next step raises a RuntimeError instead of waiting forever, and the workers and
+    shared memory are released even when the engine is garbage collected without close().
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The initial binary grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        workers (int, optional): The number of worker processes, split in row bands. Defaults to the number of CPUs.
+        tiles (tuple, optional): (tile_rows, tile_cols) to split the grid in 2D tiles instead, one worker per tile.
+        timeout (float, optional): Seconds to wait for all the workers to be ready for a step before giving up.
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options, or the grid has fewer rows or
+        columns than the requested split.
+
+    Examples:
+        with ParallelEngine(grid, 'toroidal', workers=4) as engine:
+            engine.step(100)
+            final_grid = engine.to_grid()
+    """
+
+    def __init__(self, grid, border_type, workers=None, tiles=None, timeout=60.0):
+        padded = cellular_automata.pad_grid(grid, border_type)
+        self.border_type = border_type
+        self.height, self.width = padded.shape[0] - 2, padded.shape[1] - 2
+        if tiles is None:
+            tiles = (workers or os.cpu_count() or 1, 1)
+        tile_rows, tile_cols = tiles
+        if not (1 <= tile_rows <= self.height and 1 <= tile_cols <= self.width):
+            raise ValueError('Cannot split a {}x{} grid into {}x{} tiles'.format(self.height, self.width, tile_rows, tile_cols))
+        self.workers = tile_rows * tile_cols
+        self.generation = 0
+        self.timeout = timeout
+
+        self._blocks = [shared_memory.SharedMemory(create=True, size=padded.nbytes) for _ in range(2)]
+        self._processes = []
+        self._finalizer = weakref.finalize(self, _shutdown, self._processes, self._blocks)
+        self._buffers = [np.ndarray(padded.shape, dtype=np.uint8, buffer=block.buf) for block in self._blocks]
+        for buffer in self._buffers:
+            buffer[:] = padded
+        self._parity = 0
+
+        context = multiprocessing.get_context()
+        self._command = context.Value('q', 0, lock=False)
+        self._current = context.Value('b', 0, lock=False)
+        self._start = context.Barrier(self.workers + 1)
+        self._done = context.Semaphore(0)
+        self._sync = context.Barrier(self.workers)
+        rows, cols = _split(self.height, tile_rows), _split(self.width, tile_cols)
+        names = [block.name for block in self._blocks]
+        for i in range(tile_rows):
+            for j in range(tile_cols):
+                block = (rows[i], rows[i + 1], cols[j], cols[j + 1])
+                name = 'ParallelEngine worker {} (rows {}:{}, columns {}:{})'.format(len(self._processes), *block)
+                process = context.Process(target=_worker, daemon=True, name=name,
+                                          args=(names, padded.shape, border_type, block, not self._processes,
+                                                self._command, self._current, self._start, self._done, self._sync))
+                process.start()
+                self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def step(self, generations=1):
+        """
+        Advance the grid by the given number of generations.
+
+        Parameters:
+            generations (int): The number of generations, >= 0.
+
+        Raises:
+            ValueError: If `generations` is negative.
+            RuntimeError: If the engine is closed, or a worker died (the engine is then closed), or the workers
+            were not ready within `timeout` seconds.
+        """
+        if generations < 0:
+            raise ValueError('generations must be >= 0, but is {}'.format(generations))
+        if not self._finalizer.alive:
+            raise RuntimeError('The ParallelEngine is closed')
+        self._check_workers()
+        self._command.value = generations
+        self._current.value = self._parity
+        try:
+            self._start.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            self._check_workers()
+            self._release()
+            raise RuntimeError('The workers of the ParallelEngine were not ready within {} s'.format(self.timeout))
+        for _ in range(self.workers):
+            while not self._done.acquire(timeout=POLL_INTERVAL):
+                self._check_workers()
+        self._parity = (self._parity + generations) % 2
+        self.generation += generations
+
+    def _check_workers(self):
+        """
+        Raise a RuntimeError naming the dead workers, if any, after releasing the engine.
+        """
+        dead = [process for process in self._processes if not process.is_alive()]
+        if dead:
+            self._release()
+            raise RuntimeError('The ParallelEngine is closed because {} exited'.format(', '.join(
+                '{} (pid {}, exit code {})'.format(process.name, process.pid, process.exitcode) for process in dead)))
+
+    def _release(self):
+        """
+        Terminate the workers and unlink the shared memory, once the views of the buffers are dropped.
+        """
+        self._buffers = []
+        self._finalizer()
+
+    def load(self, grid):
+        """
+        Replace the current grid, keeping the workers and buffers.
+
+        Parameters:
+            grid (list of list or numpy.ndarray): A binary grid with the shape given to the constructor.
+
+        Raises:
+            ValueError: If the shape of the grid is different.
+        """
+        grid = np.asarray(grid)
+        if grid.shape != (self.height, self.width):
+            raise ValueError('The grid must have shape {}, but has {}'.format((self.height, self.width), grid.shape))
+        buffer = self._buffers[self._parity]
+        buffer[1:-1, 1:-1] = grid
+        cellular_automata.fill_border(buffer, self.border_type)
+
+    def update_grid(self, grid):
+        """
+        Compute the next generation of a grid, like cellular_automata.update_grid.
+
+        Parameters:
+            grid (list of list or numpy.ndarray): A binary grid with the shape given to the constructor.
+
+        Returns:
+            numpy.ndarray: The next generation as a uint8 array.
+        """
+        self.load(grid)
+        self.step()
+        return self.to_grid()
+
+    @property
+    def grid(self):
+        """
+        numpy.ndarray: A copy of the current generation; a view of the shared memory would outlive it once the
+        engine is closed.
+        """
+        return self.to_grid()
+
+    def to_grid(self):
+        """
+        Return a copy of the current generation.
+
+        Returns:
+            numpy.ndarray: A uint8 array of shape (height, width).
+        """
+        return self._buffers[self._parity][1:-1, 1:-1].copy()
+
+    def close(self):
+        """
+        Stop the workers and release the shared memory. Workers that do not stop within `timeout` seconds,
+        for instance because another worker died, are terminated.
+        """
+        if not self._finalizer.alive:
+            return
+        if all(process.is_alive() for process in self._processes):
+            self._command.value = -1
+            try:
+                self._start.wait(self.timeout)
+            except threading.BrokenBarrierError:
+                pass
+            for process in self._processes:
+                process.join(self.timeout)
+        self._release()
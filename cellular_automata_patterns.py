@@ -0,0 +1,353 @@
+import os
+import re
+from collections import namedtuple
+import numpy as np
+import cellular_automata
+import cellular_automata_bitpacked
+
+# Bytes of RLE read and decoded at once.
+READ_BYTES = 1 << 20
+# RLE lines written by to_rle are at most this long, as recommended by the format.
+RLE_LINE_LENGTH = 70
+
+Pattern = namedtuple('Pattern', ['grid', 'shape', 'rule'])
+Pattern.__doc__ = """
+A pattern read by read_rle, read_cells or read_pattern.
+
+grid is a uint8 array, or a bit-packed uint64 array (see cellular_automata_bitpacked) when the pattern is
+read with packed=True; shape is its (height, width) in cells and rule the rule string of the file.
+"""
+
+_HEADER = re.compile(r'\s*x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)\s*(?:,\s*rule\s*=\s*(\S+))?', re.IGNORECASE)
+_DIGITS = np.zeros(256, dtype=bool)
+_DIGITS[ord('0'):ord('9') + 1] = True
+
+
+def _open(source, mode):
+    """
+    Return an open file and whether it has to be closed, for a file name or an already open file.
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        return open(source, mode), True
+    return source, False
+
+
+def _as_bytes(text):
+    return text.encode('ascii') if isinstance(text, str) else text
+
+
+def _paint(grid, packed, rows, starts, lengths):
+    """
+    Set the cells of the runs (rows, starts, lengths) in a uint8 or bit-packed grid.
+    """
+    total = int(lengths.sum())
+    if total == 0:
+        return
+    first = np.cumsum(lengths) - lengths
+    columns = np.repeat(starts, lengths) + (np.arange(total) - np.repeat(first, lengths))
+    rows = np.repeat(rows, lengths)
+    if packed:
+        np.bitwise_or.at(grid, (rows, columns // 64),
+                         np.left_shift(np.uint64(1), (columns % 64).astype(np.uint64)))
+    else:
+        grid[rows, columns] = 1
+
+
+def read_rle(source, packed=False):
+    """
+    Read a pattern in RLE format.
+
+    The body is read and decoded in blocks of READ_BYTES with vectorized operations, straight into the
+    grid, so multi-megabyte patterns never exist as a list of cells.
+
+    Parameters:
+        source (str or file): The name of an RLE file, or a file opened in text or binary mode.
+        packed (bool, optional): Return the pattern bit-packed instead of one uint8 per cell.
+
+    Returns:
+        Pattern: The pattern, sized as in the "x = ..., y = ..." header line.
+
+    Raises:
+        ValueError: If the header line is missing, or the pattern is larger than the header says.
+
+    Note:
+        'b' and '.' are dead cells, every other letter an alive cell, '$' ends a row and '!' the pattern;
+        lines starting with '#' before the header are comments.
+    """
+    file, close = _open(source, 'rb')
+    try:
+        line = _as_bytes(file.readline())
+        while line and (line.lstrip().startswith(b'#') or not line.strip()):
+            line = _as_bytes(file.readline())
+        header = _HEADER.match(line.decode('ascii'))
+        if header is None:
+            raise ValueError('Missing RLE header line "x = ..., y = ...": {!r}'.format(line[:80]))
+        width, height = int(header.group(1)), int(header.group(2))
+        rule = header.group(3) or cellular_automata.RULE
+        if packed:
+            grid = np.zeros((height, cellular_automata_bitpacked.words_per_row(width)), dtype=np.uint64)
+        else:
+            grid = np.zeros((height, width), dtype=np.uint8)
+
+        row, column, carry = 0, 0, b''
+        while True:
+            chunk = _as_bytes(file.read(READ_BYTES))
+            data = np.frombuffer(carry + chunk, dtype=np.uint8)
+            data = data[data > ord(' ')]
+            end = np.flatnonzero(data == ord('!'))
+            finished = end.size > 0 or not chunk
+            if end.size:
+                data = data[:end[0]]
+            # a count split between two blocks is carried over to the next one
+            digits = _DIGITS[data]
+            tail = data.size if finished else (np.flatnonzero(~digits)[-1] + 1 if (~digits).any() else 0)
+            carry, data, digits = data[tail:].tobytes(), data[:tail], digits[:tail]
+            row, column = _decode_runs(grid, packed, data, digits, row, column, width, height)
+            if finished:
+                break
+    finally:
+        if close:
+            file.close()
+    return Pattern(grid, (height, width), rule)
+
+
+def _decode_runs(grid, packed, data, digits, row, column, width, height):
+    """
+    Decode a block of RLE tokens starting at (row, column) into the grid, returning the position after it.
+    """
+    tag_positions = np.flatnonzero(~digits)
+    if tag_positions.size == 0:
+        return row, column
+    tags = data[tag_positions]
+    # the count of every tag is made of the digits just before it, 1 if there are none
+    digit_positions = np.flatnonzero(digits)
+    owners = np.searchsorted(tag_positions, digit_positions)
+    powers = np.power(10, tag_positions[owners] - digit_positions - 1, dtype=np.int64)
+    values = (data[digit_positions] - ord('0')).astype(np.int64) * powers
+    counts = np.bincount(owners, weights=values, minlength=tags.size).astype(np.int64)
+    counts[np.bincount(owners, minlength=tags.size) == 0] = 1
+
+    newline = tags == ord('$')
+    alive = ~newline & (tags != ord('b')) & (tags != ord('.'))
+    advance = np.where(newline, counts, 0)
+    rows = row + np.cumsum(advance) - advance
+    widths = np.where(newline, 0, counts)
+    ends = np.cumsum(widths)
+    last_newline = np.maximum.accumulate(np.where(newline, np.arange(tags.size), -1))
+    starts = np.where(last_newline >= 0, ends - widths - ends[np.maximum(last_newline, 0)], column + ends - widths)
+
+    rows, starts, lengths = rows[alive], starts[alive], counts[alive]
+    if rows.size and (rows.max() >= height or (starts + lengths).max() > width):
+        raise ValueError('The pattern is larger than its header size {}x{}'.format(width, height))
+    _paint(grid, packed, rows, starts, lengths)
+    row += int(advance.sum())
+    column = int(ends[-1] - ends[last_newline[-1]]) if last_newline[-1] >= 0 else column + int(ends[-1])
+    return row, column
+
+
+def read_cells(source, packed=False):
+    """
+    Read a pattern in plaintext (.cells) format: 'O' or '*' for alive cells, '.' for dead cells, and
+    comment lines starting with '!'.
+
+    Parameters:
+        source (str or file): The name of a .cells file, or a file opened in text or binary mode.
+        packed (bool, optional): Return the pattern bit-packed instead of one uint8 per cell.
+
+    Returns:
+        Pattern: The pattern; its width is the length of the longest row.
+    """
+    file, close = _open(source, 'rb')
+    try:
+        lines = [_as_bytes(line).rstrip(b'\r\n') for line in file]
+    finally:
+        if close:
+            file.close()
+    lines = [line for line in lines if not line.startswith(b'!')]
+    width = max((len(line) for line in lines), default=0)
+    text = np.full((len(lines), width), ord('.'), dtype=np.uint8)
+    for i, line in enumerate(lines):
+        text[i, :len(line)] = np.frombuffer(line, dtype=np.uint8)
+    grid = ((text == ord('O')) | (text == ord('*'))).view(np.uint8)
+    if packed:
+        grid = cellular_automata_bitpacked.pack_grid(grid)
+    return Pattern(grid, (len(lines), width), cellular_automata.RULE)
+
+
+def read_pattern(filename, packed=False):
+    """
+    Read a pattern file, in RLE format if its name ends with .rle and in plaintext format otherwise.
+
+    Parameters:
+        filename (str): The name of the pattern file.
+        packed (bool, optional): Return the pattern bit-packed instead of one uint8 per cell.
+
+    Returns:
+        Pattern: The pattern.
+    """
+    if str(filename).lower().endswith('.rle'):
+        return read_rle(filename, packed)
+    return read_cells(filename, packed)
+
+
+def orient(pattern, rotation=0, flip=False):
+    """
+    Return a view of a uint8 pattern mirrored and rotated.
+
+    Parameters:
+        pattern (numpy.ndarray): The pattern.
+        rotation (int, optional): The number of quarter turns counterclockwise.
+        flip (bool, optional): Mirror the pattern left to right, before rotating it.
+
+    Returns:
+        numpy.ndarray: A view of the pattern.
+    """
+    pattern = np.asarray(pattern)
+    if flip:
+        pattern = pattern[:, ::-1]
+    return np.rot90(pattern, rotation % 4)
+
+
+def place_pattern(grid, pattern, top, left, rotation=0, flip=False, overwrite=True, width=None):
+    """
+    Copy a pattern into a grid at an offset, in place.
+
+    Parameters:
+        grid (numpy.ndarray): The grid, a uint8 array (or a view, like Simulation.grid of a writable
+            buffer), or a bit-packed uint64 array if `width` is given.
+        pattern (numpy.ndarray or Pattern): The uint8 pattern, or a Pattern read with packed=True, which is
+            unpacked first.
+        top (int): The row of the grid receiving the top row of the oriented pattern.
+        left (int): The column of the grid receiving the left column of the oriented pattern.
+        rotation (int, optional): The number of quarter turns counterclockwise.
+        flip (bool, optional): Mirror the pattern left to right, before rotating it.
+        overwrite (bool, optional): Also copy the dead cells of the pattern, clearing its bounding box;
+            with False the alive cells are added to the grid.
+        width (int, optional): The width of the grid in cells, when `grid` is bit-packed; by default
+            64 times the number of words.
+
+    Returns:
+        numpy.ndarray: The same `grid`.
+
+    Raises:
+        ValueError: If the oriented pattern does not fit in the grid at that offset, or `pattern` is a bit-packed
+        array without the width of a Pattern.
+    """
+    if isinstance(pattern, Pattern):
+        cells = pattern.grid
+        if cells.dtype == np.uint64:
+            cells = cellular_automata_bitpacked.unpack_grid(cells, pattern.shape[1])
+        pattern = cells
+    elif np.asarray(pattern).dtype == np.uint64:
+        raise ValueError('A bit-packed pattern must be given as a Pattern, which holds its width in cells')
+    pattern = orient(pattern, rotation, flip)
+    rows, columns = pattern.shape
+    height = grid.shape[0]
+    packed = grid.dtype == np.uint64
+    if width is None:
+        width = grid.shape[1] * (cellular_automata_bitpacked.WORD_BITS if packed else 1)
+    if top < 0 or left < 0 or top + rows > height or left + columns > width:
+        raise ValueError('A {}x{} pattern at ({}, {}) does not fit in a {}x{} grid'.format(
+            rows, columns, top, left, height, width))
+    if not packed:
+        target = grid[top:top + rows, left:left + columns]
+        if overwrite:
+            target[...] = pattern
+        else:
+            target |= pattern.astype(grid.dtype, copy=False)
+        return grid
+    # bit-packed: pack the pattern shifted to its bit offset, and merge the words it covers
+    shift = left % cellular_automata_bitpacked.WORD_BITS
+    first = left // cellular_automata_bitpacked.WORD_BITS
+    shifted = np.zeros((rows, shift + columns), dtype=np.uint8)
+    shifted[:, shift:] = pattern
+    bits = cellular_automata_bitpacked.pack_grid(shifted)
+    target = grid[top:top + rows, first:first + bits.shape[1]]
+    if overwrite:
+        shifted[:, shift:] = 1
+        target &= ~cellular_automata_bitpacked.pack_grid(shifted)
+    target |= bits
+    return grid
+
+
+def _format_tokens(counts, letters, line_length):
+    """
+    Format RLE tokens (a count, omitted when it is 1, and a letter) as text split into lines of at most
+    line_length characters, without splitting a token.
+    """
+    digits = np.where(counts > 1, np.floor(np.log10(np.maximum(counts, 1))).astype(np.int64) + 1, 0)
+    lengths = digits + 1
+    ends = np.cumsum(lengths)
+    # a token belongs to the line window its last character falls in; the windows leave room for a token
+    # starting in the previous window
+    window = max(1, line_length - int(lengths.max(initial=1)) + 1)
+    lines = (ends - 1) // window
+    breaks = np.zeros(lines.size, dtype=np.int64)
+    breaks[1:] = np.cumsum(lines[1:] != lines[:-1])
+    starts = ends - lengths + breaks
+    text = np.full(int(ends[-1] + breaks[-1]) if ends.size else 0, ord('\n'), dtype=np.uint8)
+    text[starts + digits] = letters
+    place = 0
+    while (digits > place).any():
+        has = digits > place
+        text[(starts + digits - 1 - place)[has]] = ord('0') + (counts[has] // 10 ** place) % 10
+        place += 1
+    return text.tobytes().decode('ascii')
+
+
+def to_rle(grid, top=0, left=0, height=None, width=None, rule=cellular_automata.RULE):
+    """
+    Encode a grid, or a rectangular region of it, in RLE format.
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The binary grid.
+        top (int, optional): The first row of the region.
+        left (int, optional): The first column of the region.
+        height (int, optional): The number of rows of the region, by default up to the last row.
+        width (int, optional): The number of columns of the region, by default up to the last column.
+        rule (str, optional): The rule written in the header line.
+
+    Returns:
+        str: The RLE text, with the header line and lines of at most RLE_LINE_LENGTH characters.
+    """
+    grid = np.asarray(grid)
+    height = grid.shape[0] - top if height is None else height
+    width = grid.shape[1] - left if width is None else width
+    region = grid[top:top + height, left:left + width] != 0
+    # boundaries of the alive runs, row by row: starts and ends alternate
+    rows, bounds = np.nonzero(np.diff(region.view(np.int8), axis=1, prepend=0, append=0))
+    rows, starts, ends = rows[0::2], bounds[0::2], bounds[1::2]
+    first_in_row = np.ones(rows.size, dtype=bool)
+    first_in_row[1:] = rows[1:] != rows[:-1]
+    previous_end = np.zeros_like(ends)
+    previous_end[1:] = ends[:-1]
+    previous_end[first_in_row] = 0
+    previous_row = np.zeros_like(rows)
+    previous_row[1:] = rows[:-1]
+    newlines = np.where(first_in_row, rows - previous_row, 0)
+
+    # every run is written as up to three tokens: the rows skipped, the dead cells before it and its alive cells
+    counts = np.stack([newlines, starts - previous_end, ends - starts], axis=1).reshape(-1)
+    letters = np.tile(np.array([ord('$'), ord('b'), ord('o')], dtype=np.uint8), rows.size)
+    used = counts > 0
+    counts = np.append(counts[used], 1)
+    letters = np.append(letters[used], ord('!'))
+    body = _format_tokens(counts, letters, RLE_LINE_LENGTH)
+    return 'x = {}, y = {}, rule = {}\n{}\n'.format(width, height, rule, body)
+
+
+def write_rle(filename, grid, top=0, left=0, height=None, width=None, rule=cellular_automata.RULE):
+    """
+    Write a grid, or a rectangular region of it, to an RLE file (see to_rle).
+
+    Parameters:
+        filename (str): The RLE file to write.
+        grid (list of list or numpy.ndarray): The binary grid.
+        top (int, optional): The first row of the region.
+        left (int, optional): The first column of the region.
+        height (int, optional): The number of rows of the region.
+        width (int, optional): The number of columns of the region.
+        rule (str, optional): The rule written in the header line.
+    """
+    with open(filename, 'w') as file:
+        file.write(to_rle(grid, top, left, height, width, rule))
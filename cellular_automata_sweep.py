@@ -0,0 +1,339 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+import numpy as np
+import cellular_automata
+
+# Cell updates (cells * generations) grouped into one task of the process pool; bigger runs are tasks on their own
+DEFAULT_CHUNK_CELLS = 10**8
+MANIFEST = 'manifest.jsonl'
+
+
+def parse_values(text, convert=None):
+    """
+    Parse the values of a parameter of the [sweep] section.
+
+    Parameters:
+        text (str): Comma separated values; an item 'start:stop' or 'start:stop:step' of integers is expanded
+            like range(start, stop, step).
+        convert (callable, optional): The type of the values, applied to every item; by default the values are
+            converted to int or float when possible.
+
+    Returns:
+        list: The values.
+
+    Raises:
+        ValueError: If a range is not made of integers, or an item cannot be converted to `convert`.
+
+    Examples:
+        parse_values('1:4, 10') == [1, 2, 3, 10]
+        parse_values('0.1,0.5') == [0.1, 0.5]
+        parse_values('1,2', float) == [1.0, 2.0]
+    """
+    values = []
+    for item in (item.strip() for item in text.split(',')):
+        if ':' in item:
+            values.extend(map(convert or int, range(*(int(bound) for bound in item.split(':')))))
+            continue
+        if convert is not None:
+            values.append(convert(item))
+            continue
+        for convert_item in (int, float, str):
+            try:
+                values.append(convert_item(item))
+                break
+            except ValueError:
+                pass
+    return values
+
+
+def read_sweep(config_file):
+    """
+    Expand the parameter grid of a configuration file into the settings of every run.
+
+    The file holds the usual [settings] section (see cellular_automata.read_settings) and a [sweep] section whose
+    keys are settings and whose values are lists (see parse_values); every combination of these values is a run.
+    As in [settings], the keys are not case sensitive, and the values have the types of
+    cellular_automata.SETTING_TYPES.
+
+    Example Configuration File Format:
+    -------------------
+    [settings]
+    WIDTH=1000
+    HEIGHT=700
+    border_type=toroidal
+    cell_size=1
+    generations=500
+
+    [sweep]
+    seed_value=1:101
+    density=0.1,0.3,0.5
+    border_type=death,toroidal
+    -------------------
+
+    Parameters:
+        config_file (str): The name of the configuration file.
+
+    Returns:
+        list of dict: The settings of every run, in the order of the grid (the last key varies fastest).
+
+    Raises:
+        ValueError: If the file has no [sweep] section, a key of [sweep] is not a setting or one of its values
+        has the wrong type, or a run has no number of generations.
+
+    Note:
+        The settings name the shards, so seed_value should be set in one of the sections: a random seed
+        would give new runs when an interrupted sweep is resumed.
+    """
+    import configparser
+
+    settings = cellular_automata.read_settings(config_file)
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    if not config.has_section('sweep'):
+        raise ValueError('{} has no [sweep] section'.format(config_file))
+    # configparser lower-cases the keys, read_settings returns WIDTH and HEIGHT upper case
+    names = {key.lower(): key for key in cellular_automata.SETTING_TYPES}
+    keys, parameters = [], []
+    for option, text in config['sweep'].items():
+        if option not in names:
+            raise ValueError('Unknown setting {!r} in the [sweep] section of {}, the settings are: {}'.format(
+                option, config_file, ', '.join(cellular_automata.SETTING_TYPES)))
+        key = names[option]
+        try:
+            parameters.append(parse_values(text, cellular_automata.SETTING_TYPES[key]))
+        except ValueError as error:
+            raise ValueError('Invalid values of {} in the [sweep] section of {}: {}'.format(key, config_file, error))
+        keys.append(key)
+    runs = []
+    for values in itertools.product(*parameters):
+        run = dict(settings, **dict(zip(keys, values)))
+        if run['generations'] is None:
+            raise ValueError('The runs need a number of generations in [settings] or [sweep]')
+        runs.append(run)
+    return runs
+
+
+def run_name(settings):
+    """
+    Return the name of the shard of a run, derived from its settings so that it is stable across restarts.
+    """
+    text = json.dumps(settings, sort_keys=True)
+    return 'run-' + hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _cost(settings):
+    """
+    Estimate the work of a run in cell updates.
+    """
+    cell_size = settings['cell_size']
+    return (settings['WIDTH'] // cell_size) * (settings['HEIGHT'] // cell_size) * settings['generations']
+
+
+def run_one(settings, directory):
+    """
+    Run one simulation of a sweep, with the engine of its `engine` setting (see cellular_automata.get_engine),
+    and write its time series to a shard.
+
+    The shard is a .npz file with one array per column of cellular_automata.STATS_DTYPE (generation, population,
+    births, deaths and bounding box of every generation), 'settings', the JSON of the settings, and 'metadata',
+    the JSON of the returned dict, from which the manifest can be rebuilt. It is written to a temporary file
+    renamed at the end, so an interrupted run leaves no shard.
+
+    Parameters:
+        settings (dict): The settings of the run, as returned by read_sweep.
+        directory (str): The directory of the shards.
+
+    Returns:
+        dict: 'name', 'settings', 'seconds' and 'final_population' of the run.
+    """
+    start = time.perf_counter()
+    grid = cellular_automata.settings_grid(settings)
+    factory = cellular_automata.get_engine(grid.shape, settings['border_type'], name=settings['engine'])
+    engine = factory(grid, settings['border_type'], settings['threads'], stats=True)
+    engine.step(settings['generations'])
+    series = engine.stats.to_array()
+    name = run_name(settings)
+    metadata = {'name': name, 'settings': settings, 'seconds': time.perf_counter() - start,
+                'final_population': int(series['population'][-1])}
+    filename = os.path.join(directory, name + '.npz')
+    with open(filename + '.tmp', 'wb') as file:
+        np.savez(file, settings=json.dumps(settings, sort_keys=True), metadata=json.dumps(metadata, sort_keys=True),
+                 **{column: series[column] for column in series.dtype.names})
+    os.replace(filename + '.tmp', filename)
+    return metadata
+
+
+def _run_batch(batch, directory):
+    """
+    Run a task of the process pool: a list of runs, returning their metadata.
+    """
+    return [run_one(settings, directory) for settings in batch]
+
+
+def schedule(runs, chunk_cells=DEFAULT_CHUNK_CELLS):
+    """
+    Group the runs into tasks of the process pool, longest first.
+
+    The longest runs are submitted first, so that they do not end up last on a single worker; runs are grouped
+    until a task holds at least `chunk_cells` cell updates, so the runs that long are tasks on their own and the
+    short ones share the cost of sending a task. Idle workers take the next task, so the load balances itself.
+
+    Parameters:
+        runs (list of dict): The settings of the runs.
+        chunk_cells (int, optional): The cell updates above which a task is not extended.
+
+    Returns:
+        list of list of dict: The tasks, in submission order.
+    """
+    tasks, cost = [], 0
+    for settings in sorted(runs, key=_cost, reverse=True):
+        if not tasks or cost >= chunk_cells:
+            tasks.append([])
+            cost = 0
+        tasks[-1].append(settings)
+        cost += _cost(settings)
+    return tasks
+
+
+def update_manifest(directory):
+    """
+    Append to the manifest.jsonl of a directory the metadata of the shards it does not list yet.
+
+    The metadata are read from the shards themselves, so the runs finished by a task that failed or was
+    interrupted before returning them are not lost. A truncated last line of the manifest is ignored.
+
+    Parameters:
+        directory (str): The directory of the shards and of the manifest.
+
+    Returns:
+        list of dict: The metadata appended.
+    """
+    path = os.path.join(directory, MANIFEST)
+    listed = set()
+    if os.path.exists(path):
+        with open(path) as manifest:
+            for line in manifest:
+                try:
+                    listed.add(json.loads(line)['name'])
+                except ValueError:
+                    pass
+    added = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith('run-') and filename.endswith('.npz') and filename[:-4] not in listed:
+            with np.load(os.path.join(directory, filename)) as shard:
+                added.append(json.loads(str(shard['metadata'])))
+    if added:
+        with open(path, 'a') as manifest:
+            manifest.writelines(json.dumps(result, sort_keys=True) + '\n' for result in added)
+    return added
+
+
+def sweep(runs, directory, workers=None, chunk_cells=DEFAULT_CHUNK_CELLS, report=None):
+    """
+    Run every run of a sweep not yet done, on a pool of processes.
+
+    Every finished run writes its own shard (see run_one); the parent process only receives the metadata of
+    the runs and appends them to the manifest.jsonl of the directory. Runs whose shard already exists, for
+    example after an interrupted sweep, are skipped. Before starting and when stopping, even on an error, the
+    manifest is completed from the shards (see update_manifest), so it always lists every finished run.
+
+    Parameters:
+        runs (list of dict): The settings of the runs, as returned by read_sweep.
+        directory (str): The directory of the shards and of the manifest, created if needed.
+        workers (int, optional): The number of processes, by default the number of CPUs; with 1 the runs are
+            done in this process.
+        chunk_cells (int, optional): The cell updates per task of short runs (see schedule).
+        report (callable, optional): Called with the metadata of every run as soon as its task is finished.
+
+    Returns:
+        list of dict: The metadata of the runs done by this call.
+    """
+    os.makedirs(directory, exist_ok=True)
+    update_manifest(directory)
+    pending = [settings for settings in runs
+               if not os.path.exists(os.path.join(directory, run_name(settings) + '.npz'))]
+    tasks = schedule(pending, chunk_cells)
+    workers = workers or os.cpu_count() or 1
+    done = []
+    try:
+        with open(os.path.join(directory, MANIFEST), 'a') as manifest:
+            def collect(results):
+                for result in results:
+                    manifest.write(json.dumps(result, sort_keys=True) + '\n')
+                    manifest.flush()
+                    done.append(result)
+                    if report is not None:
+                        report(result)
+
+            if workers == 1:
+                for task in tasks:
+                    collect(_run_batch(task, directory))
+            else:
+                from concurrent.futures import ProcessPoolExecutor, as_completed
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(_run_batch, task, directory) for task in tasks]
+                    for future in as_completed(futures):
+                        collect(future.result())
+    finally:
+        update_manifest(directory)
+    return done
+
+
+def load_shard(filename):
+    """
+    Read the shard of a run.
+
+    Parameters:
+        filename (str): The .npz file written by run_one.
+
+    Returns:
+        tuple: (settings, series), the settings of the run and its statistics as an array of STATS_DTYPE.
+    """
+    with np.load(filename) as shard:
+        settings = json.loads(str(shard['settings']))
+        series = np.zeros(len(shard['generation']), dtype=cellular_automata.STATS_DTYPE)
+        for column in series.dtype.names:
+            series[column] = shard[column]
+    return settings, series
+
+
+def main(argv=None):
+    """
+    Command line entry point: run the sweep of a configuration file, resuming an interrupted one.
+
+    Usage:
+        python cellular_automata_sweep.py sweep.txt --out results --workers 8
+
+    Parameters:
+        argv (list of str, optional): The command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(description='Run a parameter sweep of the game of life on a process pool.')
+    parser.add_argument('config_file', help='configuration file with [settings] and [sweep] sections')
+    parser.add_argument('--out', default='sweep', help='directory of the shards and of the manifest')
+    parser.add_argument('--workers', type=int, help='number of processes, by default the number of CPUs')
+    parser.add_argument('--chunk-cells', type=float, default=DEFAULT_CHUNK_CELLS,
+                        help='cell updates per task of short runs')
+    args = parser.parse_args(argv)
+
+    runs = read_sweep(args.config_file)
+    start = time.perf_counter()
+
+    def report(result):
+        print('{} {:.2f} s, final population {}'.format(result['name'], result['seconds'],
+                                                         result['final_population']), flush=True)
+
+    done = sweep(runs, args.out, args.workers, int(args.chunk_cells), report)
+    print('{} of {} runs done in {:.1f} s, {} were already done'.format(
+        len(done), len(runs), time.perf_counter() - start, len(runs) - len(done)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
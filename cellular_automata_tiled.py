@@ -0,0 +1,153 @@
+import numpy as np
+import cellular_automata
+
+
+class TiledEngine:
+    """
+    Conway's game of life on a grid split into square tiles, updating only the tiles that may change.
+
+    A tile is asleep at generation t + 1 when the tile and its eight neighbour tiles are equal at
+    generations t and t - 2: its cells and their neighbours repeat with period 1 or 2, so the tile at
+    t + 1 equals the tile at t - 1. A tile wakes up as soon as a tile next to it changes.
+
+    The generations are kept in a ring of four padded buffers, so the buffer receiving generation t + 1
+    still holds generation t - 3; a tile that was also asleep at t - 1 already holds the right cells and
+    is not touched at all.
+
+    Parameters:
+        grid (list of list or numpy.ndarray): The initial binary grid.
+        border_type (str): The border type ('death', 'alive', 'reflective' or 'toroidal').
+        tile_size (int): The side of the tiles, in cells.
+        dense_fraction (float): Fraction of active tiles above which the whole grid is updated in one
+            vectorized call instead of tile by tile.
+
+    Raises:
+        ValueError: If the `border_type` is not one of the valid options, or `tile_size` is less than 1.
+    """
+
+    def __init__(self, grid, border_type, tile_size=32, dense_fraction=0.5):
+        if tile_size < 1:
+            raise ValueError('tile_size must be >= 1, but is {}'.format(tile_size))
+        padded = cellular_automata.pad_grid(grid, border_type)
+        self.border_type = border_type
+        self.tile_size = tile_size
+        self.dense_fraction = dense_fraction
+        self.height, self.width = padded.shape[0] - 2, padded.shape[1] - 2
+        self._buffers = [padded] + [padded.copy() for _ in range(3)]
+        self._row_starts = np.arange(0, self.height, tile_size)
+        self._col_starts = np.arange(0, self.width, tile_size)
+        tiles_shape = (len(self._row_starts), len(self._col_starts))
+        # tiles differing between generation t and t - 2, unknown (True) for the first two generations
+        self._changed = np.ones(tiles_shape, dtype=bool)
+        self._asleep_before = np.zeros(tiles_shape, dtype=bool)
+        self._asleep_last = np.zeros(tiles_shape, dtype=bool)
+        self.generation = 0
+        self.active_tiles = []
+
+    @property
+    def tile_count(self):
+        """
+        int: The total number of tiles.
+        """
+        return self._changed.size
+
+    @property
+    def grid(self):
+        """
+        numpy.ndarray: A read-only uint8 view of the current generation.
+        """
+        view = self._buffers[self.generation % 4][1:-1, 1:-1]
+        view.flags.writeable = False
+        return view
+
+    def to_grid(self):
+        """
+        Return a copy of the current generation.
+
+        Returns:
+            numpy.ndarray: A uint8 array of shape (height, width).
+        """
+        return self.grid.copy()
+
+    def _awake(self):
+        """
+        Return the tiles whose 3x3 tile neighbourhood changed between generations t and t - 2.
+        """
+        mode = 'wrap' if self.border_type == 'toroidal' else 'constant'
+        changed = np.pad(self._changed, 1, mode=mode)
+        awake = np.zeros_like(self._changed)
+        rows, cols = self._changed.shape
+        for dx in range(3):
+            for dy in range(3):
+                awake |= changed[dx:dx + rows, dy:dy + cols]
+        return awake
+
+    def _tile_slices(self, i, j):
+        """
+        Return the row and column slices of tile (i, j) in interior coordinates.
+        """
+        r0, c0 = self._row_starts[i], self._col_starts[j]
+        return slice(r0, min(r0 + self.tile_size, self.height)), slice(c0, min(c0 + self.tile_size, self.width))
+
+    def step(self, generations=1):
+        """
+        Advance the grid by the given number of generations.
+
+        The number of tiles active (not asleep) in every generation is appended to `active_tiles`.
+
+        Parameters:
+            generations (int, optional): The number of generations.
+        """
+        for _ in range(generations):
+            self._step_once()
+
+    def _step_once(self):
+        """
+        Advance the grid by one generation, recording the number of active tiles.
+        """
+        t = self.generation
+        current = self._buffers[t % 4]
+        previous = self._buffers[(t - 1) % 4]
+        target = self._buffers[(t + 1) % 4]
+        interior = target[1:-1, 1:-1]
+
+        awake = self._awake()
+        asleep = ~awake
+        active = int(awake.sum())
+        if active > self.dense_fraction * awake.size:
+            cellular_automata.step_padded(current, out=interior)
+            differs = interior != previous[1:-1, 1:-1]
+            changed = np.logical_or.reduceat(np.logical_or.reduceat(differs, self._row_starts, axis=0),
+                                             self._col_starts, axis=1)
+        else:
+            changed = np.zeros_like(self._changed)
+            for i, j in zip(*np.nonzero(awake)):
+                rows, cols = self._tile_slices(i, j)
+                tile = interior[rows, cols]
+                cellular_automata.step_padded(current[rows.start:rows.stop + 2, cols.start:cols.stop + 2], out=tile)
+                changed[i, j] = not np.array_equal(tile, previous[1:-1, 1:-1][rows, cols])
+            # asleep tiles repeat generation t - 1, which is already in place if they were asleep at t - 1
+            for i, j in zip(*np.nonzero(asleep & ~self._asleep_before)):
+                rows, cols = self._tile_slices(i, j)
+                interior[rows, cols] = previous[1:-1, 1:-1][rows, cols]
+        if self.border_type in ('reflective', 'toroidal'):
+            cellular_automata.fill_border(target, self.border_type)
+
+        # generation t + 1 has no generation t - 1 to compare with before the second step
+        self._changed = changed if t >= 1 else np.ones_like(changed)
+        self._asleep_before, self._asleep_last = self._asleep_last, asleep
+        self.generation += 1
+        self.active_tiles.append(active)
+
+    def advance(self, generations):
+        """
+        Advance the grid by the given number of generations.
+
+        Parameters:
+            generations (int): The number of generations.
+
+        Returns:
+            list: The number of active tiles of each of these generations.
+        """
+        self.step(generations)
+        return self.active_tiles[len(self.active_tiles) - generations:]
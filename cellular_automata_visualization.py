@@ -1,115 +1,895 @@
 import cellular_automata
+import cellular_automata_checkpoint
 import pygame
-import configparser
-import sys
-from sys import argv
-import random
+import argparse
+import os
+import struct
+import threading
+import zlib
+from collections import deque, namedtuple
+import numpy as np
 
-# Prompt the user to enter the filename
-if __name__ == "__main__":
+# Colors of the dead and alive cells, the palette of the 8-bit surfaces of GridRenderer
+PALETTE = [(0, 0, 0), (255, 255, 255)]
+DEFAULT_FPS = 60
+# Side in cells of the tiles compared by the dirty rendering of GridRenderer, a multiple of 8
+DIRTY_TILE = 16
+# Rectangles of a partial redraw above which GridRenderer redraws the whole grid
+DIRTY_MAX_RECTS = 64
+# Fraction of the tiles changed above which GridRenderer redraws the whole grid
+DIRTY_FULL_FRACTION = 0.5
+# Value of a block of a DensityPyramid whose cells are all alive
+DENSITY_MAX = 252
+# Grays of the densities of a DensityPyramid, drawn by Viewport when zoomed out
+GRAY_PALETTE = [(min(255, value * 255 // DENSITY_MAX),) * 3 for value in range(256)]
+# Color of the window outside the world in a Viewport
+BACKGROUND = (40, 40, 60)
+# Deepest zoom in of a Viewport: 2**MAX_ZOOM pixels per cell
+MAX_ZOOM = 5
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class GridRenderer:
     """
-    This script reads a configuration file specified by the user, parses it line by line, 
-    and stores the configuration values in a dictionary. It assumes that the configuration file contains key-value 
-    pairs separated by '='. The keys are strings, and the values are expected to be integers.
+    Draw a grid on a surface with array copies and scaled blits, instead of one rectangle per cell.
 
-    Usage:
-    1. Run the script and provide the configuration file's filename when prompted.
-    2. The script will attempt to open and read the file, extract key-value pairs, 
-    and store them in the 'config_values' dictionary.
-    3. If the specified file is not found, a 'FileNotFoundError' will be raised, and an error message will be displayed.
-    4. If any other error occurs during file reading or parsing, 
-    an error message will be displayed with details about the exception.
+    The grid is copied into an 8-bit surface of one pixel per cell, whose palette maps 0 and 1 to the
+    PALETTE colors, and this surface is scaled by the cell size (nearest neighbour) onto the target.
 
-    Example Configuration File Format:
-    -------------------
-    key1=42
-    key2=123
-    key3=987
-    -------------------
+    With `dirty` the renderer keeps the last grid drawn and redraws only the tiles of DIRTY_TILE x DIRTY_TILE
+    cells that changed since then, merged into horizontal runs of tiles: draw returns their rectangles, to be
+    passed to pygame.display.update so that only they are sent to the screen. When there are more than
+    `max_rects` runs, or they cover more than `full_fraction` of the grid, the whole grid is redrawn.
 
-    Note:
-    - Ensure that the configuration file is in the specified format, with one key-value pair per line.
-    - The values are assumed to be integers, so any non-integer values will raise an error.
+    Parameters:
+        shape (tuple): The (height, width) of the grid, in cells.
+        cell_size (int): The side of a cell, in pixels.
+        dirty (bool, optional): Redraw only the tiles that changed.
+        max_rects (int, optional): The largest number of rectangles of a partial redraw.
+        full_fraction (float, optional): The fraction of the grid above which the whole grid is redrawn.
 
-    Author: Aldo Canfora
-    Date: 04/10/2023
+    Raises:
+        ValueError: If `cell_size` is less than 1.
+
+    Examples:
+        renderer = GridRenderer(grid.shape, 10, dirty=True)
+        screen = pygame.display.set_mode(renderer.size)
+        pygame.display.update(renderer.draw(grid, screen))
     """
 
-    config = configparser.ConfigParser()
+    def __init__(self, shape, cell_size, dirty=False, max_rects=DIRTY_MAX_RECTS, full_fraction=DIRTY_FULL_FRACTION):
+        if cell_size < 1:
+            raise ValueError('cell_size must be >= 1, but is {}'.format(cell_size))
+        self.height, self.width = shape
+        self.cell_size = cell_size
+        self.size = (self.width * cell_size, self.height * cell_size)
+        self.dirty = dirty
+        self.max_rects = max_rects
+        self.full_fraction = full_fraction
+        self._cells = pygame.Surface((self.width, self.height), depth=8)
+        self._cells.set_palette(PALETTE)
+        self._scaled = None
+        if cell_size > 1:
+            self._scaled = pygame.Surface(self.size, depth=8)
+            self._scaled.set_palette(PALETTE)
+        # the last grid drawn and the current one, padded with zeros to whole tiles and compared 8 cells at a time
+        rows, columns = -(-self.height // DIRTY_TILE) * DIRTY_TILE, -(-self.width // DIRTY_TILE) * DIRTY_TILE
+        self._buffers = [np.zeros((rows, columns), dtype=np.uint8) for _ in range(2)]
+        self._drawn = False
 
-    # Set a deafult configuration file name
-    default_config_file = 'configuration.txt'
-    # Check if a command-line argument for the configuration file name has been provided
-    if len(sys.argv) > 1:
-        config_file = sys.argv[1]
-    else:
-        # If no argument is provided, use the default configuration file name
-        config_file = default_config_file
+    def invalidate(self):
+        """
+        Redraw the whole grid at the next draw, for example after the window was uncovered.
+        """
+        self._drawn = False
 
-    config.read(config_file)
+    def _dirty_runs(self, grid):
+        """
+        Return the changed cells since the last grid drawn as (x, y, width, height) rectangles of cells, or None
+        when the whole grid must be redrawn.
+        """
+        current, previous = self._buffers
+        current[:self.height, :self.width] = grid
+        self._buffers.reverse()
+        if not self._drawn:
+            self._drawn = True
+            return None
+        changed = np.bitwise_xor(current.view(np.uint64), previous.view(np.uint64))
+        rows, words = changed.shape
+        changed = np.bitwise_or.reduce(changed.reshape(rows // DIRTY_TILE, DIRTY_TILE, words), axis=1)
+        tiles = np.bitwise_or.reduce(changed.reshape(rows // DIRTY_TILE, -1, DIRTY_TILE // 8), axis=2) != 0
+        # runs of changed tiles in every row of tiles: +1 where a run starts, -1 after it ends
+        edges = np.diff(np.pad(tiles, ((0, 0), (1, 1))).view(np.int8), axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        stops = np.nonzero(edges == -1)[1]
+        if len(rows) > self.max_rects or (stops - starts).sum() > self.full_fraction * tiles.size:
+            return None
+        x0, y0 = starts * DIRTY_TILE, rows * DIRTY_TILE
+        x1, y1 = np.minimum(stops * DIRTY_TILE, self.width), np.minimum(y0 + DIRTY_TILE, self.height)
+        return [(int(x), int(y), int(w), int(h)) for x, y, w, h in zip(x0, y0, x1 - x0, y1 - y0)]
 
-    # Extract the value of seed_value from the configuration file, if present
-    seed_value = config.get('settings', 'seed_value', fallback=None)
+    def draw(self, grid, target, position=(0, 0)):
+        """
+        Draw a grid on a surface.
 
-    # Check if seed_value is present in the configuration file
-    if seed_value is not None:
-        seed_value = int(seed_value)
-    else:
-        # If seed_value is not present, generate a random value
-        seed_value = random.randint(1, 1000)
+        Parameters:
+            grid (numpy.ndarray): The binary grid, of the shape given to the constructor.
+            target (pygame.Surface): The surface to draw on, for example the display surface.
+            position (tuple, optional): The (x, y) position of the top-left cell on the target, in pixels.
 
-    WIDTH = config.get('settings', 'WIDTH')
-    HEIGHT = config.get('settings', 'HEIGHT')
-    border_type = config.get('settings', 'border_type')
+        Returns:
+            list of pygame.Rect: The areas of the target that were drawn: the whole grid, or with `dirty` the
+            tiles that changed (an empty list if none did).
+        """
+        runs = self._dirty_runs(grid) if self.dirty else None
+        x, y = position
+        size = self.cell_size
+        if runs is None:
+            # surfarray indexes the pixels as [x, y]: the transposed view is copied without a temporary array
+            pygame.surfarray.blit_array(self._cells, grid.T)
+            runs = [(0, 0, self.width, self.height)]
+        else:
+            pixels = pygame.surfarray.pixels2d(self._cells)
+            for left, top, width, height in runs:
+                pixels[left:left + width, top:top + height] = grid[top:top + height, left:left + width].T
+            del pixels  # unlock the surface before blitting it
+        rects = []
+        for left, top, width, height in runs:
+            area = pygame.Rect(left * size, top * size, width * size, height * size)
+            if self._scaled is None:
+                target.blit(self._cells, (x + area.x, y + area.y), area)
+            else:
+                scaled = self._scaled.subsurface(area)
+                pygame.transform.scale(self._cells.subsurface((left, top, width, height)), area.size, scaled)
+                target.blit(scaled, (x + area.x, y + area.y))
+            rects.append(area.move(x, y))
+        return rects
 
-    WIDTH = int(WIDTH)
-    HEIGHT = int(HEIGHT)
-    seed_value = int(seed_value)
 
+def _sum_blocks(source, rows, out):
+    """
+    Write into `out` the sums of the 2x2 blocks of `source`, using `rows` (of shape (len(out), source width)) for
+    the sums of the pairs of rows; the cells beyond an odd edge count as 0.
+    """
+    height, width = source.shape
+    np.add(source[0:height - 1:2], source[1::2], out=rows[:height // 2], dtype=rows.dtype)
+    if height % 2:
+        rows[-1] = source[-1]
+    np.add(rows[:, 0:width - 1:2], rows[:, 1::2], out=out[:, :width // 2], dtype=out.dtype)
+    if width % 2:
+        out[:, -1] = rows[:, -1]
 
-"""
-This script demonstrates a simple cellular automaton simulation using pygame for visualization.
 
-It initializes a pygame window and creates an initial grid for the cellular automaton. The game loop allows you to 
-visualize the automaton's evolution as it updates the grid and displays it on the screen.
+class DensityPyramid:
+    """
+    The density of alive cells of a grid in blocks of 2**k x 2**k cells, for k from 1 to `levels`.
+
+    Level k has one uint8 value per block, from 0 (all dead) to DENSITY_MAX (all alive), so a level can be
+    drawn directly with the gray palette of Viewport. Level 1 is computed from the grid and every other level
+    from the one below it, as the mean of 2x2 values, so an update costs about 4/3 of a pass over the grid at
+    one byte per 4 cells; update can also be restricted to a band of rows that changed.
+
+    Parameters:
+        shape (tuple): The (height, width) of the grid.
+        levels (int): The number of levels.
+
+    Examples:
+        pyramid = DensityPyramid(grid.shape, 4)
+        pyramid.update(grid)
+        overview = pyramid.level(4)  # one value per 16x16 cells
+    """
+
+    def __init__(self, shape, levels):
+        self.shape = tuple(shape)
+        self._levels = []
+        # per level, the sums of the pairs of rows and (above level 1) the uint16 sums of the 2x2 blocks
+        self._rows = []
+        self._sums = []
+        height, width = self.shape
+        for k in range(levels):
+            dtype = np.uint8 if k == 0 else np.uint16
+            self._rows.append(np.empty((-(-height // 2), width), dtype=dtype))
+            height, width = -(-height // 2), -(-width // 2)
+            self._sums.append(None if k == 0 else np.empty((height, width), dtype=np.uint16))
+            self._levels.append(np.zeros((height, width), dtype=np.uint8))
+
+    @property
+    def levels(self):
+        """
+        int: The number of levels.
+        """
+        return len(self._levels)
+
+    def level(self, k):
+        """
+        Return level k, a uint8 array of shape (ceil(height / 2**k), ceil(width / 2**k)), valid until the next
+        update.
+        """
+        return self._levels[k - 1]
+
+    def update(self, grid, start=0, stop=None):
+        """
+        Recompute the levels from the rows start to stop (excluded) of the grid.
+
+        Parameters:
+            grid (numpy.ndarray): The binary uint8 grid, of the shape given to the constructor.
+            start (int, optional): The first row that changed.
+            stop (int, optional): The row after the last one that changed, by default the height.
+        """
+        source = grid
+        stop = len(grid) if stop is None else min(stop, len(grid))
+        for rows, sums, level in zip(self._rows, self._sums, self._levels):
+            start, stop = start // 2, -(-stop // 2)
+            band = level[start:stop]
+            if sums is None:
+                _sum_blocks(source[2 * start:2 * stop], rows[:stop - start], band)
+                np.multiply(band, DENSITY_MAX // 4, out=band)
+            else:
+                _sum_blocks(source[2 * start:2 * stop], rows[:stop - start], sums[start:stop])
+                np.right_shift(sums[start:stop], 2, out=band, casting='unsafe')
+            source = level
+
+
+class Viewport:
+    """
+    The part of the world shown in a window of fixed size, which can be zoomed and panned.
+
+    Zoom level z >= 0 shows every cell as 2**z x 2**z pixels; z < 0 shows every block of 2**-z x 2**-z cells as
+    one pixel, with the gray of its density read from level -z of a DensityPyramid. Only the cells or blocks in
+    the window are sliced out and drawn, so a frame costs the same for a world of a thousand or a billion cells.
+
+    Parameters:
+        world_shape (tuple): The (height, width) of the grid.
+        window_size (tuple): The (width, height) of the window in pixels.
+        levels (int, optional): The levels of the pyramids given to render, the deepest zoom out.
+
+    Examples:
+        viewport = Viewport(grid.shape, (1280, 720), levels=4)
+        viewport.zoom_at(1, pygame.mouse.get_pos())
+        viewport.render(frame, screen)
+    """
+
+    def __init__(self, world_shape, window_size, levels=0):
+        self.world_shape = tuple(world_shape)
+        self.window_size = tuple(window_size)
+        self.levels = levels
+        self.zoom = 0
+        # world coordinates, in cells, of the top left corner of the window
+        self.left = self.top = 0.0
+        self.fit()
+
+    @property
+    def scale(self):
+        """
+        float: The pixels per cell.
+        """
+        return 2.0 ** self.zoom
+
+    def _clamp(self):
+        """
+        Bound the zoom to the available levels and keep the center of the window over the world.
+        """
+        self.zoom = max(-self.levels, min(MAX_ZOOM, self.zoom))
+        width, height = self.window_size[0] / self.scale, self.window_size[1] / self.scale
+        self.left = min(max(self.left, -width / 2), self.world_shape[1] - width / 2)
+        self.top = min(max(self.top, -height / 2), self.world_shape[0] - height / 2)
+
+    def fit(self):
+        """
+        Zoom to the largest level showing the whole world (or the deepest one) and center it.
+        """
+        ratio = min(self.window_size[0] / self.world_shape[1], self.window_size[1] / self.world_shape[0])
+        self.zoom = max(-self.levels, min(MAX_ZOOM, int(np.floor(np.log2(ratio)))))
+        self.left = (self.world_shape[1] - self.window_size[0] / self.scale) / 2
+        self.top = (self.world_shape[0] - self.window_size[1] / self.scale) / 2
+        self._clamp()
 
-Usage:
-1. Make sure you have the 'cellular_automata', 'pygame', and 'parameters' modules imported or defined.
-2. Run the script, and a pygame window will open with the cellular automaton simulation.
-3. You can close the window by clicking the close button.
+    def pan(self, dx, dy):
+        """
+        Move the world by (dx, dy) pixels, as when dragging it.
+        """
+        self.left -= dx / self.scale
+        self.top -= dy / self.scale
+        self._clamp()
 
-Requirements:
-- pygame: You need to have pygame installed to run this script.
+    def world_position(self, position):
+        """
+        Return the world (row, column), as floats, under a pixel (x, y) of the window.
+        """
+        return self.top + position[1] / self.scale, self.left + position[0] / self.scale
+
+    def zoom_at(self, steps, position=None):
+        """
+        Zoom in by `steps` levels (out if negative), keeping the world point under a pixel (x, y) in place.
+
+        Parameters:
+            steps (int): The change of zoom level.
+            position (tuple, optional): The pixel, by default the center of the window.
+        """
+        if position is None:
+            position = (self.window_size[0] / 2, self.window_size[1] / 2)
+        row, column = self.world_position(position)
+        self.zoom += steps
+        self._clamp()
+        self.left = column - position[0] / self.scale
+        self.top = row - position[1] / self.scale
+        self._clamp()
+
+    def render(self, frame, target):
+        """
+        Draw the visible part of a generation.
+
+        Parameters:
+            frame (Frame): The generation; its pyramid must have level -zoom when zoomed out.
+            target (pygame.Surface): The surface of the window size receiving the image.
+        """
+        target.fill(BACKGROUND)
+        if self.zoom >= 0:
+            array, palette, unit, pixels = frame.grid, PALETTE, 1, 2 ** self.zoom
+        else:
+            array, palette, unit, pixels = frame.pyramid.level(-self.zoom), GRAY_PALETTE, 2 ** -self.zoom, 1
+        left, top = self.left / unit, self.top / unit
+        columns, rows = self.window_size[0] / pixels, self.window_size[1] / pixels
+        c0, r0 = max(int(np.floor(left)), 0), max(int(np.floor(top)), 0)
+        c1 = min(int(np.ceil(left + columns)), array.shape[1])
+        r1 = min(int(np.ceil(top + rows)), array.shape[0])
+        if c0 >= c1 or r0 >= r1:
+            return
+        surface = pygame.Surface((c1 - c0, r1 - r0), depth=8)
+        surface.set_palette(palette)
+        pygame.surfarray.blit_array(surface, array[r0:r1, c0:c1].T)
+        if pixels > 1:
+            surface = pygame.transform.scale(surface, ((c1 - c0) * pixels, (r1 - r0) * pixels))
+        target.blit(surface, (round((c0 - left) * pixels), round((r0 - top) * pixels)))
+
+
+Frame = namedtuple('Frame', ['grid', 'generation', 'stats', 'pyramid'])
+Frame.__doc__ = """
+A generation published by SimulationThread: its grid (valid until the next call of latest), its number, its
+GenerationStats (births and deaths are 0 if the engine does not compute them while stepping) and its
+DensityPyramid, or None if the thread builds no pyramid.
 """
-#main part of the code
 
-# Initialize pygame and window
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
 
-# create initial grid
-grid = cellular_automata.initial_state_grid(WIDTH//10, HEIGHT//10, seed_value)
+class SimulationThread:
+    """
+    Step an engine in a background thread, publishing a generation every `steps_per_frame` generations.
+
+    The generations are handed over through three buffers: the thread copies the newest generation into the
+    back buffer and exchanges it with the ready buffer, and latest() exchanges the ready buffer with the front
+    buffer being drawn. The lock only guards these exchanges of indices, never a copy or a step, so a slow step
+    never blocks the window, which keeps handling events and drawing the last generation.
+
+    The thread computes the next batch of generations while the current one is drawn, and waits for it to be
+    taken before publishing again, so the simulation runs at most one batch ahead of the display.
+
+    Parameters:
+        engine: The engine to step (see cellular_automata.get_engine); it must not be used by other threads
+            until close() returns.
+        steps_per_frame (int, optional): The generations computed between two published generations.
+        scheduler (cellular_automata_checkpoint.CheckpointScheduler, optional): Receives a copy of every generation
+            it schedules (every `scheduler.every` generations); the grid is not exported for the others.
+        pyramid_levels (int, optional): The levels of the DensityPyramid published with every generation; it is
+            updated by the thread, only over the rows alive in that generation or the last time its buffer was
+            used, since the others stay empty. With 0 no pyramid is built.
+
+    Raises:
+        ValueError: If `steps_per_frame` is less than 1.
+
+    Examples:
+        worker = SimulationThread(engine, steps_per_frame=10)
+        frame = worker.latest()  # None until a new generation is ready
+        worker.close()
+    """
+
+    def __init__(self, engine, steps_per_frame=1, scheduler=None, pyramid_levels=0):
+        if steps_per_frame < 1:
+            raise ValueError('steps_per_frame must be >= 1, but is {}'.format(steps_per_frame))
+        self.engine = engine
+        self.steps_per_frame = steps_per_frame
+        self.scheduler = scheduler
+        grid = engine.grid
+        self._buffers = [np.empty(grid.shape, dtype=np.uint8) for _ in range(3)]
+        self._frames = [None] * 3
+        self._pyramids = [DensityPyramid(grid.shape, pyramid_levels) if pyramid_levels else None for _ in range(3)]
+        # rows (start, stop) of the alive cells at the last update of every pyramid
+        self._extents = [(0, 0)] * 3
+        self._back, self._ready, self._front = 0, 1, 2
+        self._lock = threading.Lock()
+        # set while the ready buffer has been taken (or never filled), so the thread may publish
+        self._taken = threading.Event()
+        self._taken.set()
+        self._stopping = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='life-simulation', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """
+        Thread body: step the engine and publish a generation every steps_per_frame generations.
+        """
+        engine = self.engine
+        try:
+            while not self._stopping:
+                for _ in range(self.steps_per_frame):
+                    engine.step()
+                    if self.scheduler is not None and engine.generation % self.scheduler.every == 0:
+                        self.scheduler.submit(engine.to_grid(), engine.generation)
+                    if self._stopping:
+                        return
+                back = self._buffers[self._back]
+                np.copyto(back, engine.grid)
+                stats = getattr(engine, 'stats', None)
+                stats = cellular_automata.grid_stats(back) if stats is None else stats.last
+                pyramid = self._update_pyramid(self._back, stats)
+                self._taken.wait()
+                with self._lock:
+                    self._frames[self._back] = Frame(back, engine.generation, stats, pyramid)
+                    self._back, self._ready = self._ready, self._back
+                    self._taken.clear()
+        except BaseException as error:
+            self._error = error
+
+    def _update_pyramid(self, index, stats):
+        """
+        Update the pyramid of a buffer from its grid, over the rows alive now or at its last update.
+        """
+        pyramid = self._pyramids[index]
+        if pyramid is None:
+            return None
+        alive = (stats.top, stats.bottom + 1) if stats.population else (0, 0)
+        extents = [extent for extent in (alive, self._extents[index]) if extent[0] < extent[1]]
+        if extents:
+            pyramid.update(self._buffers[index], min(extent[0] for extent in extents),
+                           max(extent[1] for extent in extents))
+        self._extents[index] = alive
+        return pyramid
 
-# Game loop
-running = True
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
+    def latest(self):
+        """
+        Take the newest published generation.
 
-    # draw grid
-    for i, row in enumerate(grid):
-        for j, cell in enumerate(row):
-            color = (255, 255, 255) if cell == 1 else (0, 0, 0)
-            pygame.draw.rect(screen, color, (j*10, i*10, 10, 10))
+        Returns:
+            Frame or None: The generation, or None if no generation was published since the last call.
 
-    # update grid
-    grid = cellular_automata.update_grid(grid, border_type)
+        Raises:
+            Exception: The error raised by the engine in the thread, if any.
+        """
+        if self._error is not None:
+            raise self._error
+        with self._lock:
+            if self._taken.is_set():
+                return None
+            self._front, self._ready = self._ready, self._front
+            self._taken.set()
+            return self._frames[self._front]
 
-    # update screen
-    pygame.display.update()
+    def close(self):
+        """
+        Stop the thread after the generation being computed; the engine can be used again afterwards.
 
-# clean and quit pygame
-pygame.quit()
+        Raises:
+            Exception: The error raised by the engine in the thread, if any.
+        """
+        self._stopping = True
+        self._taken.set()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
 
 
+def _png_chunk(tag, data):
+    """
+    Return a PNG chunk: length, tag, data and CRC.
+    """
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def encode_png(image, palette=PALETTE, level=6):
+    """
+    Encode an image of palette indices as an indexed PNG.
+
+    With at most two colors the rows are stored with 1 bit per pixel, which makes the PNG of a grid about 8
+    times smaller to compress than an RGB one; otherwise with 1 byte per pixel.
+
+    Parameters:
+        image (numpy.ndarray): A uint8 array of shape (height, width) of indices into the palette.
+        palette (list of tuple, optional): The (red, green, blue) colors, at most 256.
+        level (int, optional): The zlib compression level.
+
+    Returns:
+        bytes: The PNG file.
+
+    Raises:
+        ValueError: If the palette has more than 256 colors.
+
+    Examples:
+        with open('frame.png', 'wb') as file:
+            file.write(encode_png(grid))
+    """
+    if len(palette) > 256:
+        raise ValueError('A PNG palette has at most 256 colors, not {}'.format(len(palette)))
+    height, width = image.shape
+    depth = 1 if len(palette) <= 2 else 8
+    rows = np.packbits(image, axis=1) if depth == 1 else image
+    # every row starts with its filter type, 0 (none)
+    raw = np.zeros((height, rows.shape[1] + 1), dtype=np.uint8)
+    raw[:, 1:] = rows
+    return (PNG_SIGNATURE
+            + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, depth, 3, 0, 0, 0))
+            + _png_chunk(b'PLTE', bytes(bytearray(channel for color in palette for channel in color)))
+            + _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), level))
+            + _png_chunk(b'IEND', b''))
+
+
+def _region(text):
+    """
+    Parse the X,Y,W,H argument of --roi into (left, top, width, height) cells.
+    """
+    try:
+        left, top, width, height = (int(value) for value in text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError('the region must be X,Y,W,H, like 0,0,200,100, not {!r}'.format(text))
+    if left < 0 or top < 0 or width < 1 or height < 1:
+        raise argparse.ArgumentTypeError('the region must have X, Y >= 0 and W, H >= 1, not {!r}'.format(text))
+    return left, top, width, height
+
 
+def crop_region(grid, roi=None):
+    """
+    Return the (left, top, width, height) region of interest of a grid, in cells, as a view clipped to the grid;
+    the whole grid if `roi` is None.
+    """
+    if roi is None:
+        return grid
+    left, top, width, height = roi
+    return grid[top:top + height, left:left + width]
+
+
+class FrameExporter:
+    """
+    Write generations as numbered PNG files, encoded by a pool of threads, without a window.
+
+    The frames are drawn directly from the array (see encode_png), so no display, pygame surface or SDL driver
+    is needed. submit only copies the region of interest of the grid; scaling by the cell size and the PNG
+    compression run in the pool, in parallel since zlib releases the GIL while it compresses. At most
+    2 * workers frames wait for the pool, so a simulation faster than the encoding waits instead of filling the
+    memory.
+
+    Parameters:
+        directory (str): The directory of the frames, created if needed; they are named frame-<generation>.png.
+        cell_size (int, optional): The side of a cell in pixels.
+        roi (tuple, optional): The (left, top, width, height) region of the grid to export, in cells; by default
+            the whole grid. It is clipped to the grid.
+        every (int, optional): Export only the generations that are multiples of `every`.
+        workers (int, optional): The encoding threads, by default the number of CPUs.
+        level (int, optional): The zlib compression level of the PNG files.
+
+    Raises:
+        ValueError: If `cell_size` or `every` is less than 1.
+
+    Examples:
+        with FrameExporter('frames', cell_size=2, every=10) as exporter:
+            for _ in range(1000):
+                simulation.step()
+                exporter.submit(simulation.grid, simulation.generation)
+    """
+
+    def __init__(self, directory, cell_size=1, roi=None, every=1, workers=None, level=6):
+        from concurrent.futures import ThreadPoolExecutor
+
+        if cell_size < 1:
+            raise ValueError('cell_size must be >= 1, but is {}'.format(cell_size))
+        if every < 1:
+            raise ValueError('every must be >= 1, but is {}'.format(every))
+        self.directory = directory
+        self.cell_size = cell_size
+        self.roi = roi
+        self.every = every
+        self.level = level
+        self.written = 0
+        os.makedirs(directory, exist_ok=True)
+        self._workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='life-export')
+        self._pending = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, region, generation):
+        """
+        Pool task: scale a region by the cell size and write it as a PNG file.
+        """
+        image = region
+        if self.cell_size > 1:
+            image = np.repeat(np.repeat(region, self.cell_size, axis=0), self.cell_size, axis=1)
+        filename = os.path.join(self.directory, 'frame-{:08d}.png'.format(generation))
+        with open(filename, 'wb') as file:
+            file.write(encode_png(image, PALETTE, self.level))
+
+    def submit(self, grid, generation):
+        """
+        Export a generation if it is a multiple of `every`.
+
+        Parameters:
+            grid (numpy.ndarray): The binary grid; it may be changed as soon as submit returns.
+            generation (int): Its generation number.
+
+        Returns:
+            bool: Whether the generation is exported.
+
+        Raises:
+            Exception: The error of a previous frame that could not be written, if any.
+        """
+        if generation % self.every:
+            return False
+        while len(self._pending) >= 2 * self._workers:
+            self._pending.popleft().result()
+        self._pending.append(self._pool.submit(self._write, crop_region(grid, self.roi).copy(), generation))
+        self.written += 1
+        return True
+
+    def close(self):
+        """
+        Wait for the frames being written and stop the pool.
+
+        Raises:
+            Exception: The error of a frame that could not be written, if any.
+        """
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._pool.shutdown()
+
+
+def export(engine, generations, filename, cell_size=1, roi=None, every=1, workers=None, border_type='death'):
+    """
+    Step an engine and export its generations, from the current one, without opening a window.
+
+    Parameters:
+        engine: The engine to step (see cellular_automata.get_engine).
+        generations (int): The number of generations to run.
+        filename (str): A .hist file receiving the cells of the region of interest as a compact stream of
+            bit-packed keyframes and deltas (see cellular_automata_history.HistoryWriter), or a directory
+            receiving PNG files (see FrameExporter).
+        cell_size (int, optional): The side of a cell in pixels of the PNG files.
+        roi (tuple, optional): The (left, top, width, height) region of the grid to export, in cells.
+        every (int, optional): Export only the generations that are multiples of `every`.
+        workers (int, optional): The PNG encoding threads, by default the number of CPUs.
+        border_type (str, optional): The border type, stored in the header of a .hist file.
+
+    Returns:
+        int: The number of frames written.
+    """
+    if filename.endswith('.hist'):
+        import cellular_automata_history
+
+        written = 0
+        with cellular_automata_history.HistoryWriter(filename, crop_region(engine.grid, roi).shape,
+                                                     border_type) as history:
+            for step in range(generations + 1):
+                if step:
+                    engine.step()
+                if engine.generation % every == 0:
+                    history.append(crop_region(engine.grid, roi), engine.generation)
+                    written += 1
+        return written
+    with FrameExporter(filename, cell_size, roi, every, workers) as exporter:
+        exporter.submit(engine.grid, engine.generation)
+        for _ in range(generations):
+            engine.step()
+            exporter.submit(engine.grid, engine.generation)
+    return exporter.written
+
+
+def _window_size(text):
+    """
+    Parse the WxH argument of --window.
+    """
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('the window size must be WxH, like 1280x720, not {!r}'.format(text))
+    if width < 1 or height < 1:
+        raise argparse.ArgumentTypeError('the window size must be positive, not {!r}'.format(text))
+    return width, height
+
+
+def _viewport_event(viewport, event):
+    """
+    Zoom or pan a viewport from a mouse or keyboard event, returning whether it moved.
+    """
+    if event.type == pygame.MOUSEWHEEL:
+        viewport.zoom_at(event.y, pygame.mouse.get_pos())
+    elif event.type == pygame.MOUSEMOTION and event.buttons[0]:
+        viewport.pan(*event.rel)
+    elif event.type == pygame.KEYDOWN:
+        step_x, step_y = viewport.window_size[0] // 8, viewport.window_size[1] // 8
+        pans = {pygame.K_LEFT: (step_x, 0), pygame.K_RIGHT: (-step_x, 0),
+                pygame.K_UP: (0, step_y), pygame.K_DOWN: (0, -step_y)}
+        if event.key in pans:
+            viewport.pan(*pans[event.key])
+        elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            viewport.zoom_at(1)
+        elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            viewport.zoom_at(-1)
+        elif event.key == pygame.K_HOME:
+            viewport.fit()
+        else:
+            return False
+    else:
+        return False
+    return True
+
+
+def main(argv=None):
+    """
+    This function demonstrates a simple cellular automaton simulation using pygame for visualization.
+
+    It initializes a pygame window and creates an initial grid for the cellular automaton, or loads it from a
+    checkpoint. The game loop allows you to visualize the automaton's evolution as it updates the grid and
+    displays it on the screen.
+
+    Usage:
+    1. Run "python cellular_automata_visualization.py [configuration_file] [--resume PATH] [--checkpoint PATH]".
+    2. A pygame window will open with the cellular automaton simulation; its title shows the generation,
+       the population, the births and deaths of the last step and the frames per second (at most --fps).
+       The grid is stepped in a background thread, --steps-per-frame generations between two drawn ones.
+       Each cell is drawn as a square of cell_size pixels (--cell-size); only the tiles that changed are redrawn
+       and sent to the screen, unless --redraw full is given.
+    3. With --window WxH the window has a fixed size and shows a part of the world: the mouse wheel or +/- zoom,
+       dragging or the arrow keys pan and Home shows the whole world again. Zoomed out below one pixel per cell,
+       blocks of cells are drawn in grays of their density (see Viewport).
+    4. You can close the window by clicking the close button; with --checkpoint the last grid is saved then.
+    5. With --export PATH no window is opened: --generations generations are run and written, every
+       --export-every generations and cropped to --roi X,Y,W,H cells, as PNG files in the directory PATH (encoded
+       by --export-workers threads) or, if PATH ends with .hist, as a compact history stream.
+    6. With --checkpoint-every N a checkpoint is also written every N generations in --checkpoint-dir,
+       keeping the newest --keep of them.
+
+    Parameters:
+        argv (list of str, optional): The command line arguments, sys.argv[1:] by default.
+
+    Requirements:
+    - pygame: You need to have pygame installed to run this script.
+    """
+    parser = argparse.ArgumentParser(description="Pygame window showing Conway's game of life.")
+    # Set a deafult configuration file name
+    parser.add_argument('config_file', nargs='?', default='configuration.txt')
+    parser.add_argument('--resume', metavar='PATH',
+                        help='start from a checkpoint; its grid and border_type replace the configuration')
+    parser.add_argument('--checkpoint', metavar='PATH', help='save a checkpoint when the window is closed')
+    parser.add_argument('--checkpoint-every', type=int, metavar='N',
+                        help='save a checkpoint every N generations from a background thread')
+    parser.add_argument('--checkpoint-dir', default='checkpoints', help='directory of the periodic checkpoints')
+    parser.add_argument('--keep', type=int, default=cellular_automata_checkpoint.DEFAULT_KEEP,
+                        help='number of periodic checkpoints kept on disk')
+    parser.add_argument('--cell-size', type=int, help='side of a cell in pixels, by default the cell_size setting')
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS, help='maximum frames per second, 0 for no limit')
+    parser.add_argument('--redraw', choices=('dirty', 'full'), default='dirty',
+                        help='redraw only the tiles that changed (the default), or the whole window every frame')
+    parser.add_argument('--steps-per-frame', type=int, default=1,
+                        help='generations computed between two drawn generations')
+    parser.add_argument('--window', type=_window_size, metavar='WxH',
+                        help='fixed window size in pixels, with zoom and pan over the world')
+    parser.add_argument('--export', metavar='PATH',
+                        help='run without a window and write the frames to the directory PATH as PNG files, '
+                             'or to PATH as a history stream if it ends with .hist')
+    parser.add_argument('--generations', type=int,
+                        help='generations to export, by default the generations setting')
+    parser.add_argument('--export-every', type=int, default=1, metavar='N',
+                        help='export only the generations that are multiples of N')
+    parser.add_argument('--roi', type=_region, metavar='X,Y,W,H', help='export only this region of cells')
+    parser.add_argument('--export-workers', type=int, help='PNG encoding threads, by default the number of CPUs')
+    args = parser.parse_args(argv)
+    settings = cellular_automata.read_settings(args.config_file)
+    if args.cell_size:
+        settings['cell_size'] = args.cell_size
+    if args.generations is not None:
+        settings['generations'] = args.generations
+    if args.export and settings['generations'] is None:
+        parser.error('--export needs the number of generations, from the configuration file or --generations')
+    border_type = settings['border_type']
+    seed_value = settings['seed_value']
+    generation = 0
+
+    # create initial grid
+    if args.resume:
+        grid, header = cellular_automata_checkpoint.load_checkpoint(args.resume)
+        border_type, generation = header['border_type'], header['generation']
+        if header['seed_value'] is not None:
+            seed_value = header['seed_value']
+    else:
+        grid = cellular_automata.settings_grid(settings)
+
+    engine = cellular_automata.get_engine(grid.shape, border_type, name=settings['engine'])
+    simulation = engine(grid, border_type, settings['threads'], stats=not args.export, generation=generation)
+
+    if args.export:
+        # offscreen: the frames are drawn from the array, pygame.display is never initialized
+        written = export(simulation, settings['generations'], args.export, settings['cell_size'], args.roi,
+                         args.export_every, args.export_workers, border_type)
+        print('{} frames written to {}'.format(written, args.export))
+        if args.checkpoint:
+            cellular_automata_checkpoint.save_checkpoint(args.checkpoint, simulation.grid, border_type,
+                                                         simulation.generation, seed_value)
+        return
+
+    scheduler = None
+    if args.checkpoint_every:
+        scheduler = cellular_automata_checkpoint.CheckpointScheduler(args.checkpoint_dir, args.checkpoint_every,
+                                                                     border_type, seed_value, args.keep)
+
+    # Initialize pygame and window
+    viewport = renderer = None
+    pyramid_levels = 0
+    if args.window:
+        # enough levels to show the whole world in the window
+        ratio = max(grid.shape[1] / args.window[0], grid.shape[0] / args.window[1])
+        pyramid_levels = max(0, int(np.ceil(np.log2(ratio))))
+        viewport = Viewport(grid.shape, args.window, pyramid_levels)
+        screen = pygame.display.set_mode(args.window)
+        screen.fill(BACKGROUND)
+    else:
+        renderer = GridRenderer(grid.shape, settings['cell_size'], dirty=args.redraw == 'dirty')
+        screen = pygame.display.set_mode(renderer.size)
+    clock = pygame.time.Clock()
+    if renderer is not None:
+        pygame.display.update(renderer.draw(simulation.grid, screen))
+    else:
+        pygame.display.flip()
+    # the simulation runs in a background thread, the loop below only draws the generations it publishes
+    worker = SimulationThread(simulation, args.steps_per_frame, scheduler, pyramid_levels)
+
+    # Game loop
+    running = True
+    frame = None
+    while running:
+        moved = False
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                if renderer is not None:
+                    renderer.invalidate()
+                moved = True
+            elif viewport is not None:
+                moved = _viewport_event(viewport, event) or moved
+        if not running:
+            break
+
+        # draw the newest generation, only the tiles that changed with --redraw dirty, or the visible part of
+        # the world with --window, also when it was zoomed or panned
+        latest = worker.latest()
+        frame = latest or frame
+        if viewport is not None and frame is not None and (latest is not None or moved):
+            viewport.render(frame, screen)
+            pygame.display.flip()
+        if latest is not None:
+            if renderer is not None:
+                # update the areas drawn on the screen
+                pygame.display.update(renderer.draw(frame.grid, screen))
+            pygame.display.set_caption('Generation {}: population {}, births {}, deaths {}, {:.0f} FPS'.format(
+                frame.generation, frame.stats.population, frame.stats.births, frame.stats.deaths,
+                clock.get_fps()))
+
+        # wait to keep at most args.fps frames per second
+        clock.tick(args.fps)
+
+    worker.close()
+    if scheduler is not None:
+        scheduler.close()
+    if args.checkpoint:
+        cellular_automata_checkpoint.save_checkpoint(args.checkpoint, simulation.grid, border_type,
+                                                     simulation.generation, seed_value)
+
+    # clean and quit pygame
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
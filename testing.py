@@ -1,4 +1,6 @@
+import os
 import pytest
+import numpy as np
 import cellular_automata
 
 @pytest.fixture
@@ -775,4 +777,1155 @@ def test_glider():
     assert cellular_automata.update_grid(state_0, 'toroidal') == state_1d
     assert cellular_automata.update_grid(state_1d, 'toroidal') == state_2d
     assert cellular_automata.update_grid(state_2d, 'toroidal') == state_3d
-    assert cellular_automata.update_grid(state_3d, 'toroidal') == state_4d
\ No newline at end of file
+    assert cellular_automata.update_grid(state_3d, 'toroidal') == state_4d
+
+def test_update_grid_matches_update_cell():
+    """
+Test that the whole-grid update gives the same result as updating every cell with update_cell.
+
+Test Steps:
+1. Builds random grids of several shapes, including 1-wide and 2-wide grids where the borders wrap onto themselves.
+2. Compares update_grid and count_neighbors_grid with the per-cell update_cell and count_neighbors for every border type.
+
+Raises:
+    AssertionError: If any cell differs.
+    """
+    rng = np.random.default_rng(0)
+    for shape in [(1, 1), (1, 5), (2, 2), (3, 7), (12, 9)]:
+        grid = rng.integers(0, 2, size=shape).tolist()
+        for border_type in cellular_automata.BORDER_TYPES:
+            expected = [[cellular_automata.update_cell(grid, i, j, border_type) for j in range(shape[1])]
+                        for i in range(shape[0])]
+            counts = [[cellular_automata.count_neighbors(grid, i, j, border_type) for j in range(shape[1])]
+                      for i in range(shape[0])]
+            assert cellular_automata.update_grid(grid, border_type) == expected
+            assert cellular_automata.count_neighbors_grid(grid, border_type).tolist() == counts
+
+
+def test_update_grid_invalid_border_type():
+    # An unknown border type is rejected like in count_neighbors
+    with pytest.raises(ValueError):
+        cellular_automata.update_grid([[0, 1], [1, 0]], 'mirror')
+
+
+def test_bitpacked_update_matches_update_grid():
+    """
+Test the bit-packed engine against update_grid for every border type.
+
+Test Steps:
+1. Builds random grids whose widths fall below, on and across the 64-cell word boundary.
+2. Checks that pack_grid/unpack_grid round-trip the grid.
+3. Checks that update_grid_packed, also when stepping in very small row blocks, equals update_grid.
+
+Raises:
+    AssertionError: If the bit-packed result differs from update_grid.
+    """
+    import cellular_automata_bitpacked
+    rng = np.random.default_rng(1)
+    for shape in [(1, 1), (2, 2), (5, 63), (4, 64), (6, 65), (9, 130)]:
+        grid = rng.integers(0, 2, size=shape, dtype=np.uint8)
+        packed = cellular_automata_bitpacked.pack_grid(grid)
+        assert (cellular_automata_bitpacked.unpack_grid(packed, shape[1]) == grid).all()
+        for border_type in cellular_automata.BORDER_TYPES:
+            expected = cellular_automata.update_grid(grid, border_type)
+            assert cellular_automata_bitpacked.update_grid_packed(grid, border_type).tolist() == expected
+            padded = cellular_automata_bitpacked.pad_packed(packed, shape[1], border_type)
+            blocked = cellular_automata_bitpacked.step_packed(padded, shape[1], border_type, block_words=1)
+            assert cellular_automata_bitpacked.unpack_grid(blocked, shape[1]).tolist() == expected
+
+
+def test_hashlife_death_matches_update_grid():
+    """
+Test the HashLife engine with death borders against repeated calls of update_grid.
+
+Test Steps:
+1. Advances a random grid one generation at a time with a tiny node limit, so that the node table is garbage
+   collected many times during the run.
+2. Compares the exported grid with update_grid after every generation, and the advance() helper after 30 generations.
+
+Raises:
+    AssertionError: If the HashLife grid differs from update_grid.
+    """
+    import cellular_automata_hashlife
+    grid = np.random.default_rng(3).integers(0, 2, size=(13, 21), dtype=np.uint8).tolist()
+    universe = cellular_automata_hashlife.HashLife(grid, 'death', max_nodes=100)
+    expected = grid
+    for _ in range(30):
+        universe.advance(1)
+        expected = cellular_automata.update_grid(expected, 'death')
+        assert universe.to_grid().tolist() == expected
+    assert cellular_automata_hashlife.advance(grid, 30, 'death').tolist() == expected
+
+
+def test_hashlife_unbounded_glider():
+    # A glider on the unbounded plane moves by one cell diagonally every 4 generations, also over huge jumps
+    import cellular_automata_hashlife
+    glider = [[0, 1, 0],
+              [0, 0, 1],
+              [1, 1, 1]]
+    universe = cellular_automata_hashlife.HashLife(glider, 'unbounded')
+    universe.advance(4 * 10**9)
+    assert universe.population == 5
+    assert universe.bounding_box() == (10**9, 10**9, 10**9 + 3, 10**9 + 3)
+    assert universe.to_grid(10**9, 10**9).tolist() == glider
+    with pytest.raises(ValueError):
+        cellular_automata_hashlife.HashLife(glider, 'toroidal')
+
+
+def test_hashlife_node_limit():
+    # Advancing a soup 2**9 generations with a small node limit splits the jump and collects only between jumps
+    import cellular_automata_hashlife
+    grid = np.random.default_rng(5).integers(0, 2, size=(16, 16), dtype=np.uint8)
+    expected = cellular_automata_hashlife.HashLife(grid, 'unbounded')
+    expected.advance(2**9)
+    universe = cellular_automata_hashlife.HashLife(grid, 'unbounded', max_nodes=500)
+    sizes, jumps = [], []
+    collect, step_pow2 = universe.collect, universe._step_pow2
+    universe.collect = lambda: (sizes.append(universe.node_count()), collect())
+    universe._step_pow2 = lambda j: (jumps.append(len(sizes)), step_pow2(j), jumps.append(len(sizes)))
+    universe.advance(2**9)
+    # no collection during a jump, several between jumps, and each jump stays near the limit
+    assert all(before == after for before, after in zip(jumps[::2], jumps[1::2]))
+    assert len(sizes) > 1 and max(sizes) <= 2 * universe.max_nodes
+    box = expected.bounding_box()
+    assert universe.bounding_box() == box
+    window = (box[0], box[1], box[2] - box[0], box[3] - box[1])
+    assert (universe.to_grid(*window) == expected.to_grid(*window)).all()
+
+
+def test_tiled_engine_matches_update_grid():
+    """
+Test the tiled engine against update_grid for every border type.
+
+Test Steps:
+1. Evolves a random grid with small tiles for enough generations that most tiles settle into still lifes and blinkers.
+2. Compares the tiled grid with update_grid after every generation, in tile-by-tile and in whole-grid mode.
+3. Checks that some tiles were put to sleep.
+4. Steps several generations at once with step(7) and advance(3), like the other engines.
+
+Raises:
+    AssertionError: If the tiled grid differs from update_grid.
+    """
+    import cellular_automata_tiled
+    grid = (np.random.default_rng(5).random((33, 47)) < 0.3).astype(np.uint8)
+    for border_type in cellular_automata.BORDER_TYPES:
+        for dense_fraction in (0.0, 1.0):
+            engine = cellular_automata_tiled.TiledEngine(grid, border_type, tile_size=5, dense_fraction=dense_fraction)
+            expected = grid.tolist()
+            for _ in range(150):
+                engine.step()
+                expected = cellular_automata.update_grid(expected, border_type)
+                assert engine.grid.tolist() == expected
+            assert min(engine.active_tiles) < engine.tile_count
+            for _ in range(7):
+                expected = cellular_automata.update_grid(expected, border_type)
+            engine.step(7)
+            assert engine.grid.tolist() == expected and len(engine.active_tiles) == 157
+            assert len(engine.advance(3)) == 3 and engine.generation == 160
+
+
+def test_parallel_engine_matches_update_grid():
+    """
+Test the multi-process engine against update_grid for every border type, with row bands and with 2D tiles.
+
+Test Steps:
+1. Starts a ParallelEngine on a random grid and advances it by 10 generations in a single call.
+2. Compares the result with 10 calls of update_grid, then reuses the same workers for update_grid().
+
+Raises:
+    AssertionError: If the parallel result differs from update_grid.
+    """
+    import cellular_automata_parallel
+    grid = (np.random.default_rng(2).random((17, 23)) < 0.35).astype(np.uint8)
+    for border_type in cellular_automata.BORDER_TYPES:
+        expected = grid.tolist()
+        for _ in range(10):
+            expected = cellular_automata.update_grid(expected, border_type)
+        for split in ({'workers': 2}, {'tiles': (2, 2)}):
+            with cellular_automata_parallel.ParallelEngine(grid, border_type, **split) as engine:
+                engine.step(10)
+                assert engine.to_grid().tolist() == expected
+                assert engine.update_grid(grid).tolist() == cellular_automata.update_grid(grid, border_type)
+
+
+def test_parallel_engine_dead_worker():
+    """
+Test that the multi-process engine fails instead of hanging when a worker dies, and releases its resources.
+
+Test Steps:
+1. Kills a worker of a ParallelEngine: the next step raises a RuntimeError naming it, close() returns and the
+   shared memory is unlinked.
+2. Drops another engine without closing it: its workers are terminated and its shared memory unlinked.
+
+Raises:
+    AssertionError: If a step hangs or succeeds, or a worker or shared memory block is left behind.
+    """
+    import gc
+    from multiprocessing import shared_memory
+    import cellular_automata_parallel
+
+    def assert_released(names):
+        for name in names:
+            with pytest.raises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+
+    grid = (np.random.default_rng(3).random((12, 10)) < 0.4).astype(np.uint8)
+    engine = cellular_automata_parallel.ParallelEngine(grid, 'toroidal', workers=3, timeout=5)
+    engine.step(2)
+    engine._processes[1].kill()
+    engine._processes[1].join()
+    with pytest.raises(RuntimeError, match='worker 1'):
+        engine.step()
+    engine.close()
+    assert_released([block.name for block in engine._blocks])
+
+    engine = cellular_automata_parallel.ParallelEngine(grid, 'death', workers=2)
+    engine.step()
+    names, processes = [block.name for block in engine._blocks], list(engine._processes)
+    del engine
+    gc.collect()
+    assert not any(process.is_alive() for process in processes)
+    assert_released(names)
+
+
+def test_threaded_update_matches_update_grid():
+    # Updating horizontal bands in a thread pool gives the same grid, also with more threads than rows
+    import cellular_automata_bitpacked
+    grid = (np.random.default_rng(4).random((9, 70)) < 0.4).astype(np.uint8)
+    for border_type in cellular_automata.BORDER_TYPES:
+        expected = cellular_automata.update_grid(grid, border_type)
+        for threads in (2, 3, 16):
+            assert cellular_automata.update_grid(grid, border_type, threads) == expected
+            assert cellular_automata_bitpacked.update_grid_packed(grid, border_type, threads).tolist() == expected
+
+
+def test_step_padded_narrow_bands():
+    # Many bands of one or two rows share the scratch buffers of step_padded over repeated generations; a short
+    # switch interval makes the threads interleave, so that a race on the rows at the band edges shows up
+    import sys
+    grid = (np.random.default_rng(6).random((36, 50)) < 0.4).astype(np.uint8)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for border_type in cellular_automata.BORDER_TYPES:
+            single, banded = grid.copy(), grid.copy()
+            scratch = cellular_automata.allocate_scratch(grid.shape)
+            for _ in range(40):
+                single = cellular_automata.step_padded(cellular_automata.pad_grid(single, border_type), threads=1)
+                banded = cellular_automata.step_padded(cellular_automata.pad_grid(banded, border_type), banded.copy(),
+                                                       threads=16, scratch=scratch)
+                assert np.array_equal(banded, single)
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_simulation_matches_update_grid():
+    """
+Test the in-place double-buffered Simulation against update_grid for every border type.
+
+Test Steps:
+1. Steps a Simulation and, in parallel, calls update_grid on the list grid, comparing them after every generation.
+2. Checks that update_grid still returns a list of lists for numpy grids.
+3. Checks that stepping a Simulation allocates no grid-sized memory after the first generation.
+
+Raises:
+    AssertionError: If the grids differ or the stepping allocates memory.
+    """
+    import tracemalloc
+    grid = (np.random.default_rng(6).random((40, 60)) < 0.35).astype(np.uint8)
+    for border_type in cellular_automata.BORDER_TYPES:
+        simulation = cellular_automata.Simulation(grid, border_type)
+        expected = grid.tolist()
+        for _ in range(20):
+            simulation.step()
+            expected = cellular_automata.update_grid(expected, border_type)
+            assert simulation.grid.tolist() == expected
+        expected = cellular_automata.update_grid(simulation.grid, border_type)
+        simulation.step()
+        assert expected == simulation.grid.tolist()
+
+    simulation = cellular_automata.Simulation(cellular_automata.initial_state_grid(1000, 700, 1), 'toroidal')
+    simulation.step()
+    tracemalloc.start()
+    simulation.step(20)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 1000 * 700 // 10
+
+
+def test_run_detects_cycles():
+    """
+Test the multi-generation run with cycle detection.
+
+Test Steps:
+1. Runs a glider on an 8x8 toroidal grid for 10**9 generations: it comes back every 32 generations, so the run stops
+   after the first period and fast-forwards to the requested generation.
+2. Runs random grids with and without cycle detection, and with a tiny fingerprint table, and compares the results.
+
+Raises:
+    AssertionError: If the final grid, the transient or the period are wrong.
+    """
+    glider = np.zeros((8, 8), dtype=np.uint8)
+    glider[0, 1] = glider[1, 2] = glider[2, 0] = glider[2, 1] = glider[2, 2] = 1
+    result = cellular_automata.run(glider, 10**9, 'toroidal')
+    assert (result.generations, result.transient, result.period) == (10**9, 0, 32)
+    assert (result.grid == cellular_automata.run(glider, 10**9 % 32, 'toroidal', detect_cycles=False).grid).all()
+
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        grid = (rng.random((10, 12)) < 0.4).astype(np.uint8)
+        for border_type in cellular_automata.BORDER_TYPES:
+            result = cellular_automata.run(grid, 500, border_type)
+            assert (result.grid == cellular_automata.run(grid, 500, border_type, detect_cycles=False).grid).all()
+            small_table = cellular_automata.run(grid, 500, border_type, max_states=8)
+            assert (small_table.grid == result.grid).all()
+            if result.period is not None and result.period <= 8:
+                assert (small_table.transient, small_table.period) == (result.transient, result.period)
+
+
+def test_fingerprint():
+    # Equal grids have equal fingerprints, a single different cell changes the fingerprint
+    grid = cellular_automata.initial_state_grid(37, 11, 1).astype(np.uint8)
+    changed = grid.copy()
+    changed[10, 36] ^= 1
+    assert cellular_automata.fingerprint(grid) == cellular_automata.fingerprint(grid.copy())
+    assert cellular_automata.fingerprint(grid) != cellular_automata.fingerprint(changed)
+
+
+def test_random_state_grid():
+    """
+Test the chunked random initialisation.
+
+Test Steps:
+1. Draws grids with small chunks, with 1 and 3 workers, dense and bit-packed, and into a memory-mapped file.
+2. Checks that the same seed_value always gives the same grid and that the fraction of alive cells follows the density.
+
+Raises:
+    AssertionError: If the grids differ or the density is wrong.
+    """
+    import cellular_automata_bitpacked
+    chunk_cells = cellular_automata.RANDOM_CHUNK_CELLS
+    cellular_automata.RANDOM_CHUNK_CELLS = 1000
+    try:
+        for density in (0.5, 0.2):
+            grid = cellular_automata.random_state_grid(130, 77, 5, density)
+            assert grid.dtype == np.uint8 and grid.shape == (77, 130)
+            assert abs(grid.mean() - density) < 0.02
+            assert (cellular_automata.random_state_grid(130, 77, 5, density, workers=3) == grid).all()
+            packed = cellular_automata.random_state_grid(130, 77, 5, density, packed=True, workers=2)
+            assert (packed == cellular_automata_bitpacked.pack_grid(grid)).all()
+        assert (cellular_automata.random_state_grid(130, 77, 6, 0.2) != grid).any()
+    finally:
+        cellular_automata.RANDOM_CHUNK_CELLS = chunk_cells
+    with pytest.raises(ValueError):
+        cellular_automata.random_state_grid(10, 10, 1, density=1.5)
+
+
+def test_random_state_grid_memmap(tmp_path):
+    # The streaming mode writes the same grid into a memory-mapped file
+    filename = str(tmp_path / 'grid.bin')
+    grid = cellular_automata.random_state_grid(300, 40, 2, 0.3, filename=filename)
+    assert (np.fromfile(filename, dtype=np.uint8).reshape(40, 300) == cellular_automata.random_state_grid(300, 40, 2, 0.3)).all()
+    del grid
+
+
+def test_out_of_core_engine_matches_update_grid(tmp_path):
+    """
+Test the out-of-core engine against update_grid.
+
+Test Steps:
+1. Writes a random grid into a file, with one byte per cell and bit-packed.
+2. Streams 4 generations with bands of 1, 3 and 100 rows for every border type, and compares each generation with update_grid.
+
+Raises:
+    AssertionError: If a generation differs from update_grid.
+    """
+    import cellular_automata_out_of_core
+    grid = cellular_automata.random_state_grid(70, 23, 3, 0.4)
+    filename = str(tmp_path / 'grid.bin')
+    for packed in (False, True):
+        for border_type in cellular_automata.BORDER_TYPES:
+            for band_rows in (1, 3, 100):
+                cellular_automata.random_state_grid(70, 23, 3, 0.4, packed=packed, filename=filename)
+                engine = cellular_automata_out_of_core.OutOfCoreEngine(filename, (23, 70), border_type, packed=packed,
+                                                                       band_rows=band_rows)
+                expected = grid
+                for _ in range(4):
+                    stats = engine.step()
+                    expected = cellular_automata.update_grid(expected, border_type)
+                    assert (engine.to_grid() == expected).all()
+                assert stats.bytes_read == stats.bytes_written == engine.grid.nbytes
+                engine.close()
+
+
+def test_checkpoint_round_trip(tmp_path):
+    """
+Test saving and loading checkpoints.
+
+Test Steps:
+1. Saves a random grid with every compression and loads it back, dense and bit-packed.
+2. Reads the header alone and checks the saved state of the simulation.
+3. Truncates the file and checks that loading it raises a ValueError.
+
+Raises:
+    AssertionError: If the loaded grid or header differ from the saved ones.
+    """
+    import cellular_automata_bitpacked
+    import cellular_automata_checkpoint
+    grid = cellular_automata.random_state_grid(131, 57, 2, 0.3)
+    filename = str(tmp_path / 'grid.ckpt')
+    for compression in cellular_automata_checkpoint.COMPRESSIONS:
+        header = cellular_automata_checkpoint.save_checkpoint(filename, grid, 'toroidal', 17, 2, compression)
+        loaded = cellular_automata_checkpoint.load_checkpoint(filename)
+        assert (loaded.grid == grid).all() and loaded.header == header
+        assert (cellular_automata_checkpoint.load_checkpoint(filename, packed=True).grid ==
+                cellular_automata_bitpacked.pack_grid(grid)).all()
+        header = cellular_automata_checkpoint.read_checkpoint_header(filename)
+        assert (header['shape'], header['border_type'], header['generation'], header['seed_value']) == \
+            ([57, 131], 'toroidal', 17, 2)
+        with open(filename, 'rb') as file:
+            data = file.read()
+        with open(filename, 'wb') as file:
+            file.write(data[:-5])
+        with pytest.raises(ValueError):
+            cellular_automata_checkpoint.load_checkpoint(filename)
+
+
+def test_checkpoint_scheduler(tmp_path):
+    # Every third generation is saved in the background, only the newest 2 checkpoints are kept
+    import cellular_automata_checkpoint
+    grid = cellular_automata.random_state_grid(50, 40, 3)
+    with cellular_automata_checkpoint.CheckpointScheduler(str(tmp_path), 3, 'toroidal', 3, keep=2) as scheduler:
+        for generation in range(1, 11):
+            grid = np.array(cellular_automata.update_grid(grid, 'toroidal'), dtype=np.uint8)
+            scheduler.submit(grid, generation)
+    assert sorted(os.listdir(tmp_path)) == ['checkpoint-000000000006.ckpt', 'checkpoint-000000000009.ckpt']
+    loaded = cellular_automata_checkpoint.load_checkpoint(scheduler.latest)
+    assert loaded.header['generation'] == 9
+    assert cellular_automata.update_grid(loaded.grid, 'toroidal') == grid.tolist()
+
+    # restarted from generation 3 next to checkpoints of higher generations: the highest ones are kept
+    with cellular_automata_checkpoint.CheckpointScheduler(str(tmp_path), 1, 'toroidal', 3, keep=3) as scheduler:
+        assert scheduler.latest.endswith('checkpoint-000000000009.ckpt')
+        for generation in (4, 5):
+            scheduler.submit(grid, generation)
+    assert sorted(os.listdir(tmp_path)) == ['checkpoint-000000000005.ckpt', 'checkpoint-000000000006.ckpt',
+                                            'checkpoint-000000000009.ckpt']
+    assert scheduler.latest.endswith('checkpoint-000000000009.ckpt')
+
+
+def test_history_random_access(tmp_path):
+    """
+Test the generation history file.
+
+Test Steps:
+1. Records 60 generations of a random grid with a keyframe every 16 generations.
+2. Decodes generations in random order and a range lazily, and compares them with update_grid.
+3. Cuts the last record short, appends the missing generation again and reads the whole file.
+
+Raises:
+    AssertionError: If a decoded generation differs from update_grid.
+    """
+    import cellular_automata_history
+    filename = str(tmp_path / 'run.hist')
+    expected = [cellular_automata.random_state_grid(100, 60, 1)]
+    for _ in range(60):
+        expected.append(cellular_automata.update_grid(expected[-1], 'toroidal'))
+    cellular_automata_history.record(expected[0], 60, 'toroidal', filename, keyframe_interval=16)
+    with cellular_automata_history.HistoryReader(filename) as history:
+        assert len(history) == 61
+        for generation in (60, 3, 33, 16, 17, 0, 59):
+            assert (history.grid(generation) == expected[generation]).all()
+        assert [generation for generation, _ in history.iter_range(20, 25)] == list(range(20, 25))
+        for generation, grid in history.iter_range(20, 25):
+            assert (grid == expected[generation]).all()
+
+    with open(filename, 'rb') as file:
+        data = file.read()
+    with open(filename, 'wb') as file:
+        file.write(data[:-3])
+    with cellular_automata_history.HistoryWriter(filename, (60, 100), 'toroidal', append=True) as history:
+        assert history.generation == 60
+        history.append(expected[60])
+    with cellular_automata_history.HistoryReader(filename) as history:
+        assert all((grid == expected[generation]).all() for generation, grid in history.iter_range())
+
+
+def test_read_rle_known_forms():
+    """
+Test the RLE and plaintext pattern readers on the emergent forms tested above.
+
+Test Steps:
+1. Reads the boat, beehive, loaf and glider from RLE, also split in tiny read blocks, and compares them with the hand-typed grids.
+2. Reads the blinker from a .cells file.
+3. Writes the grids back to RLE and reads them again.
+
+Raises:
+    AssertionError: If a pattern is read or written wrongly.
+    """
+    import io
+    import cellular_automata_bitpacked
+    import cellular_automata_patterns
+    forms = {'2o$obo$bo!': [[1, 1, 0], [1, 0, 1], [0, 1, 0]],
+             'b2o$o2bo$b2o!': [[0, 1, 1, 0], [1, 0, 0, 1], [0, 1, 1, 0]],
+             'b2o$o2bo$bobo$2bo!': [[0, 1, 1, 0], [1, 0, 0, 1], [0, 1, 0, 1], [0, 0, 1, 0]],
+             'bo$2bo$3o!': [[0, 1, 0], [0, 0, 1], [1, 1, 1]]}
+    read_bytes = cellular_automata_patterns.READ_BYTES
+    try:
+        for cells, expected in forms.items():
+            rle = '#C a comment\nx = {}, y = {}, rule = B3/S23\n{}\n'.format(len(expected[0]), len(expected), cells)
+            for cellular_automata_patterns.READ_BYTES in (1, 3, read_bytes):
+                pattern = cellular_automata_patterns.read_rle(io.StringIO(rle))
+                assert pattern.grid.tolist() == expected and pattern.rule == 'B3/S23'
+            packed = cellular_automata_patterns.read_rle(io.BytesIO(rle.encode()), packed=True)
+            assert cellular_automata_bitpacked.unpack_grid(packed.grid, len(expected[0])).tolist() == expected
+            assert cellular_automata_patterns.read_rle(io.StringIO(cellular_automata_patterns.to_rle(expected))).grid.tolist() == expected
+    finally:
+        cellular_automata_patterns.READ_BYTES = read_bytes
+    blinker = cellular_automata_patterns.read_cells(io.StringIO('!Name: Blinker\n.O.\n.O.\n.O.\n'))
+    assert blinker.grid.tolist() == [[0, 1, 0], [0, 1, 0], [0, 1, 0]]
+    with pytest.raises(ValueError):
+        cellular_automata_patterns.read_rle(io.StringIO('x = 2, y = 2\n3o!'))
+
+    grid = cellular_automata.random_state_grid(300, 40, 5, 0.3)
+    grid[:3] = 0
+    assert (cellular_automata_patterns.read_rle(io.StringIO(cellular_automata_patterns.to_rle(grid))).grid == grid).all()
+    region = cellular_automata_patterns.to_rle(grid, 10, 100, 20, 150)
+    assert (cellular_automata_patterns.read_rle(io.StringIO(region)).grid == grid[10:30, 100:250]).all()
+
+
+def test_place_pattern():
+    # A rotated and mirrored glider is placed in place into a uint8 grid and into a bit-packed grid
+    import cellular_automata_bitpacked
+    import cellular_automata_patterns
+    glider = np.array([[0, 1, 0], [0, 0, 1], [1, 1, 1]], dtype=np.uint8)
+    for rotation in range(4):
+        for flip in (False, True):
+            for left in (0, 62, 127):
+                grid = np.ones((20, 130), dtype=np.uint8)
+                packed = cellular_automata_bitpacked.pack_grid(grid)
+                assert cellular_automata_patterns.place_pattern(grid, glider, 5, left, rotation, flip) is grid
+                cellular_automata_patterns.place_pattern(packed, glider, 5, left, rotation, flip, width=130)
+                oriented = np.rot90(glider[:, ::-1] if flip else glider, rotation)
+                assert (grid[5:8, left:left + 3] == oriented).all() and grid.sum() == 20 * 130 - 9 + 5
+                assert (cellular_automata_bitpacked.unpack_grid(packed, 130) == grid).all()
+    grid = np.zeros((10, 10), dtype=np.uint8)
+    cellular_automata_patterns.place_pattern(grid, glider, 0, 0, overwrite=False)
+    cellular_automata_patterns.place_pattern(grid, glider, 0, 1, overwrite=False)
+    assert grid.sum() == 8
+    with pytest.raises(ValueError):
+        cellular_automata_patterns.place_pattern(grid, glider, 8, 0)
+    # a pattern read bit-packed is unpacked before it is placed; a bare packed array has no width and is refused
+    packed_glider = cellular_automata_patterns.Pattern(cellular_automata_bitpacked.pack_grid(glider), (3, 3),
+                                                       cellular_automata.RULE)
+    grid = np.zeros((10, 10), dtype=np.uint8)
+    cellular_automata_patterns.place_pattern(grid, packed_glider, 2, 4, rotation=1)
+    assert (grid[2:5, 4:7] == np.rot90(glider)).all() and grid.sum() == 5
+    with pytest.raises(ValueError):
+        cellular_automata_patterns.place_pattern(grid, packed_glider.grid, 0, 0)
+
+
+def test_simulation_stats():
+    """
+Test the statistics computed while stepping.
+
+Test Steps:
+1. Steps random grids with statistics, with one and three threads and with small blocks, on every border type.
+2. Compares the population, births, deaths and bounding box of every generation with a scan of the grids.
+3. Checks the StatsSeries rows across chunks, and the statistics of an empty grid.
+
+Raises:
+    AssertionError: If a statistic is wrong.
+    """
+    grid = cellular_automata.random_state_grid(97, 60, 1, 0.3)
+    block_cells = cellular_automata.STATS_BLOCK_CELLS
+    try:
+        for cellular_automata.STATS_BLOCK_CELLS in (500, block_cells):
+            for border_type in cellular_automata.BORDER_TYPES:
+                for threads in (1, 3):
+                    simulation = cellular_automata.Simulation(grid, border_type, threads, stats=True)
+                    expected = grid
+                    for _ in range(15):
+                        previous, expected = expected, np.array(cellular_automata.update_grid(expected, border_type))
+                        simulation.step()
+                        rows, columns = np.flatnonzero(expected.any(axis=1)), np.flatnonzero(expected.any(axis=0))
+                        assert tuple(simulation.stats.last) == (
+                            expected.sum(), (expected > previous).sum(), (expected < previous).sum(),
+                            rows[0], columns[0], rows[-1], columns[-1])
+    finally:
+        cellular_automata.STATS_BLOCK_CELLS = block_cells
+    series = simulation.stats.to_array()
+    assert series['generation'].tolist() == list(range(16)) and series['population'][0] == grid.sum()
+    chunked = cellular_automata.StatsSeries(chunk=7)
+    for row in series:
+        chunked.append(row['generation'], cellular_automata.GenerationStats(*row.tolist()[1:]))
+    assert len(chunked) == 16 and (chunked.to_array() == series).all()
+    assert (chunked.to_array(5, 15) == series[5:15]).all() and len(chunked.to_array(16)) == 0
+
+    simulation = cellular_automata.Simulation(np.zeros((5, 5), dtype=np.uint8), 'death', stats=True)
+    simulation.step()
+    assert tuple(simulation.stats.last) == (0, 0, 0, -1, -1, -1, -1)
+
+
+def test_benchmark_suite():
+    """
+Test the benchmark suite on the smallest grids of the ladder and the comparison with a baseline.
+
+Test Steps:
+1. Run the suite up to 1000 cells for three entries, one border type and one density.
+2. Check the keys and the statistics of the results.
+3. Compare the results with a copy where one median is doubled: only that result is a regression.
+
+Raises:
+    AssertionError: If a result or a comparison is wrong.
+    """
+    import cellular_automata_benchmark
+
+    suite = cellular_automata_benchmark.run_suite(['vectorized', 'bitpacked', 'random_state_grid'], 1000,
+                                                  ('toroidal',), (0.3,), repeats=3)
+    keys = [cellular_automata_benchmark.result_key(result) for result in suite['results']]
+    assert keys[:3] == ['vectorized|toroidal|0.3|10x10', 'bitpacked|toroidal|0.3|10x10',
+                        'random_state_grid|None|None|10x10']
+    assert len(keys) == 6 and keys[3] == 'vectorized|toroidal|0.3|25x40'
+    for result in suite['results']:
+        assert len(result['samples']) == 3 and result['min'] <= result['median'] <= result['max']
+
+    baseline = {'results': [dict(result) for result in suite['results']]}
+    baseline['results'][1]['median'] *= 2
+    comparisons = cellular_automata_benchmark.compare_results(suite, baseline, threshold=0.1)
+    assert len(comparisons) == 6
+    assert [comparison['key'] for comparison in comparisons if comparison['regression']] == [keys[1]]
+
+
+def test_numpy_roll_baseline():
+    """
+Test the plain NumPy step the bit-packed engine is measured against.
+
+Test Steps:
+1. Step a random grid with numpy_roll_step and update_grid (toroidal) for a few generations; they must agree.
+2. Run benchmark_bitpacked on a small grid and check its keys and speed-ups.
+
+Raises:
+    AssertionError: If the baseline or the measurement is wrong.
+    """
+    import cellular_automata_benchmark
+
+    grid = cellular_automata.random_state_grid(37, 23, 4)
+    for _ in range(5):
+        expected = np.array(cellular_automata.update_grid(grid, 'toroidal'), dtype=np.uint8)
+        grid = cellular_automata_benchmark.numpy_roll_step(grid)
+        assert np.array_equal(grid, expected)
+
+    result = cellular_automata_benchmark.benchmark_bitpacked(64, 32, generations=1)
+    assert set(result['cells_per_second']) == {'numpy-roll', 'vectorized', 'bitpacked'}
+    assert result['bytes_per_cell']['bitpacked'] < result['bytes_per_cell']['numpy-roll']
+    rates = result['cells_per_second']
+    assert result['speedup_numpy_roll'] == rates['bitpacked'] / rates['numpy-roll'] > 0
+
+
+def test_engine_registry(tmp_path):
+    """
+Test the engine registry: the registered engines, the choice of get_engine and the autotune cache.
+
+Test Steps:
+1. Step a random grid with every registered engine and every border type, comparing with update_grid; step()
+   returns None and every engine holds the same grid.
+2. Build every engine with the common stats and generation options and compare its statistics with the
+   ones of a Simulation.
+3. Check the errors of get_engine for unknown engines and rules.
+4. Autotune two small sizes into a temporary file and check that get_engine follows the crossovers.
+
+Raises:
+    AssertionError: If an engine differs from update_grid or the choice is wrong.
+    """
+    grid = cellular_automata.random_state_grid(37, 23, 3, 0.4)
+    assert cellular_automata.engine_names()[:2] == ['reference', 'vectorized']
+    grids = {}
+    for name in cellular_automata.engine_names():
+        for border_type in cellular_automata.BORDER_TYPES:
+            engine = cellular_automata.get_engine(grid.shape, border_type, name=name)(grid, border_type)
+            expected = grid
+            for _ in range(4):
+                assert engine.step() is None
+                expected = cellular_automata.update_grid(expected, border_type)
+            assert engine.generation == 4 and (engine.to_grid() == expected).all()
+            grids.setdefault(border_type, []).append(np.asarray(engine.grid))
+    for border_type, engine_grids in grids.items():
+        assert all(engine_grid.dtype == np.uint8 and (engine_grid == engine_grids[0]).all()
+                   for engine_grid in engine_grids)
+
+    simulation = cellular_automata.Simulation(grid, 'reflective', stats=True, generation=5)
+    simulation.step(6)
+    for name in cellular_automata.engine_names():
+        engine = cellular_automata.get_engine_info(name).factory(grid, 'reflective', 1, stats=True, generation=5)
+        engine.step(6)
+        assert engine.generation == 11 and (engine.to_grid() == simulation.grid).all()
+        assert (engine.stats.to_array() == simulation.stats.to_array()).all()
+
+    with pytest.raises(ValueError):
+        cellular_automata.get_engine(grid.shape, 'toroidal', name='missing')
+    with pytest.raises(ValueError):
+        cellular_automata.get_engine(grid.shape, 'toroidal', rule='B36/S23')
+    assert cellular_automata.engine_names(cells=10**5) == ['vectorized', 'bitpacked', 'tiled', 'parallel']
+
+    filename = str(tmp_path / 'engines.json')
+    assert cellular_automata.load_tuning(filename) is None
+    crossovers = cellular_automata.autotune(((10, 10), (60, 60)), ('death',), filename, min_seconds=0.001)
+    (_, first), *others = crossovers['death']
+    assert cellular_automata.get_engine((5, 5), 'death', filename=filename) is \
+        cellular_automata.get_engine_info(first).factory
+    for cells, name in others:
+        assert cellular_automata.get_engine((1, cells), 'death', filename=filename) is \
+            cellular_automata.get_engine_info(name).factory
+    cellular_automata._tunings.clear()
+    assert cellular_automata.load_tuning(filename) == crossovers
+
+
+def test_headless_run(tmp_path, capsys):
+    """
+Test the headless command line: settings, engines, statistics and snapshots, without importing pygame.
+
+Test Steps:
+1. Write a configuration file and run 12 generations with the vectorized and the tiled engine.
+2. Check that both statistics files match the statistics of a Simulation and that the snapshots hold the last grid.
+3. Check in a new interpreter that importing the module does not import pygame, and that the start-up time
+   counts from the launch of the interpreter.
+
+Raises:
+    AssertionError: If the outputs differ or pygame is imported.
+    """
+    import subprocess
+    import sys
+    import time
+    import cellular_automata_checkpoint
+    import cellular_automata_headless
+
+    config = tmp_path / 'configuration.txt'
+    config.write_text('[settings]\nWIDTH=370\nHEIGHT=230\nseed_value=4\nborder_type=reflective\ngenerations=12\n')
+    settings = cellular_automata.read_settings(str(config))
+    assert (settings['cell_size'], settings['engine'], settings['generations']) == (10, None, 12)
+    simulation = cellular_automata.Simulation(cellular_automata.settings_grid(settings), 'reflective', stats=True)
+    simulation.step(12)
+    for engine in ('vectorized', 'tiled'):
+        stats, snapshot = tmp_path / (engine + '.npy'), tmp_path / (engine + '.ckpt')
+        assert cellular_automata_headless.main([str(config), '--engine', engine, '--stats', str(stats),
+                                                '--snapshot', str(snapshot)]) == 0
+        assert (np.load(str(stats)) == simulation.stats.to_array()).all()
+        grid, header = cellular_automata_checkpoint.load_checkpoint(str(snapshot))
+        assert header['generation'] == 12 and (grid == simulation.grid).all()
+        assert 'with the {} engine'.format(engine) in capsys.readouterr().out
+
+    code = 'import sys, cellular_automata_headless; sys.exit("pygame" in sys.modules)'
+    assert subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__))).returncode == 0
+    # the start-up time counts from the launch of the interpreter, before the script was imported
+    launched = cellular_automata_headless._launched_ago()
+    assert launched is None or launched >= time.perf_counter() - cellular_automata_headless._LOADED
+
+
+def test_parameter_sweep(tmp_path):
+    """
+Test the parameter sweep: expansion of the [sweep] section, shards, scheduling and resume.
+
+Test Steps:
+1. Expand a sweep of 2 seeds x 2 densities x 2 widths and check the settings of the runs.
+2. Check that the scheduled tasks start with the longest runs, alone, and group the short ones.
+3. Run half of the sweep, then all of it on two processes: only the missing runs are done.
+4. Check a shard against the statistics of a Simulation and the manifest.
+5. Fail the second run of a task: the first one is in the manifest, also after the manifest is deleted.
+6. Check that [sweep] keys map onto the settings whatever their case, with their types, that unknown keys
+   and values of the wrong type are refused, and that the engine setting is used.
+
+Raises:
+    AssertionError: If a run, a shard or the manifest is wrong.
+    """
+    import json
+    import cellular_automata_sweep
+
+    assert cellular_automata_sweep.parse_values('1:4, 10,0.5, death') == [1, 2, 3, 10, 0.5, 'death']
+    config = tmp_path / 'sweep.txt'
+    config.write_text('[settings]\nWIDTH=30\nHEIGHT=20\nborder_type=death\ncell_size=1\ngenerations=15\n\n'
+                      '[sweep]\nseed_value=1:3\ndensity=0.2,0.6\nWIDTH=30,90\n')
+    runs = cellular_automata_sweep.read_sweep(str(config))
+    assert len(runs) == 8 and [(run['seed_value'], run['density'], run['WIDTH']) for run in runs[:3]] == \
+        [(1, 0.2, 30), (1, 0.2, 90), (1, 0.6, 30)]
+    # the runs 90 wide are as long as the task size, three runs 30 wide make a task
+    tasks = cellular_automata_sweep.schedule(runs, chunk_cells=20 * 90 * 15)
+    assert [len(task) for task in tasks] == [1, 1, 1, 1, 3, 1] and tasks[0][0]['WIDTH'] == 90
+
+    directory = str(tmp_path / 'out')
+    assert len(cellular_automata_sweep.sweep(runs[:4], directory, workers=1)) == 4
+    assert len(cellular_automata_sweep.sweep(runs, directory, workers=2)) == 4
+    assert cellular_automata_sweep.sweep(runs, directory, workers=1) == []
+
+    settings, series = cellular_automata_sweep.load_shard(
+        os.path.join(directory, cellular_automata_sweep.run_name(runs[5]) + '.npz'))
+    assert settings == runs[5]
+    simulation = cellular_automata.Simulation(cellular_automata.settings_grid(runs[5]), 'death', stats=True)
+    simulation.step(15)
+    assert (series == simulation.stats.to_array()).all()
+    with open(os.path.join(directory, cellular_automata_sweep.MANIFEST)) as manifest:
+        names = sorted(json.loads(line)['name'] for line in manifest)
+    assert names == sorted(cellular_automata_sweep.run_name(run) for run in runs)
+
+    directory = str(tmp_path / 'failed')
+    with pytest.raises(ValueError):
+        cellular_automata_sweep.sweep([runs[0], dict(runs[0], engine='missing')], directory, workers=1)
+    path = os.path.join(directory, cellular_automata_sweep.MANIFEST)
+    for _ in range(2):
+        with open(path) as manifest:
+            results = [json.loads(line) for line in manifest]
+        assert [(result['name'], result['settings']) for result in results] == \
+            [(cellular_automata_sweep.run_name(runs[0]), runs[0])]
+        os.remove(path)
+        assert cellular_automata_sweep.sweep(runs[:1], directory, workers=1) == []
+
+    config.write_text('[settings]\nWIDTH=30\nHEIGHT=20\nborder_type=death\ncell_size=1\ngenerations=15\n\n'
+                      '[sweep]\nwidth=40,50\nDensity=0.4\nengine=vectorized,tiled\n')
+    runs = cellular_automata_sweep.read_sweep(str(config))
+    assert [(run['WIDTH'], run['density'], run['engine']) for run in runs] == \
+        [(40, 0.4, 'vectorized'), (40, 0.4, 'tiled'), (50, 0.4, 'vectorized'), (50, 0.4, 'tiled')]
+    assert all('width' not in run and isinstance(run['density'], float) for run in runs)
+    directory = str(tmp_path / 'engines')
+    cellular_automata_sweep.sweep(runs[:2], directory, workers=1)
+    shards = [cellular_automata_sweep.load_shard(os.path.join(directory, cellular_automata_sweep.run_name(run)
+                                                              + '.npz'))[1] for run in runs[:2]]
+    assert (shards[0] == shards[1]).all()
+    for sweep_section in ('colour=1,2\n', 'WIDTH=30,4.5\n', 'threads=1:3\nseed=2\n'):
+        config.write_text('[settings]\nWIDTH=30\nHEIGHT=20\nborder_type=death\ngenerations=15\n\n[sweep]\n'
+                          + sweep_section)
+        with pytest.raises(ValueError):
+            cellular_automata_sweep.read_sweep(str(config))
+
+
+def test_update_grids():
+    """
+Test the batched update of a stack of grids with per-grid border types and an active mask.
+
+Test Steps:
+1. Update a stack of 50 random grids with one border type, and with a different border type per grid,
+   in blocks of a few grids and with threads, comparing with update_grid on every grid.
+2. Update it with an active mask: the inactive grids must be unchanged.
+3. Check the errors for a wrong number of border types or a 2D array.
+
+Raises:
+    AssertionError: If a grid differs from update_grid.
+    """
+    stack = np.stack([cellular_automata.random_state_grid(23, 17, seed, 0.4) for seed in range(50)])
+    border_types = [cellular_automata.BORDER_TYPES[seed * 7 % 4] for seed in range(50)]
+    expected = np.stack([cellular_automata.update_grid(grid, border_type)
+                         for grid, border_type in zip(stack, border_types)])
+    block_cells = cellular_automata.BATCH_BLOCK_CELLS
+    try:
+        for cellular_automata.BATCH_BLOCK_CELLS in (3 * 23 * 17, block_cells):
+            for threads in (1, 3):
+                assert (cellular_automata.update_grids(stack, border_types, threads=threads) == expected).all()
+                assert (cellular_automata.update_grids(stack, 'alive', threads=threads) ==
+                        cellular_automata.update_grid(stack, 'alive')).all()
+    finally:
+        cellular_automata.BATCH_BLOCK_CELLS = block_cells
+
+    active = np.arange(50) % 3 == 0
+    result = cellular_automata.update_grids(stack, border_types, active)
+    assert (result[active] == expected[active]).all() and (result[~active] == stack[~active]).all()
+    assert (cellular_automata.update_grids(stack, border_types, np.zeros(50, dtype=bool)) == stack).all()
+
+    with pytest.raises(ValueError):
+        cellular_automata.update_grids(stack, border_types[:-1])
+    with pytest.raises(ValueError):
+        cellular_automata.update_grids(stack[0], 'death')
+
+
+def test_grid_renderer():
+    """
+Test that GridRenderer draws every cell as a square of cell_size pixels of the palette color.
+
+Test Steps:
+1. Draw a random grid with 1, 3 and 10 pixel cells on a 32-bit surface, at an offset.
+2. Check the color of every pixel against the cell it belongs to.
+
+Raises:
+    AssertionError: If a pixel has the wrong color.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame = pytest.importorskip('pygame')
+    import cellular_automata_visualization
+
+    grid = cellular_automata.random_state_grid(29, 13, 2)
+    for cell_size in (1, 3, 10):
+        renderer = cellular_automata_visualization.GridRenderer(grid.shape, cell_size)
+        assert renderer.size == (29 * cell_size, 13 * cell_size)
+        target = pygame.Surface((renderer.size[0] + 5, renderer.size[1]), depth=32)
+        target.fill((255, 0, 0))
+        renderer.draw(grid, target, (5, 0))
+        red, green = pygame.surfarray.array_red(target).T, pygame.surfarray.array_green(target).T
+        assert (red[:, :5] == 255).all() and (green[:, :5] == 0).all()
+        expected = np.kron(grid, np.ones((cell_size, cell_size), dtype=np.uint8)) * 255
+        assert (red[:, 5:] == expected).all() and (green[:, 5:] == expected).all()
+    with pytest.raises(ValueError):
+        cellular_automata_visualization.GridRenderer(grid.shape, 0)
+
+
+def test_grid_renderer_dirty():
+    """
+Test that the dirty rendering redraws only the tiles that changed and still gives the right picture.
+
+Test Steps:
+1. Draw an empty grid, then the same grid with one cell set: one tile is redrawn.
+2. Draw an unchanged grid: nothing is redrawn.
+3. Draw a grid changed everywhere: the whole grid is redrawn.
+4. Step a glider for 40 generations, checking every pixel after each partial redraw.
+
+Raises:
+    AssertionError: If the rectangles or the pixels are wrong.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame = pytest.importorskip('pygame')
+    import cellular_automata_visualization
+
+    tile = cellular_automata_visualization.DIRTY_TILE
+    grid = np.zeros((50, 70), dtype=np.uint8)
+    renderer = cellular_automata_visualization.GridRenderer(grid.shape, 3, dirty=True)
+    target = pygame.Surface(renderer.size, depth=32)
+    assert renderer.draw(grid, target) == [pygame.Rect(0, 0, 210, 150)]
+    grid[20, 40] = 1
+    assert renderer.draw(grid, target) == [pygame.Rect(2 * tile * 3, tile * 3, tile * 3, tile * 3)]
+    assert renderer.draw(grid, target) == []
+    assert renderer.draw(1 - grid, target) == [pygame.Rect(0, 0, 210, 150)]
+    renderer.invalidate()
+    assert len(renderer.draw(1 - grid, target)) == 1
+
+    grid = np.zeros((50, 70), dtype=np.uint8)
+    grid[1:4, 60:63] = [[0, 1, 0], [0, 0, 1], [1, 1, 1]]
+    simulation = cellular_automata.Simulation(grid, 'toroidal')
+    renderer.draw(simulation.grid, target)
+    for _ in range(40):
+        simulation.step()
+        rects = renderer.draw(simulation.grid, target)
+        assert 1 <= len(rects) <= 4
+        red = pygame.surfarray.array_red(target).T
+        assert (red == np.kron(simulation.grid, np.ones((3, 3), dtype=np.uint8)) * 255).all()
+
+
+def test_simulation_thread():
+    """
+Test the background simulation thread: published generations, steps per frame, slow steps and errors.
+
+Test Steps:
+1. Step a grid 5 generations per frame in the thread and compare every published frame with update_grid.
+2. With an engine whose step takes 0.3 s, check that latest() returns at once, without a new frame.
+3. Check that an error of the engine is raised by latest() or close().
+4. Check that the grid is exported for the checkpoint scheduler only at the generations it schedules.
+
+Raises:
+    AssertionError: If a frame is wrong or latest() blocks.
+    """
+    import threading
+    import time
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pytest.importorskip('pygame')
+    import cellular_automata_visualization
+
+    grid = cellular_automata.random_state_grid(40, 30, 5, 0.4)
+    worker = cellular_automata_visualization.SimulationThread(
+        cellular_automata.Simulation(grid, 'toroidal', stats=True), steps_per_frame=5)
+    expected, generation = grid, 0
+    while generation < 50:
+        frame = worker.latest()
+        if frame is None:
+            time.sleep(0.001)
+            continue
+        for _ in range(5):
+            expected = np.array(cellular_automata.update_grid(expected, 'toroidal'))
+        generation += 5
+        assert frame.generation == generation and (frame.grid == expected).all()
+        assert frame.stats.population == expected.sum()
+    worker.close()
+    assert worker.engine.generation in (50, 55, 60)
+
+    class SlowEngine:
+        def __init__(self, grid):
+            self.grid, self.generation, self.release = grid, 0, threading.Event()
+
+        def step(self):
+            self.release.wait(0.3)
+            self.generation += 1
+            if self.generation == 2:
+                raise RuntimeError('step failed')
+
+    worker = cellular_automata_visualization.SimulationThread(SlowEngine(grid))
+    start = time.perf_counter()
+    assert worker.latest() is None and time.perf_counter() - start < 0.1
+    with pytest.raises(RuntimeError):
+        while True:
+            worker.latest()
+            time.sleep(0.01)
+    with pytest.raises(RuntimeError):
+        worker.close()
+
+    class CountingSimulation(cellular_automata.Simulation):
+        exported = 0
+
+        def to_grid(self):
+            CountingSimulation.exported += 1
+            return super().to_grid()
+
+    class Scheduler:
+        every, submitted = 4, []
+
+        def submit(self, grid, generation):
+            self.submitted.append(generation)
+            return True
+
+    scheduler = Scheduler()
+    worker = cellular_automata_visualization.SimulationThread(CountingSimulation(grid, 'toroidal'), 3, scheduler)
+    while worker.engine.generation < 30:
+        worker.latest()
+        time.sleep(0.001)
+    worker.close()
+    assert scheduler.submitted == list(range(4, worker.engine.generation + 1, 4))
+    assert CountingSimulation.exported == len(scheduler.submitted)
+
+
+def test_viewport():
+    """
+Test the density pyramid and the zoomable viewport drawing only the visible part of the world.
+
+Test Steps:
+1. Check every level of a DensityPyramid of an odd-sized grid against block sums, also after a band update.
+2. Check that the pyramid of a SimulationThread follows the generations, including cells that died.
+3. Fit a large world in a small window, zoom in under the cursor and pan, checking the world coordinates.
+4. Render zoomed in and zoomed out, and check the pixels against the grid and the pyramid.
+
+Raises:
+    AssertionError: If a level, a coordinate or a pixel is wrong.
+    """
+    import time
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame = pytest.importorskip('pygame')
+    import cellular_automata_visualization
+    from cellular_automata_visualization import DENSITY_MAX, DensityPyramid, Frame, Viewport
+
+    def block_sums(array):
+        height, width = array.shape
+        padded = np.zeros((-(-height // 2) * 2, -(-width // 2) * 2), dtype=np.int64)
+        padded[:height, :width] = array
+        return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).sum(axis=(1, 3))
+
+    grid = cellular_automata.random_state_grid(53, 37, 3, 0.4)
+    pyramid = DensityPyramid(grid.shape, 4)
+    pyramid.update(grid)
+    expected = block_sums(grid) * (DENSITY_MAX // 4)
+    assert (pyramid.level(1) == expected).all()
+    for k in range(2, 5):
+        expected = block_sums(expected) >> 2
+        assert (pyramid.level(k) == expected).all()
+    changed = grid.copy()
+    changed[5:11] = 1 - changed[5:11]
+    pyramid.update(changed, 5, 11)
+    reference = DensityPyramid(grid.shape, 4)
+    reference.update(changed)
+    assert all((pyramid.level(k) == reference.level(k)).all() for k in range(1, 5))
+
+    worker = cellular_automata_visualization.SimulationThread(
+        cellular_automata.Simulation(grid, 'death', stats=True), pyramid_levels=2)
+    generations = 0
+    while generations < 20:
+        frame = worker.latest()
+        if frame is None:
+            time.sleep(0.001)
+            continue
+        generations += 1
+        reference.update(frame.grid)
+        assert (frame.pyramid.level(1) == reference.level(1)).all()
+        assert (frame.pyramid.level(2) == reference.level(2)).all()
+    worker.close()
+
+    viewport = Viewport((1000, 2000), (200, 100), levels=5)
+    assert viewport.zoom == -4
+    viewport.zoom_at(2, (50, 30))
+    assert viewport.zoom == -2
+    row, column = viewport.world_position((50, 30))
+    viewport.zoom_at(-1, (50, 30))
+    assert np.allclose(viewport.world_position((50, 30)), (row, column))
+    viewport.zoom_at(-10)
+    assert viewport.zoom == -5
+    viewport.zoom_at(20)
+    assert viewport.zoom == cellular_automata_visualization.MAX_ZOOM
+
+    world = cellular_automata.random_state_grid(300, 200, 4, 0.3)
+    pyramid = DensityPyramid(world.shape, 3)
+    pyramid.update(world)
+    frame = Frame(world, 0, cellular_automata.grid_stats(world), pyramid)
+    target = pygame.Surface((64, 48), depth=32)
+    viewport = Viewport(world.shape, target.get_size(), levels=3)
+    viewport.zoom = 2
+    viewport.left, viewport.top = 10.0, 20.0
+    viewport.render(frame, target)
+    red = pygame.surfarray.array_red(target).T
+    assert (red == np.kron(world[20:32, 10:26], np.ones((4, 4), dtype=np.uint8)) * 255).all()
+    viewport.zoom = -2
+    viewport.left, viewport.top = -40.0, 160.0
+    viewport.render(frame, target)
+    red = pygame.surfarray.array_red(target).T
+    background = cellular_automata_visualization.BACKGROUND[0]
+    assert (red[:, :10] == background).all() and (red[10:, :] == background).all()
+    gray = np.array([color[0] for color in cellular_automata_visualization.GRAY_PALETTE])
+    assert (red[:10, 10:] == gray[pyramid.level(2)[40:50, 0:54]]).all()
+
+
+def test_frame_export(tmp_path):
+    """
+Test the offscreen export of the generations as PNG files and as a history stream.
+
+Test Steps:
+1. Encode random index images with 2 and 5 colors and decode them with pygame.
+2. Export 12 generations every 4, cropped and scaled, as PNG files from 2 threads and check every pixel.
+3. Export the same run as a .hist stream and check the cropped generations read back.
+4. Run the visualization with --export, which must not open a window.
+
+Raises:
+    AssertionError: If a frame is missing or wrong.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame = pytest.importorskip('pygame')
+    import cellular_automata_history
+    import cellular_automata_visualization
+    from cellular_automata_visualization import encode_png, export
+
+    rng = np.random.default_rng(6)
+    for palette in (cellular_automata_visualization.PALETTE, [(0, 0, 0), (9, 8, 7), (255, 0, 0), (1, 2, 3), (4, 5, 6)]):
+        image = rng.integers(0, len(palette), (13, 29)).astype(np.uint8)
+        filename = str(tmp_path / 'image.png')
+        with open(filename, 'wb') as file:
+            file.write(encode_png(image, palette))
+        surface = pygame.image.load(filename)
+        colors = np.array(palette)[image]
+        assert surface.get_size() == (29, 13)
+        assert (pygame.surfarray.array_red(surface).T == colors[..., 0]).all()
+        assert (pygame.surfarray.array_blue(surface).T == colors[..., 2]).all()
+
+    grid = cellular_automata.random_state_grid(40, 30, 7, 0.4)
+    roi = (5, 3, 20, 50)
+    expected = {0: grid}
+    for generation in range(1, 13):
+        expected[generation] = np.array(cellular_automata.update_grid(expected[generation - 1], 'toroidal'))
+    written = export(cellular_automata.Simulation(grid, 'toroidal'), 12, str(tmp_path / 'frames'), cell_size=3,
+                     roi=roi, every=4, workers=2)
+    assert written == 4
+    assert sorted(os.listdir(tmp_path / 'frames')) == ['frame-{:08d}.png'.format(g) for g in (0, 4, 8, 12)]
+    for generation in (0, 4, 8, 12):
+        surface = pygame.image.load(str(tmp_path / 'frames' / 'frame-{:08d}.png'.format(generation)))
+        cells = expected[generation][3:30, 5:25]
+        assert (pygame.surfarray.array_red(surface).T == np.kron(cells, np.ones((3, 3), dtype=np.uint8)) * 255).all()
+
+    assert export(cellular_automata.Simulation(grid, 'toroidal'), 12, str(tmp_path / 'run.hist'), roi=roi,
+                  every=4, border_type='toroidal') == 4
+    with cellular_automata_history.HistoryReader(str(tmp_path / 'run.hist')) as history:
+        assert history.generations == [0, 4, 8, 12] and history.border_type == 'toroidal'
+        for generation in (0, 4, 8, 12):
+            assert (history.grid(generation) == expected[generation][3:30, 5:25]).all()
+
+    config = tmp_path / 'configuration.txt'
+    config.write_text('[settings]\nWIDTH=40\nHEIGHT=30\nseed_value=7\nborder_type=death\n')
+    cellular_automata_visualization.main([str(config), '--export', str(tmp_path / 'cli'), '--generations', '3'])
+    assert len(os.listdir(tmp_path / 'cli')) == 4 and not pygame.display.get_init()